@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+###############################################################################
+#
+# Copyright 2012 Pants Developers (see AUTHORS.txt)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+###############################################################################
+"""
+Measures automatic corking on a request/response protocol.
+
+Runs a Pants server whose connections answer each request with several
+small writes, each flushed as it is written, and a number of ping-pong
+clients in a separate process. Reports responses per second and the
+number of send calls made per response, with and without
+``Stream.auto_cork``. Usage::
+
+    python benchmarks/bench_autocork.py [clients] [seconds]
+"""
+
+import multiprocessing
+import select
+import socket
+import sys
+import time
+
+import pants
+from pants.engine import Engine
+
+
+PORT = 4082
+REQUEST = "x" * 32
+PIECES = ["HTTP/1.1 200 OK\r\n", "Content-Length: 5\r\n", "\r\n", "hello"]
+RESPONSE_SIZE = sum(map(len, PIECES))
+
+
+class Responder(pants.Stream):
+    sends = 0
+
+    def on_connect(self):
+        self.read_delimiter = len(REQUEST)
+
+    def on_read(self, data):
+        for piece in PIECES:
+            self.write(piece, flush=True)
+
+    def _socket_sendv(self, buffers, offset=0):
+        Responder.sends += 1
+        return pants.Stream._socket_sendv(self, buffers, offset)
+
+
+def client(clients, seconds, results):
+    socks = []
+    for i in xrange(clients):
+        sock = socket.create_connection(("127.0.0.1", PORT))
+        sock.setblocking(False)
+        socks.append(sock)
+
+    received = dict((sock.fileno(), 0) for sock in socks)
+    by_fileno = dict((sock.fileno(), sock) for sock in socks)
+    poller = select.epoll()
+    for sock in socks:
+        poller.register(sock.fileno(), select.EPOLLIN)
+        sock.send(REQUEST)
+
+    responses = 0
+    end = time.time() + seconds
+    while time.time() < end:
+        for fileno, events in poller.poll(0.1):
+            sock = by_fileno[fileno]
+            received[fileno] += len(sock.recv(4096))
+            if received[fileno] >= RESPONSE_SIZE:
+                received[fileno] -= RESPONSE_SIZE
+                responses += 1
+                sock.send(REQUEST)
+
+    for sock in socks:
+        sock.close()
+    results.put(responses)
+
+
+def run(auto_cork, clients, seconds):
+    class Connection(Responder):
+        pass
+    Connection.auto_cork = auto_cork
+    Responder.sends = 0
+
+    engine = Engine()
+    server = pants.Server(ConnectionClass=Connection, engine=engine,
+                          socket_options={"nodelay": True})
+    server.listen(("127.0.0.1", PORT))
+
+    results = multiprocessing.Queue()
+    process = multiprocessing.Process(target=client, args=(clients, seconds, results))
+    process.start()
+
+    start = time.time()
+    while process.is_alive() and results.empty():
+        engine.poll(0.1)
+    elapsed = time.time() - start
+    responses = float(max(results.get(), 1))
+    process.join()
+    server.close()
+
+    return responses / elapsed, Responder.sends / responses
+
+
+def main(argv):
+    if not hasattr(select, "epoll"):
+        print "epoll is not available on this platform."
+        return
+
+    clients = int(argv[1]) if len(argv) > 1 else 50
+    seconds = float(argv[2]) if len(argv) > 2 else 5.0
+
+    print "%d clients, %.1f seconds, %d flushed writes per response" % (
+        clients, seconds, len(PIECES))
+    print "%-10s %14s %12s" % ("auto_cork", "responses/s", "sends/resp")
+    for auto_cork in (False, True):
+        rps, sends = run(auto_cork, clients, seconds)
+        print "%-10s %14.0f %12.2f" % (auto_cork, rps, sends)
+
+
+if __name__ == "__main__":
+    main(sys.argv)
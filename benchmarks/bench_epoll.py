@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+###############################################################################
+#
+# Copyright 2012 Pants Developers (see AUTHORS.txt)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+###############################################################################
+"""
+Compares level-triggered and edge-triggered epoll.
+
+Runs a Pants echo server and a number of ping-pong clients in a separate
+process, then reports requests per second, the number of epoll_ctl
+calls made per request and the number of interest changes per request
+that the engine did not need to pass on to epoll. Usage::
+
+    python benchmarks/bench_epoll.py [clients] [seconds]
+"""
+
+import multiprocessing
+import select
+import socket
+import sys
+import time
+
+import pants
+from pants.engine import Engine, _EPoll
+
+
+PORT = 4080
+MESSAGE = "x" * 64
+
+
+class CountingEPoll(_EPoll):
+    def __init__(self, edge_triggered=False):
+        _EPoll.__init__(self, edge_triggered)
+        self.ctl_calls = 0
+
+    def add(self, fileno, events):
+        self.ctl_calls += 1
+        _EPoll.add(self, fileno, events)
+
+    def modify(self, fileno, events):
+        if not self.edge_triggered:
+            self.ctl_calls += 1
+        _EPoll.modify(self, fileno, events)
+
+    def remove(self, fileno, events):
+        self.ctl_calls += 1
+        _EPoll.remove(self, fileno, events)
+
+
+class Echo(pants.Stream):
+    def on_read(self, data):
+        self.write(data)
+
+
+def client(clients, seconds, results):
+    socks = []
+    for i in xrange(clients):
+        sock = socket.socket()
+        sock.connect(("127.0.0.1", PORT))
+        sock.setblocking(False)
+        socks.append(sock)
+
+    for sock in socks:
+        sock.send(MESSAGE)
+
+    requests = 0
+    end = time.time() + seconds
+    epoll = select.epoll()
+    for sock in socks:
+        epoll.register(sock.fileno(), select.EPOLLIN)
+    by_fileno = dict((sock.fileno(), sock) for sock in socks)
+
+    while time.time() < end:
+        for fileno, events in epoll.poll(0.1):
+            sock = by_fileno[fileno]
+            if sock.recv(4096):
+                requests += 1
+                sock.send(MESSAGE)
+
+    for sock in socks:
+        sock.close()
+    results.put(requests)
+
+
+def run(edge_triggered, clients, seconds):
+    poller = CountingEPoll(edge_triggered)
+    engine = Engine(poller=poller, edge_triggered=edge_triggered)
+    server = pants.Server(ConnectionClass=Echo, engine=engine).listen(("127.0.0.1", PORT))
+
+    results = multiprocessing.Queue()
+    process = multiprocessing.Process(target=client, args=(clients, seconds, results))
+    process.start()
+
+    start = time.time()
+    ctl_start = poller.ctl_calls
+    saved_start = engine.interest_changes_saved
+    while process.is_alive():
+        engine.poll(0.1)
+    elapsed = time.time() - start
+    requests = results.get()
+
+    server.close()
+    requests = float(max(requests, 1))
+    return (requests / elapsed, (poller.ctl_calls - ctl_start) / requests,
+            (engine.interest_changes_saved - saved_start) / requests)
+
+
+def main(argv):
+    if not hasattr(select, "epoll"):
+        print "epoll is not available on this platform."
+        return
+
+    clients = int(argv[1]) if len(argv) > 1 else 50
+    seconds = float(argv[2]) if len(argv) > 2 else 5.0
+
+    print "%d clients, %.1f seconds" % (clients, seconds)
+    print "%-16s %12s %16s %12s" % ("mode", "requests/s", "epoll_ctl/req", "saved/req")
+    for name, edge_triggered in (("level-triggered", False), ("edge-triggered", True)):
+        rps, ctl, saved = run(edge_triggered, clients, seconds)
+        print "%-16s %12.0f %16.2f %12.2f" % (name, rps, ctl, saved)
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+###############################################################################
+#
+# Copyright 2012 Pants Developers (see AUTHORS.txt)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+###############################################################################
+"""
+Measures how late short deferreds run, with and without high resolution
+timers.
+
+Repeatedly defers a function by a fixed delay from within itself, as a
+pacing loop would, and reports the median, 99th percentile and worst
+lateness along with the CPU time used, which shows whether the engine
+is busy-looping. Usage::
+
+    python benchmarks/bench_jitter.py [count]
+"""
+
+import sys
+import time
+
+from pants.engine import Engine, _timerfd_create
+
+
+def run(delay, count, high_resolution):
+    engine = Engine(high_resolution=high_resolution)
+    lateness = []
+
+    def tick(deadline):
+        lateness.append(time.time() - deadline)
+        if len(lateness) < count:
+            engine.defer(delay, tick, time.time() + delay)
+        else:
+            engine.stop()
+
+    engine.defer(delay, tick, time.time() + delay)
+    cpu = time.clock()
+    start = time.time()
+    engine.start(0.2)
+    elapsed = time.time() - start
+    cpu = time.clock() - cpu
+
+    lateness.sort()
+    return (lateness[len(lateness) // 2], lateness[int(len(lateness) * 0.99)],
+            lateness[-1], cpu / elapsed)
+
+
+def main(argv):
+    count = int(argv[1]) if len(argv) > 1 else 500
+
+    modes = [("poll timeout", False)]
+    if _timerfd_create is not None:
+        modes.append(("timerfd", True))
+    else:
+        print "timerfd is not available on this platform."
+
+    print "%d deferreds per delay, lateness in microseconds" % count
+    print "%-8s %-14s %10s %10s %10s %6s" % ("delay", "mode", "p50", "p99",
+                                             "max", "cpu")
+    for delay in (0.0005, 0.001, 0.002, 0.005, 0.02):
+        for name, high_resolution in modes:
+            p50, p99, worst, cpu = run(delay, count, high_resolution)
+            print "%-8s %-14s %10.0f %10.0f %10.0f %5.0f%%" % (
+                "%gms" % (delay * 1000), name, p50 * 1e6, p99 * 1e6,
+                worst * 1e6, cpu * 100)
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+###############################################################################
+#
+# Copyright 2012 Pants Developers (see AUTHORS.txt)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+###############################################################################
+"""
+Measures the effect of TCP_NODELAY on small request/response traffic.
+
+Runs a Pants server that answers each request with a small header and
+a small body, each flushed as soon as it is written, as a streamed
+response would be, and a client in a separate process that sends
+requests one at a time and records how long each response takes.
+Without ``nodelay``, Nagle's algorithm holds the body back until the
+client acknowledges the header, which a delayed ACK can put off for
+tens of milliseconds. Usage::
+
+    python benchmarks/bench_nodelay.py [requests]
+"""
+
+import multiprocessing
+import socket
+import sys
+import time
+
+import pants
+from pants.engine import Engine
+
+
+PORT = 4081
+REQUEST = "GET /item/1\n"
+HEADER = "200 OK 32\n"
+BODY = "x" * 32
+
+
+class Responder(pants.Stream):
+    def on_connect(self):
+        self.read_delimiter = "\n"
+
+    def on_read(self, data):
+        self.write(HEADER, flush=True)
+        self.write(BODY, flush=True)
+
+
+def client(requests, results):
+    sock = socket.create_connection(("127.0.0.1", PORT))
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    expected = len(HEADER) + len(BODY)
+
+    latencies = []
+    for i in xrange(requests):
+        start = time.time()
+        sock.sendall(REQUEST)
+        received = 0
+        while received < expected:
+            received += len(sock.recv(4096))
+        latencies.append(time.time() - start)
+
+    sock.close()
+    results.put(latencies)
+
+
+def run(socket_options, requests):
+    engine = Engine()
+    server = pants.Server(ConnectionClass=Responder, engine=engine,
+                          socket_options=socket_options)
+    server.listen(("127.0.0.1", PORT))
+
+    results = multiprocessing.Queue()
+    process = multiprocessing.Process(target=client, args=(requests, results))
+    process.start()
+
+    start = time.time()
+    while process.is_alive() and results.empty():
+        engine.poll(0.01)
+    elapsed = time.time() - start
+    latencies = sorted(results.get())
+    process.join()
+    server.close()
+
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+
+    return len(latencies) / elapsed, percentile(0.5), percentile(0.99)
+
+
+def main(argv):
+    requests = int(argv[1]) if len(argv) > 1 else 200
+
+    print "%d requests, one at a time" % requests
+    print "%-10s %12s %10s %10s" % ("options", "requests/s", "p50 ms", "p99 ms")
+    for name, options in (("default", None), ("nodelay", {"nodelay": True})):
+        rps, p50, p99 = run(options, requests)
+        print "%-10s %12.0f %10.3f %10.3f" % (name, rps, p50, p99)
+
+
+if __name__ == "__main__":
+    main(sys.argv)
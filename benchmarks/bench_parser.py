@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+###############################################################################
+#
+# Copyright 2012 Pants Developers (see AUTHORS.txt)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+###############################################################################
+"""
+Compares parser objects used as read delimiters with the built-in
+delimiters they stand in for.
+
+Feeds a stream's receive buffer 64kb chunks of newline-delimited lines
+and of length-prefixed frames, and reports how many messages per second
+reach ``on_read`` with a string delimiter or
+:class:`~pants.stream.LengthPrefixed`, and with a parser object that
+does the same job. Usage::
+
+    python benchmarks/bench_parser.py [megabytes]
+"""
+
+import struct
+import sys
+import time
+
+from pants.stream import LengthPrefixed, Stream
+from pants.util.simulation import VirtualEngine
+
+
+HEADER = struct.Struct("!I")
+CHUNK = 2 ** 16
+
+
+class LineParser(object):
+    """
+    Splits lines with a single call to :meth:`str.split`.
+    """
+    def feed(self, buffer, offset):
+        lines = buffer[:].split("\n")
+        rest = lines.pop()
+        return len(buffer) - len(rest), lines
+
+
+class FrameParser(object):
+    """
+    Takes frames with a four byte length prefix.
+    """
+    def feed(self, buffer, offset):
+        unpack_from = HEADER.unpack_from
+        size = HEADER.size
+        end = len(buffer)
+        messages = []
+        position = 0
+        while end - position >= size:
+            length, = unpack_from(buffer, position)
+            if end - position - size < length:
+                break
+            position += size
+            messages.append(buffer[position:position + length])
+            position += length
+        return position, messages
+
+
+class Counter(Stream):
+    messages = 0
+
+    def on_read(self, data):
+        self.messages += 1
+
+
+def run(delimiter, data, total):
+    stream = Counter(engine=VirtualEngine())
+    stream.connected = True
+    stream.read_delimiter = delimiter
+
+    pieces = [data] * (total // len(data) + 1)
+    start = time.time()
+    for piece in pieces:
+        stream._recv_buffer.append(piece)
+        stream._process_recv_buffer()
+    elapsed = time.time() - start
+    return stream.messages / elapsed
+
+
+def main(argv):
+    megabytes = int(argv[1]) if len(argv) > 1 else 32
+    total = megabytes * 2 ** 20
+
+    # Both inputs end part way through a message, so that every chunk
+    # leaves something in the buffer for the next.
+    lines = "".join("event %d ok\n" % i for i in xrange(5000))[:CHUNK]
+    frames = "".join(HEADER.pack(len(p)) + p for p in
+                     ("payload %d" % i for i in xrange(5000)))[:CHUNK]
+
+    print "%d MB in %d byte chunks" % (megabytes, CHUNK)
+    print "%-10s %16s %16s %8s" % ("format", "built-in msg/s", "parser msg/s", "speedup")
+    for name, builtin, parser, data in (
+            ("lines", "\n", LineParser(), lines),
+            ("frames", LengthPrefixed(HEADER), FrameParser(), frames)):
+        before = run(builtin, data, total)
+        after = run(parser, data, total)
+        print "%-10s %16.0f %16.0f %7.2fx" % (name, before, after, after / before)
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+###############################################################################
+#
+# Copyright 2012 Pants Developers (see AUTHORS.txt)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+###############################################################################
+"""
+Compares per-message and batched delivery of received records.
+
+Feeds a stream's receive buffer 64kb chunks of fixed-size binary records
+and of newline-delimited lines, and reports how many messages per second
+reach the application through ``on_read`` and through
+``on_read_batch``. Usage::
+
+    python benchmarks/bench_read_batch.py [megabytes]
+"""
+
+import struct
+import sys
+import time
+
+from pants.stream import Stream
+from pants.util.simulation import VirtualEngine
+
+
+RECORD = struct.Struct("<IdH")
+CHUNK = 2 ** 16
+
+
+class Counter(Stream):
+    messages = 0
+
+    def on_read(self, *fields):
+        self.messages += 1
+
+    def count_batch(self, messages):
+        self.messages += len(messages)
+
+
+def chunks(data, total):
+    pieces = []
+    sent = 0
+    while sent < total:
+        pieces.append(data)
+        sent += len(data)
+    return pieces
+
+
+def run(delimiter, data, total, batched):
+    stream = Counter(engine=VirtualEngine())
+    stream.connected = True
+    stream.read_delimiter = delimiter
+    if batched:
+        stream.on_read_batch = stream.count_batch
+
+    pieces = chunks(data, total)
+    start = time.time()
+    for piece in pieces:
+        stream._recv_buffer.append(piece)
+        stream._process_recv_buffer()
+    elapsed = time.time() - start
+    return stream.messages / elapsed
+
+
+def main(argv):
+    megabytes = int(argv[1]) if len(argv) > 1 else 32
+    total = megabytes * 2 ** 20
+
+    records = "".join(RECORD.pack(i, i * 0.5, i & 0xFFFF)
+                      for i in xrange(CHUNK // RECORD.size))
+    lines = "".join("event %d ok\n" % i for i in xrange(5000))[:CHUNK]
+
+    print "%d MB in %d byte chunks" % (megabytes, CHUNK)
+    print "%-10s %16s %16s %8s" % ("delimiter", "on_read msg/s", "batch msg/s", "speedup")
+    for name, delimiter, data in (("struct", RECORD, records), ("string", "\n", lines)):
+        single = run(delimiter, data, total, False)
+        batched = run(delimiter, data, total, True)
+        print "%-10s %16.0f %16.0f %7.2fx" % (name, single, batched, batched / single)
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+###############################################################################
+#
+# Copyright 2012 Pants Developers (see AUTHORS.txt)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+###############################################################################
+"""
+Measures the cost of splitting received data into messages.
+
+Feeds a stream, over a virtual socket, with many small line-delimited
+messages delivered in bursts of 256kb, the most a stream reads before
+processing its buffer, and with one large fixed-length message
+delivered in pieces of 64kb. Reports the time taken and the message
+rate. Usage::
+
+    python benchmarks/bench_recv_buffer.py [lines] [megabytes]
+"""
+
+import sys
+import time
+
+from pants.stream import Stream
+from pants.util.simulation import VirtualEngine
+
+
+class Counter(Stream):
+    def __init__(self, **kwargs):
+        Stream.__init__(self, **kwargs)
+        self.count = 0
+        self.received = 0
+
+    def on_read(self, data):
+        self.count += 1
+        self.received += len(data)
+
+
+def feed(delimiter, data, total, piece):
+    engine = VirtualEngine()
+    sock, other = engine.socketpair()
+    stream = Counter(engine=engine, socket=other)
+    stream._handle_connect_event()
+    stream.read_delimiter = delimiter
+
+    start = time.time()
+    for i in xrange(0, total, len(data)):
+        for j in xrange(0, len(data), piece):
+            sock.sendall(data[j:j + piece])
+            engine.poll(0)
+    return time.time() - start, stream.count
+
+
+def main(argv):
+    lines = int(argv[1]) if len(argv) > 1 else 1000000
+    megabytes = int(argv[2]) if len(argv) > 2 else 100
+
+    message = "x" * 30 + "\r\n"
+    burst = message * (Stream.read_budget // len(message))
+    elapsed, count = feed("\r\n", burst, lines * len(message), len(burst))
+    print "%d line-delimited messages: %.2fs, %.0f messages/s" % (
+        count, elapsed, count / elapsed)
+
+    size = megabytes * 2 ** 20
+    elapsed, count = feed(size, "x" * (4 * 2 ** 20), size, 2 ** 16)
+    print "%dmb fixed-length message: %.2fs, %.0f mb/s" % (
+        megabytes, elapsed, megabytes / elapsed)
+
+
+if __name__ == "__main__":
+    main(sys.argv)
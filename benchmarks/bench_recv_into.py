@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+###############################################################################
+#
+# Copyright 2012 Pants Developers (see AUTHORS.txt)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+###############################################################################
+"""
+Measures receiving data into pooled buffers.
+
+Streams a large amount of data through a local socket pair, then sends
+one small message per round to each of many mostly idle connections.
+Reports throughput, the final read size of the bulk stream, the number
+of receive buffers the engine allocated and the process's peak RSS.
+Usage::
+
+    python benchmarks/bench_recv_into.py [megabytes] [connections] [rounds]
+"""
+
+import resource
+import socket
+import sys
+import threading
+import time
+
+from pants.engine import Engine
+from pants.stream import Stream
+
+
+class Counter(Stream):
+    received = 0
+
+    def on_read(self, data):
+        self.received += len(data)
+
+
+def pool_allocations(engine):
+    pool = getattr(engine, "_buffer_pool", None)
+    return pool.allocations if pool is not None else "n/a"
+
+
+def bulk(megabytes):
+    engine = Engine()
+    a, b = socket.socketpair()
+    stream = Counter(engine=engine, socket=a)
+    stream._handle_connect_event()
+
+    total = megabytes * 2 ** 20
+    chunk = "x" * 2 ** 16
+    def send():
+        for i in xrange(total // len(chunk)):
+            b.sendall(chunk)
+    writer = threading.Thread(target=send)
+
+    start = time.time()
+    writer.start()
+    while stream.received < total:
+        engine.poll(0.01)
+    elapsed = time.time() - start
+    writer.join()
+
+    print "%dmb bulk: %.2fs, %.0f mb/s, recv size %d, %s buffers allocated" % (
+        megabytes, elapsed, megabytes / elapsed, stream._recv_amount,
+        pool_allocations(engine))
+    stream.close()
+    b.close()
+
+
+def idle(connections, rounds):
+    engine = Engine()
+    streams = []
+    peers = []
+    for i in xrange(connections):
+        a, b = socket.socketpair()
+        stream = Counter(engine=engine, socket=a)
+        stream._handle_connect_event()
+        streams.append(stream)
+        peers.append(b)
+
+    message = "x" * 100
+    start = time.time()
+    for i in xrange(rounds):
+        for peer in peers:
+            peer.send(message)
+        engine.poll(0)
+    elapsed = time.time() - start
+
+    print "%d connections, %d rounds: %.2fs, %.0f reads/s, %s buffers allocated" % (
+        connections, rounds, elapsed, connections * rounds / elapsed,
+        pool_allocations(engine))
+
+    for stream in streams:
+        stream.close()
+    for peer in peers:
+        peer.close()
+
+
+def main(argv):
+    megabytes = int(argv[1]) if len(argv) > 1 else 1024
+    connections = int(argv[2]) if len(argv) > 2 else 5000
+    rounds = int(argv[3]) if len(argv) > 3 else 20
+
+    bulk(megabytes)
+    idle(connections, rounds)
+    print "peak rss: %dkb" % resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+###############################################################################
+#
+# Copyright 2012 Pants Developers (see AUTHORS.txt)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+###############################################################################
+"""
+Measures how timer slack reduces engine wakeups.
+
+Runs a number of heartbeat cycles with slightly different intervals on
+a virtual clock, with and without slack, and reports the number of
+times the engine woke up per second of virtual time along with the
+worst lateness of any run. Usage::
+
+    python benchmarks/bench_slack.py [timers] [seconds]
+"""
+
+import random
+import sys
+
+from pants.util.simulation import VirtualEngine
+
+
+def run(timers, seconds, slack):
+    random.seed(1)
+    engine = VirtualEngine()
+    lateness = [0.0]
+
+    def heartbeat(state):
+        now = engine.latest_poll_time
+        late = now - state[0]
+        if late > lateness[0]:
+            lateness[0] = late
+        state[0] = now + state[1]
+
+    for i in xrange(timers):
+        interval = random.uniform(0.9, 1.1)
+        state = [interval, interval]
+        engine.cycle(interval, heartbeat, state, slack=slack)
+
+    polls = engine._poller.polls
+    engine.run(seconds)
+    return (engine._poller.polls - polls) / float(seconds), lateness[0]
+
+
+def main(argv):
+    timers = int(argv[1]) if len(argv) > 1 else 2000
+    seconds = float(argv[2]) if len(argv) > 2 else 60.0
+
+    print "%d cycles of ~1s, %.0f virtual seconds" % (timers, seconds)
+    print "%-8s %14s %14s" % ("slack", "wakeups/s", "max late (ms)")
+    for slack in (0, 0.01, 0.05, 0.25):
+        wakeups, late = run(timers, seconds, slack)
+        print "%-8s %14.1f %14.2f" % (slack, wakeups, late * 1000)
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+###############################################################################
+#
+# Copyright 2012 Pants Developers (see AUTHORS.txt)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+###############################################################################
+"""
+Measures delimiter searching against slow clients.
+
+Each client sends a 60kb block of HTTP-style headers a few bytes at a
+time, over a virtual socket, so that the stream searches its buffer for
+the end of the block after every small read. Runs with a string and a
+regular expression delimiter and reports the time taken and the rate
+at which header data is accepted. Usage::
+
+    python benchmarks/bench_slow_clients.py [clients] [piece]
+"""
+
+import re
+import sys
+import time
+
+from pants.stream import Stream
+from pants.util.simulation import VirtualEngine
+
+
+HEADERS = "".join("X-Header-%d: %s\r\n" % (i, "v" * 40) for i in xrange(1100))
+BLOCK = HEADERS[:60 * 1024 - 4] + "\r\n\r\n"
+
+
+class Headers(Stream):
+    blocks = 0
+
+    def on_read(self, data):
+        self.blocks += 1
+
+
+def run(delimiter, clients, piece):
+    engine = VirtualEngine()
+    socks = []
+    streams = []
+    for i in xrange(clients):
+        sock, other = engine.socketpair()
+        stream = Headers(engine=engine, socket=other)
+        stream._handle_connect_event()
+        stream.read_delimiter = delimiter
+        socks.append(sock)
+        streams.append(stream)
+
+    start = time.time()
+    for i in xrange(0, len(BLOCK), piece):
+        data = BLOCK[i:i + piece]
+        for sock in socks:
+            sock.send(data)
+        engine.poll(0)
+    elapsed = time.time() - start
+
+    assert all(stream.blocks == 1 for stream in streams)
+    return elapsed
+
+
+def main(argv):
+    clients = int(argv[1]) if len(argv) > 1 else 20
+    piece = int(argv[2]) if len(argv) > 2 else 16
+
+    total = clients * len(BLOCK) / float(2 ** 20)
+    print "%d clients sending %d bytes at a time" % (clients, piece)
+    for name, delimiter in (("string", "\r\n\r\n"),
+                            ("regex", re.compile(r"\r\n\r\n"))):
+        elapsed = run(delimiter, clients, piece)
+        print "%-8s %.2fs, %.2f mb/s" % (name, elapsed, total / elapsed)
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+###############################################################################
+#
+# Copyright 2012 Pants Developers (see AUTHORS.txt)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+###############################################################################
+"""
+Compares the throughput of responses sent over TLS, with and without
+the ``nodelay`` socket option, with the same responses sent in plain
+text.
+
+Runs a Pants server that answers each request with a small header and
+a body, written either as one large string, as static content would be,
+or as many 1kb strings, as a rendered template would be, and a client in
+a separate process that makes requests one at a time and reads each
+response in full. A certificate and key in PEM format are required.
+Usage::
+
+    python benchmarks/bench_ssl_write.py certfile [megabytes]
+"""
+
+import multiprocessing
+import socket
+import ssl
+import sys
+import time
+
+import pants
+from pants.engine import Engine
+
+
+PORT = 4082
+REQUEST = "GET /static\n"
+HEADER = "200 OK\n"
+RESPONSE_SIZE = 2 ** 20
+PIECE = 2 ** 10
+
+
+class Responder(pants.Stream):
+    pieces = False
+
+    def on_connect(self):
+        self.read_delimiter = "\n"
+
+    def on_read(self, data):
+        self.write(HEADER)
+        if self.pieces:
+            piece = "x" * PIECE
+            for i in xrange(RESPONSE_SIZE // PIECE):
+                self.write(piece)
+        else:
+            self.write("x" * RESPONSE_SIZE)
+
+
+class PieceResponder(Responder):
+    pieces = True
+
+
+def client(use_ssl, requests, results):
+    sock = socket.create_connection(("127.0.0.1", PORT))
+    if use_ssl:
+        sock = ssl.wrap_socket(sock)
+    expected = len(HEADER) + RESPONSE_SIZE
+    buf = bytearray(2 ** 16)
+
+    start = time.time()
+    for i in xrange(requests):
+        sock.sendall(REQUEST)
+        received = 0
+        while received < expected:
+            received += sock.recv_into(buf)
+    results.put(time.time() - start)
+    sock.close()
+
+
+def run(certfile, use_ssl, connection_class, requests, socket_options=None):
+    engine = Engine()
+    ssl_options = None
+    if use_ssl:
+        ssl_options = {"certfile": certfile, "keyfile": certfile}
+    server = pants.Server(ConnectionClass=connection_class, engine=engine,
+                          ssl_options=ssl_options,
+                          socket_options=socket_options)
+    server.listen(("127.0.0.1", PORT))
+
+    results = multiprocessing.Queue()
+    process = multiprocessing.Process(target=client,
+                                      args=(use_ssl, requests, results))
+    process.start()
+
+    while process.is_alive() and results.empty():
+        engine.poll(0.01)
+    elapsed = results.get()
+    process.join()
+    server.close()
+
+    return requests * RESPONSE_SIZE / elapsed / 2 ** 20
+
+
+def main(argv):
+    if len(argv) < 2:
+        print __doc__
+        return
+    certfile = argv[1]
+    megabytes = int(argv[2]) if len(argv) > 2 else 256
+    requests = megabytes * 2 ** 20 // RESPONSE_SIZE
+
+    print "%d responses of %d bytes" % (requests, RESPONSE_SIZE)
+    print "%-8s %12s %12s %16s" % ("body", "plain MB/s", "TLS MB/s",
+                                   "TLS nodelay MB/s")
+    for name, connection_class in (("string", Responder), ("pieces", PieceResponder)):
+        plain = run(certfile, False, connection_class, requests)
+        tls = run(certfile, True, connection_class, requests)
+        nodelay = run(certfile, True, connection_class, requests,
+                      {"nodelay": True})
+        print "%-8s %12.1f %12.1f %16.1f" % (name, plain, tls, nodelay)
+
+
+if __name__ == "__main__":
+    main(sys.argv)
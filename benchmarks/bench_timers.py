@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+###############################################################################
+#
+# Copyright 2012 Pants Developers (see AUTHORS.txt)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+###############################################################################
+"""
+Microbenchmark for the engine's deferred timer queue.
+
+Measures the cost of inserting, cancelling and expiring deferreds at
+several queue sizes, of re-arming timeouts on the timing wheel, and of
+running an hour of mixed timer activity on a virtual clock. Usage::
+
+    python benchmarks/bench_timers.py [count ...]
+"""
+
+import random
+import sys
+import time
+
+from pants.engine import Engine
+from pants.util.simulation import VirtualEngine
+
+
+def noop():
+    pass
+
+
+def bench_insert(count):
+    engine = Engine()
+    delays = [random.uniform(1, 100) for _ in xrange(count)]
+    start = time.time()
+    for delay in delays:
+        engine.defer(delay, noop)
+    return time.time() - start
+
+
+def bench_cancel(count):
+    engine = Engine()
+    timers = [engine.defer(random.uniform(1, 100), noop) for _ in xrange(count)]
+    random.shuffle(timers)
+    start = time.time()
+    for timer in timers:
+        timer.cancel()
+    return time.time() - start
+
+
+def bench_rearm(count):
+    # The pattern used by keep-alive timeouts: cancel, then defer again.
+    engine = Engine()
+    timers = [engine.defer(random.uniform(1, 100), noop) for _ in xrange(count)]
+    start = time.time()
+    for timer in timers:
+        timer.cancel()
+        engine.defer(random.uniform(1, 100), noop)
+    return time.time() - start
+
+
+def bench_rearm_timeout(count):
+    # As above, using the timing wheel.
+    engine = Engine()
+    timers = [engine.timeout(random.uniform(1, 100), noop) for _ in xrange(count)]
+    start = time.time()
+    for timer in timers:
+        timer.cancel()
+        engine.timeout(random.uniform(1, 100), noop)
+    return time.time() - start
+
+
+def bench_expire(count):
+    engine = Engine()
+    for _ in xrange(count):
+        engine.defer(random.uniform(1, 100), noop)
+    # Pretend that every deferred is due.
+    for timer in engine._deferreds:
+        timer.end -= 1000
+    start = time.time()
+    engine.poll(0)
+    return time.time() - start
+
+
+def bench_simulated_hour(count):
+    # Deferreds, cycles and timeouts spread over an hour of virtual time,
+    # with a quarter of the timeouts cancelled before they expire.
+    engine = VirtualEngine()
+    for i in xrange(count // 4):
+        engine.defer(random.uniform(1, 3600), noop)
+        engine.timeout(random.uniform(1, 3600), noop)
+        engine.timeout(random.uniform(1, 3600), noop).cancel()
+    for i in xrange(count // 4 // 1000 or 1):
+        engine.cycle(random.uniform(1, 60), noop)
+    start = time.time()
+    engine.run(3600)
+    return time.time() - start
+
+
+def main(counts):
+    print "%10s %12s %12s %12s %12s %12s %12s" % ("timers", "insert", "cancel",
+                                                   "re-arm", "re-arm (tw)",
+                                                   "expire", "sim. hour")
+    for count in counts:
+        results = [bench(count) * 1e9 / count for bench in
+                   (bench_insert, bench_cancel, bench_rearm,
+                    bench_rearm_timeout, bench_expire, bench_simulated_hour)]
+        print "%10d %10dns %10dns %10dns %10dns %10dns %10dns" % ((count,) +
+                                                                  tuple(results))
+
+
+if __name__ == "__main__":
+    counts = [int(arg) for arg in sys.argv[1:]] or [10000, 100000, 1000000]
+    main(counts)
@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+###############################################################################
+#
+# Copyright 2012 Pants Developers (see AUTHORS.txt)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+###############################################################################
+"""
+Compares writing binary records with write_packed and write_many.
+
+Writes batches of fixed-size records to a stream connected to a virtual
+socket, either one write_packed call per record or one write_many call
+per batch, and reports records per second both for queueing the data
+and for delivering it to the other end. Usage::
+
+    python benchmarks/bench_write_many.py [records] [batch]
+"""
+
+import struct
+import sys
+import time
+
+from pants.stream import Stream
+from pants.util.simulation import VirtualEngine
+
+
+RECORD = struct.Struct("<IdH")
+
+
+class Counter(Stream):
+    received = 0
+
+    def on_read(self, data):
+        self.received += len(data)
+
+
+def run(method, records, batch):
+    engine = VirtualEngine()
+    sender, receiver = engine.stream_pair(Stream, Counter)
+    data = [(i, i * 0.5, i & 0xFFFF) for i in xrange(batch)]
+    total = (records // batch) * batch * RECORD.size
+
+    queued = 0.0
+    start = time.time()
+    for i in xrange(records // batch):
+        begin = time.time()
+        if method == "write_packed":
+            for record in data:
+                sender.write_packed(*record, format=RECORD.format)
+        else:
+            sender.write_many(RECORD, data)
+        queued += time.time() - begin
+        engine.run(0.01)
+
+    while receiver.received < total:
+        engine.run(0.01)
+    elapsed = time.time() - start
+
+    count = float(records // batch * batch)
+    return count / queued, count / elapsed
+
+
+def main(argv):
+    records = int(argv[1]) if len(argv) > 1 else 500000
+    batch = int(argv[2]) if len(argv) > 2 else 1000
+
+    print "%d records of %d bytes, %d per batch" % (records, RECORD.size, batch)
+    print "%-14s %16s %16s" % ("method", "queued rec/s", "delivered rec/s")
+    for method in ("write_packed", "write_many"):
+        queued, delivered = run(method, records, batch)
+        print "%-14s %16.0f %16.0f" % (method, queued, delivered)
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+###############################################################################
+#
+# Copyright 2012 Pants Developers (see AUTHORS.txt)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+###############################################################################
+"""
+Measures the cost of buffering and sending many small writes.
+
+Writes responses made of many small strings to a stream over a local
+socket pair, flushing once per response, and then buffers a large
+number of small writes before flushing them all while a slow reader
+drains the socket. Usage::
+
+    python benchmarks/bench_writev.py [responses] [writes]
+"""
+
+import socket
+import sys
+import threading
+import time
+
+from pants.engine import Engine
+from pants.stream import Stream
+
+
+HEADER = "X-Header: some header value\r\n"
+
+
+def drain(sock, total, chunk=2 ** 16):
+    received = 0
+    while received < total:
+        data = sock.recv(chunk)
+        if not data:
+            break
+        received += len(data)
+
+
+def run(total, write):
+    engine = Engine()
+    a, b = socket.socketpair()
+    stream = Stream(engine=engine, socket=a)
+    stream._handle_connect_event()
+
+    reader = threading.Thread(target=drain, args=(b, total))
+    reader.start()
+
+    start = time.time()
+    write(stream)
+    while stream._send_buffer:
+        engine.poll(0.01)
+    reader.join()
+    elapsed = time.time() - start
+
+    stream.close()
+    b.close()
+    return elapsed
+
+
+def main(argv):
+    responses = int(argv[1]) if len(argv) > 1 else 50000
+    writes = int(argv[2]) if len(argv) > 2 else 50000
+
+    def small_responses(stream):
+        for i in xrange(responses):
+            stream.write("HTTP/1.1 200 OK\r\n")
+            for j in xrange(10):
+                stream.write(HEADER)
+            stream.write("\r\n", flush=True)
+
+    size = responses * (len("HTTP/1.1 200 OK\r\n") + len(HEADER) * 10 + 2)
+    elapsed = run(size, small_responses)
+    print "%d responses of 12 writes: %.2fs, %.0f responses/s" % (
+        responses, elapsed, responses / elapsed)
+
+    def many_writes(stream):
+        for i in xrange(writes):
+            stream.write(HEADER)
+        stream.flush()
+
+    elapsed = run(writes * len(HEADER), many_writes)
+    print "%d buffered writes: %.2fs, %.0f writes/s" % (
+        writes, elapsed, writes / elapsed)
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,299 @@
+###############################################################################
+#
+# Copyright 2012 Pants Developers (see AUTHORS.txt)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+###############################################################################
+"""
+The receive buffer and buffer pool used by channels. Intended for
+internal use only.
+"""
+
+###############################################################################
+# Imports
+###############################################################################
+
+from struct import Struct
+
+
+###############################################################################
+# Constants
+###############################################################################
+
+# The number of consumed bytes that must be present at the start of a
+# buffer before it is compacted.
+_COMPACTION_THRESHOLD = 2 ** 16
+
+# The smallest and largest size classes of a buffer pool.
+_POOL_MIN_SIZE = 2 ** 12
+_POOL_MAX_SIZE = 2 ** 18
+
+# The number of free buffers a pool keeps in each size class.
+_POOL_MAX_FREE = 8
+
+# The number of records unpacked by a single call when unpacking many.
+_UNPACK_BATCH = 64
+
+# Struct format -> (Struct for _UNPACK_BATCH records or None, fields per
+# record).
+_batch_structs = {}
+
+
+###############################################################################
+# Functions
+###############################################################################
+
+def _batch_struct(struct):
+    """
+    Return a Struct that unpacks ``_UNPACK_BATCH`` consecutive records
+    of *struct* at once, or None if records can't be laid out back to
+    back that way, along with the number of fields in each record.
+    """
+    fmt = struct.format
+    try:
+        return _batch_structs[fmt]
+    except KeyError:
+        pass
+
+    if fmt[:1] in "@=<>!":
+        order, body = fmt[0], fmt[1:]
+    else:
+        order, body = "", fmt
+
+    batch = Struct(order + body * _UNPACK_BATCH)
+    if batch.size != struct.size * _UNPACK_BATCH:
+        # Native alignment would pad between records.
+        batch = None
+
+    fields = len(struct.unpack("\0" * struct.size))
+    _batch_structs[fmt] = result = (batch, fields)
+    return result
+
+
+###############################################################################
+# _RecvBuffer Class
+###############################################################################
+
+class _RecvBuffer(object):
+    """
+    A buffer of received data.
+
+    Data is appended to a :obj:`bytearray` and read from an offset that
+    advances as data is consumed, so taking a message from the front of
+    the buffer copies only that message, however much data follows it.
+    Consumed space is reclaimed when more data is appended, once it
+    makes up most of the buffer, or as soon as the buffer is emptied.
+
+    Offsets passed to and returned by the buffer's methods are relative
+    to the first unconsumed byte.
+    """
+    def __init__(self):
+        self._data = bytearray()
+        self._start = 0
+
+    def __len__(self):
+        return len(self._data) - self._start
+
+    def __nonzero__(self):
+        return len(self._data) > self._start
+
+    def __repr__(self):
+        return "<%s (%d bytes)>" % (self.__class__.__name__, len(self))
+
+    def append(self, data):
+        """
+        Add data to the end of the buffer.
+        """
+        if (self._start >= _COMPACTION_THRESHOLD and
+                self._start * 2 >= len(self._data)):
+            del self._data[:self._start]
+            self._start = 0
+
+        self._data += data
+
+    def clear(self):
+        """
+        Discard everything in the buffer.
+        """
+        self._data = bytearray()
+        self._start = 0
+
+    def find(self, sub, start=0):
+        """
+        Return the offset of the first occurrence of *sub* at or after
+        *start*, or -1 if there is none.
+        """
+        index = self._data.find(sub, self._start + start)
+        if index == -1:
+            return -1
+        return index - self._start
+
+    def view(self, start=0):
+        """
+        Return a read-only :obj:`buffer` over the unconsumed data from
+        *start* onwards, without copying it. The view must not be kept
+        once more data has been appended or consumed.
+        """
+        return buffer(self._data, self._start + start)
+
+    def peek(self, size=None):
+        """
+        Return a string of the first *size* bytes of the buffer, or of
+        all of it, without consuming them.
+        """
+        if size is None:
+            return buffer(self._data, self._start)[:]
+        return buffer(self._data, self._start, size)[:]
+
+    def read(self, size=None):
+        """
+        Consume and return a string of the first *size* bytes of the
+        buffer, or of all of it.
+        """
+        data = self.peek(size)
+        self.skip(len(data))
+        return data
+
+    def read_view(self, size=None):
+        """
+        Consume the first *size* bytes of the buffer, or all of it, and
+        return them as a :obj:`memoryview`. When that takes everything
+        in the buffer, the buffer hands over its storage rather than
+        copying it.
+        """
+        if size is None or size >= len(self):
+            view = memoryview(self._data)[self._start:]
+            self._data = bytearray()
+            self._start = 0
+            return view
+        return memoryview(self.read(size))
+
+    def read_until(self, sub, start=0):
+        """
+        Consume and return a string of the data before the first
+        occurrence of *sub* at or after *start*, consuming *sub* too, or
+        return None if there is no such occurrence.
+        """
+        data = self._data
+        index = data.find(sub, self._start + start)
+        start = self._start
+        if index == -1:
+            return None
+
+        message = str(data[start:index])
+        self._start = index + len(sub)
+        if self._start >= len(data):
+            self._data = bytearray()
+            self._start = 0
+        return message
+
+    def unpack_from(self, struct):
+        """
+        Unpack the first ``struct.size`` bytes of the buffer with a
+        :class:`struct.Struct`, without consuming them.
+        """
+        return struct.unpack_from(self._data, self._start)
+
+    def unpack(self, struct):
+        """
+        Consume and unpack the first ``struct.size`` bytes of the buffer
+        with a :class:`struct.Struct`.
+        """
+        data = struct.unpack_from(self._data, self._start)
+        self.skip(struct.size)
+        return data
+
+    def unpack_many(self, struct):
+        """
+        Consume and unpack every complete ``struct.size`` record in the
+        buffer with a :class:`struct.Struct`, returning a list of
+        tuples.
+        """
+        size = struct.size
+        count = len(self) // size
+        if not count:
+            return []
+
+        data = self._data
+        offset = self._start
+        records = []
+
+        batch, fields = _batch_struct(struct)
+        if batch is not None and count >= _UNPACK_BATCH:
+            unpack_from = batch.unpack_from
+            step = batch.size
+            for i in xrange(count // _UNPACK_BATCH):
+                values = iter(unpack_from(data, offset))
+                records.extend(zip(*[values] * fields))
+                offset += step
+
+        unpack_from = struct.unpack_from
+        for i in xrange(len(records), count):
+            records.append(unpack_from(data, offset))
+            offset += size
+
+        self.skip(offset - self._start)
+        return records
+
+    def skip(self, size):
+        """
+        Consume *size* bytes.
+        """
+        self._start += size
+        if self._start >= len(self._data):
+            self._data = bytearray()
+            self._start = 0
+
+
+###############################################################################
+# _BufferPool Class
+###############################################################################
+
+class _BufferPool(object):
+    """
+    A pool of reusable :obj:`bytearray` buffers.
+
+    Buffers come in power-of-two size classes, so that a buffer released
+    by one channel can be reused by any other channel asking for a
+    similar amount. Channels only hold a buffer while reading from their
+    socket, so one pool per engine serves any number of connections
+    with a handful of buffers.
+    """
+    def __init__(self):
+        self._free = {}
+        self.allocations = 0
+
+    def acquire(self, size):
+        """
+        Return a buffer of at least *size* bytes, up to the largest size
+        class.
+        """
+        size_class = _POOL_MIN_SIZE
+        while size_class < size and size_class < _POOL_MAX_SIZE:
+            size_class <<= 1
+
+        free = self._free.get(size_class)
+        if free:
+            return free.pop()
+
+        self.allocations += 1
+        return bytearray(size_class)
+
+    def release(self, buf):
+        """
+        Return a buffer from :meth:`acquire` to the pool.
+        """
+        free = self._free.setdefault(len(buf), [])
+        if len(free) < _POOL_MAX_FREE:
+            free.append(buf)
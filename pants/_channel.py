@@ -33,6 +33,8 @@ import time
 
 from pants.engine import Engine
 from pants.util.sendfile import sendfile
+from pants.util.sockopt import check_socket_options, set_socket_options
+from pants.util.writev import writev
 
 dns = None
 
@@ -75,6 +77,10 @@ if socket.has_ipv6:
 SUPPORTED_FAMILIES = tuple(SUPPORTED_FAMILIES)
 SUPPORTED_TYPES = (socket.SOCK_STREAM, socket.SOCK_DGRAM)
 
+# Sockets backed by a real file descriptor. Both the socket module's
+# wrapper and the raw sockets returned by socket.socketpair() qualify.
+REAL_SOCKET_TYPES = (socket.socket, getattr(socket, "_realsocket", socket.socket))
+
 if sys.platform == "win32":
     FAMILY_ERROR = (10047, "WSAEAFNOSUPPORT")
     NAME_ERROR = (11001, "WSAHOST_NOT_FOUND")
@@ -132,11 +138,24 @@ class _Channel(object):
                        should be added. Defaults to the global engine.
     socket             *Optional.* A pre-existing socket to wrap.
                        Defaults to a newly-created socket.
+    socket_options     *Optional.* A dictionary of socket options to
+                       apply to the channel's socket, overriding the
+                       class's :attr:`socket_options`.
     =================  ================================================
     """
+    #: A dictionary of socket options, such as ``{"nodelay": True}``,
+    #: applied whenever the channel is given a socket. See
+    #: :mod:`pants.util.sockopt` for the available options.
+    socket_options = None
+
     def __init__(self, **kwargs):
         self.engine = kwargs.get("engine", Engine.instance())
 
+        if kwargs.get("socket_options", None) is not None:
+            self.socket_options = kwargs["socket_options"]
+        if self.socket_options:
+            check_socket_options(self.socket_options)
+
         # Socket
         self._socket = None
         self._closed = False
@@ -146,9 +165,14 @@ class _Channel(object):
 
         # I/O attributes
         self._recv_amount = 4096
+        self._send_buffered = 0
 
         # Internal state
         self._events = Engine.ALL_EVENTS
+        self._write_blocked = False
+        self._writing_paused = False
+        self._reading_paused = False
+        self._hangup_pending = False
         if self._socket:
             self.engine.add_channel(self)
 
@@ -156,8 +180,36 @@ class _Channel(object):
         return "%s #%r (%s)" % (self.__class__.__name__, self.fileno,
                 object.__repr__(self))
 
+    # The amounts of buffered outgoing data above which
+    # on_pause_writing is called and at or below which on_drain is then
+    # called. Setting these at the class level makes them easy to
+    # override on a per-class basis.
+    write_high_water = 2 ** 16  # 64kb
+    write_low_water = 2 ** 14  # 16kb
+
     ##### Properties ##########################################################
 
+    @property
+    def priority(self):
+        """
+        The priority with which the engine handles events on the
+        channel. When several channels have events at once, channels
+        with a higher priority are handled first, and among channels
+        of the same priority, listening servers are handled first.
+        Defaults to 0.
+
+        This can be used to keep, for example, a health-check listener
+        responsive while the engine is busy with other channels.
+        """
+        return self.engine._channel_priorities.get(self, 0)
+
+    @priority.setter
+    def priority(self, value):
+        if value:
+            self.engine._channel_priorities[self] = value
+        else:
+            self.engine._channel_priorities.pop(self, None)
+
     @property
     def fileno(self):
         """
@@ -215,6 +267,24 @@ class _Channel(object):
         """
         pass
 
+    def on_pause_writing(self):
+        """
+        Placeholder. Called when the amount of data waiting to be
+        written rises above :attr:`write_high_water`. Until
+        :meth:`on_drain` is called, the peer is reading more slowly
+        than data is being written, and writing more only uses more
+        memory.
+        """
+        pass
+
+    def on_drain(self):
+        """
+        Placeholder. Called, after :meth:`on_pause_writing`, when the
+        amount of data waiting to be written falls to
+        :attr:`write_low_water` or below.
+        """
+        pass
+
     def on_connect(self):
         """
         Placeholder. Called after the channel has connected to a remote
@@ -352,8 +422,22 @@ class _Channel(object):
             raise ValueError("Unsupported socket type.")
 
         sock.setblocking(False)
+        self._socket_apply_options(sock)
         self._socket = sock
 
+    def _socket_apply_options(self, sock):
+        """
+        Apply the channel's :attr:`socket_options` to a socket.
+
+        =========  ============
+        Argument   Description
+        =========  ============
+        sock       The socket to configure.
+        =========  ============
+        """
+        if self.socket_options:
+            set_socket_options(sock, self.socket_options)
+
     def _socket_connect(self, addr):
         """
         Connect the socket to a remote socket at the given address.
@@ -377,7 +461,7 @@ class _Channel(object):
 
         if result in (errno.EAGAIN, errno.EWOULDBLOCK,
                 errno.EINPROGRESS, errno.EALREADY):
-            self._start_waiting_for_write_event()
+            self._wait_until_writable()
             return False
 
         raise socket.error(result, strerror(result))
@@ -461,6 +545,37 @@ class _Channel(object):
         else:
             return data
 
+    def _socket_recv_into(self, buf):
+        """
+        Receive data from the socket into a writable buffer.
+
+        Returns a read-only :obj:`buffer` over the data received, which
+        is only valid until *buf* is reused, or an empty string if no
+        data was available. The data is None if the socket has been
+        closed.
+
+        =========  ============
+        Argument   Description
+        =========  ============
+        buf        A :obj:`bytearray` to receive into. At most
+                   :attr:`_recv_amount` bytes will be received.
+        =========  ============
+        """
+        try:
+            size = self._socket.recv_into(buf, min(self._recv_amount, len(buf)))
+        except socket.error as err:
+            if err.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK):
+                return ''
+            elif err.args[0] == errno.ECONNRESET:
+                return None
+            else:
+                raise
+
+        if not size:
+            return None
+        else:
+            return buffer(buf, 0, size)
+
     def _socket_recvfrom(self):
         """
         Receive data from the socket.
@@ -501,7 +616,7 @@ class _Channel(object):
             return self._socket.send(data)
         except Exception as err:
             if err.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK):
-                self._start_waiting_for_write_event()
+                self._wait_until_writable()
                 return 0
             elif err.args[0] == errno.EPIPE:
                 self.close(flush=False)
@@ -527,7 +642,39 @@ class _Channel(object):
             return self._socket.sendto(data, flags, addr)
         except Exception as err:
             if err.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK):
-                self._start_waiting_for_write_event()
+                self._wait_until_writable()
+                return 0
+            elif err.args[0] == errno.EPIPE:
+                self.close(flush=False)
+                return 0
+            else:
+                raise
+
+    def _socket_sendv(self, buffers, offset=0, fallback=False):
+        """
+        Send data from a list of strings to the socket, with a single
+        system call where possible.
+
+        Returns the number of bytes that were sent to the socket.
+
+        =========  ====================================================
+        Argument   Description
+        =========  ====================================================
+        buffers    The strings of data to send.
+        offset     *Optional.* The number of bytes of the first string
+                   that have already been sent.
+        fallback   *Optional.* If True, the pure-Python writev function
+                   will be used.
+        =========  ====================================================
+        """
+        if not isinstance(self._socket, REAL_SOCKET_TYPES):
+            fallback = True
+
+        try:
+            return writev(self, buffers, offset, fallback)
+        except Exception as err:
+            if err.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK):
+                self._wait_until_writable()
                 return 0
             elif err.args[0] == errno.EPIPE:
                 self.close(flush=False)
@@ -556,7 +703,7 @@ class _Channel(object):
             return sendfile(sfile, self, offset, nbytes, fallback)
         except Exception as err:
             if err.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK):
-                self._start_waiting_for_write_event()
+                self._wait_until_writable()
                 return 0
             elif err.args[0] == errno.EPIPE:
                 self.close(flush=False)
@@ -575,6 +722,15 @@ class _Channel(object):
             self._events = self._events | Engine.WRITE
             self.engine.modify_channel(self)
 
+    def _wait_until_writable(self):
+        """
+        Wait for a write event after the socket has refused to accept
+        more data. In edge-triggered mode, only this guarantees that a
+        write event will be raised.
+        """
+        self._write_blocked = True
+        self._start_waiting_for_write_event()
+
     def _stop_waiting_for_write_event(self):
         """
         Stop waiting for a write event on the channel, update the engine
@@ -584,6 +740,59 @@ class _Channel(object):
             self._events = self._events & (self._events ^ Engine.WRITE)
             self.engine.modify_channel(self)
 
+    def _pause_writing(self):
+        """
+        Note that the amount of buffered outgoing data has risen above
+        the high watermark and call
+        :meth:`~pants._channel._Channel.on_pause_writing`.
+        """
+        self._writing_paused = True
+        self._safely_call(self.on_pause_writing)
+
+    def _data_sent(self, size):
+        """
+        Account for *size* bytes of buffered outgoing data having been
+        sent, and call :meth:`~pants._channel._Channel.on_drain` if
+        that takes the buffer down to the low watermark.
+        """
+        self._send_buffered -= size
+        if self._writing_paused and self._send_buffered <= self.write_low_water:
+            self._writing_paused = False
+            self._safely_call(self.on_drain)
+
+    def _stop_reading(self):
+        """
+        Stop waiting for read events on the channel, and ignore any that
+        are raised, until :meth:`_start_reading` is called.
+        """
+        if self._reading_paused:
+            return
+
+        self._reading_paused = True
+        if self._events & Engine.READ:
+            self._events &= ~Engine.READ
+            self.engine.modify_channel(self)
+
+    def _start_reading(self):
+        """
+        Wait for read events on the channel again. The socket is read
+        on the next iteration of the engine, as data may have arrived
+        that won't raise another event. A hangup raised while reading
+        was stopped is handled then too, after that data.
+        """
+        if not self._reading_paused:
+            return
+
+        self._reading_paused = False
+        if not self._closed:
+            events = Engine.READ
+            if self._hangup_pending:
+                self._hangup_pending = False
+                events |= Engine.HANGUP
+            self._events |= events
+            self.engine.modify_channel(self)
+            self.engine._requeue_channel(self, events)
+
     def _safely_call(self, thing_to_call, *args, **kwargs):
         """
         Safely execute a callable.
@@ -735,7 +944,18 @@ class _Channel(object):
             return
 
         previous_events = self._events
-        self._events = Engine.BASE_EVENTS
+        if events & Engine.WRITE:
+            self._events = Engine.BASE_EVENTS
+            self._write_blocked = False
+        elif self._write_blocked:
+            # Still waiting for the socket to become writable.
+            self._events = Engine.ALL_EVENTS
+        else:
+            self._events = Engine.BASE_EVENTS
+
+        if self._reading_paused:
+            self._events &= ~Engine.READ
+            events &= ~Engine.READ
 
         if events & Engine.READ:
             self._handle_read_event()
@@ -753,9 +973,19 @@ class _Channel(object):
                 return
 
         if events & Engine.HANGUP:
-            self._handle_hangup_event()
-            if self._closed:
-                return
+            if self._reading_paused:
+                # The peer may have sent data before hanging up that
+                # hasn't been read yet. Handle the hangup once reading
+                # resumes.
+                self._hangup_pending = True
+            else:
+                self._handle_hangup_event()
+                if self._closed:
+                    return
+
+        if self._hangup_pending:
+            # Don't keep waking up for a hangup that's been deferred.
+            self._events &= ~Engine.HANGUP
 
         if self._events != previous_events:
             self.engine.modify_channel(self)
@@ -241,23 +241,24 @@ class TelnetConnection(Stream):
         Completely replace the standard recv buffer processing with a custom
         function for optimal telnet performance.
         """
-        while self._recv_buffer:
-            loc = self._recv_buffer.find(IAC)
+        buf = self._recv_buffer
+
+        while buf:
+            loc = buf.find(IAC)
 
             if loc == -1:
-                self._on_telnet_data(self._recv_buffer)
-                self._recv_buffer = ''
+                self._on_telnet_data(buf.read())
                 break
 
             elif loc > 0:
-                self._on_telnet_data(self._recv_buffer[:loc])
-                self._recv_buffer = self._recv_buffer[loc:]
+                self._on_telnet_data(buf.read(loc))
 
-            out = self._on_telnet_iac(self._recv_buffer)
+            data = buf.peek()
+            out = self._on_telnet_iac(data)
             if out is False:
                 break
 
-            self._recv_buffer = out
+            buf.skip(len(data) - len(out))
 
 ###############################################################################
 # TelnetServer Class
@@ -28,6 +28,7 @@ import socket
 import struct
 
 from pants._channel import _Channel
+from pants.stream import LengthPrefixed
 
 
 ###############################################################################
@@ -58,6 +59,7 @@ class Datagram(_Channel):
     ==================  ============
     family              *Optional.* A supported socket family. By default, is :const:`socket.AF_INET`.
     socket              *Optional.* A pre-existing socket to wrap.
+    socket_options      *Optional.* A dictionary of socket options, such as ``{"sndbuf": 2 ** 20}``. See :mod:`pants.util.sockopt`.
     ==================  ============
     """
     def __init__(self, **kwargs):
@@ -78,7 +80,6 @@ class Datagram(_Channel):
         self.read_delimiter = None
         self.regex_search = True
         self._recv_buffer = {}
-        self._recv_buffer_size_limit = 2 ** 16  # 64kb
         self._send_buffer = []
 
         # Channel state
@@ -133,6 +134,8 @@ class Datagram(_Channel):
         self.read_delimiter = None
         self._recv_buffer = {}
         self._send_buffer = []
+        self._send_buffered = 0
+        self._writing_paused = False
 
         self.listening = False
         self._closing = False
@@ -154,6 +157,69 @@ class Datagram(_Channel):
         else:
             self._closing = True
 
+    ##### Properties ##########################################################
+
+    @property
+    def read_delimiter(self):
+        """
+        The read delimiter which determines how incoming data is
+        buffered by the channel before being passed to
+        :meth:`~pants.datagram.Datagram.on_read`.
+
+        Valid values are ``None``, a string, an integer/long, a compiled
+        regular expression, an instance of :class:`struct.Struct` or an
+        instance of :class:`~pants.stream.LengthPrefixed`. They behave
+        as they do for :attr:`pants.stream.Stream.read_delimiter`.
+
+        Data buffered from a single address may not exceed 64kb, or
+        the size of the delimiter if it is larger. A
+        :class:`~pants.stream.LengthPrefixed` delimiter with a
+        *max_length* raises the limit so that a full message fits.
+
+        Attempting to set the read delimiter to any other value will
+        raise a :exc:`TypeError`.
+        """
+        return self._read_delimiter
+
+    @read_delimiter.setter
+    def read_delimiter(self, value):
+        if value is None or isinstance(value, basestring) or \
+                isinstance(value, RegexType):
+            self._read_delimiter = value
+            self._recv_buffer_size_limit = self._buffer_size
+
+        elif isinstance(value, (int, long)):
+            self._read_delimiter = value
+            self._recv_buffer_size_limit = max(self._buffer_size, value)
+
+        elif isinstance(value, Struct):
+            self._read_delimiter = value
+            self._recv_buffer_size_limit = max(self._buffer_size, value.size)
+
+        elif isinstance(value, LengthPrefixed):
+            self._read_delimiter = value
+            self._recv_buffer_size_limit = value._buffer_limit(self._buffer_size)
+
+        else:
+            raise TypeError("Attempted to set read_delimiter to a value with an invalid type.")
+
+    # Setting this at the class level makes it easy to override on a
+    # per-class basis.
+    _buffer_size = 2 ** 16  # 64kb
+
+    @property
+    def writable(self):
+        """
+        True if data written to the channel now can be sent without
+        taking the amount of buffered outgoing data above
+        :attr:`~pants._channel._Channel.write_high_water`. False if the
+        channel is closing or is waiting to drain, between calls to
+        :meth:`~pants.datagram.Datagram.on_pause_writing` and
+        :meth:`~pants.datagram.Datagram.on_drain`.
+        """
+        return not self._closed and not self._closing and \
+                not self._writing_paused
+
     ##### I/O Methods #########################################################
 
     def write(self, data, address=None, flush=False):
@@ -180,12 +246,17 @@ class Datagram(_Channel):
                 return
 
         self._send_buffer.append((data, address))
+        self._send_buffered += len(data)
 
         if flush:
             self._process_send_buffer()
         else:
             self._start_waiting_for_write_event()
 
+        if self._send_buffered > self.write_high_water and \
+                not self._writing_paused:
+            self._pause_writing()
+
     def flush(self):
         """
         Attempt to immediately write any internally buffered data to the
@@ -303,6 +374,30 @@ class Datagram(_Channel):
 
                     self._safely_call(self.on_read, *data)
 
+                elif isinstance(delimiter, LengthPrefixed):
+                    size = delimiter.size
+                    if len(buf) < size:
+                        break
+
+                    fields = delimiter.header.unpack_from(buf)
+                    length = fields[delimiter.length_field]
+                    if not 0 <= length <= delimiter._limit(self._recv_buffer_size_limit):
+                        e = DatagramBufferOverflow(
+                                "Message length %d exceeds limit on %r." % (length, self),
+                                addr
+                            )
+                        self._safely_call(self.on_overflow_error, e)
+                        buf = ""
+                        break
+
+                    if len(buf) < size + length:
+                        break
+
+                    data = buf[size:size + length]
+                    buf = buf[size + length:]
+                    self._safely_call(self.on_read,
+                                      *delimiter._arguments(fields, data))
+
                 elif isinstance(delimiter, RegexType):
                     # Depending on regex_search, we could do this two ways.
                     if self.regex_search:
@@ -357,6 +452,7 @@ class Datagram(_Channel):
                 if bytes_sent == 0:
                     break
                 data = data[bytes_sent:]
+                self._data_sent(bytes_sent)
 
             if data:
                 self._send_buffer.insert(0, (data, addr))
@@ -25,11 +25,26 @@ Asynchronous event processing and timer scheduling.
 ###############################################################################
 
 import bisect
+import collections
+import ctypes
+import ctypes.util
 import errno
 import functools
+import heapq
+import math
+import os
 import select
+import socket
+import struct
 import sys
+import thread
+import threading
 import time
+import traceback
+import weakref
+
+from pants._buffer import _BufferPool
+from pants.util.executor import ThreadPoolExecutor, ProcessPoolExecutor
 
 
 ###############################################################################
@@ -54,6 +69,15 @@ else:
     current_time = time.time
 
 
+###############################################################################
+# Constants
+###############################################################################
+
+# The minimum number of cancelled deferreds that must be present in the
+# heap before it is compacted.
+_COMPACTION_THRESHOLD = 512
+
+
 ###############################################################################
 # Engine Class
 ###############################################################################
@@ -80,12 +104,31 @@ class Engine(object):
     integrated into a pre-existing main loop (see
     :meth:`~pants.engine.Engine.poll`).
 
-    =========  =========================================================
-    Argument   Description
-    =========  =========================================================
-    poller     *Optional.* A specific polling object for the engine to
-               use.
-    =========  =========================================================
+    ===================  ===============================================
+    Argument             Description
+    ===================  ===============================================
+    poller               *Optional.* A specific polling object for the
+                         engine to use.
+    timeout_granularity  *Optional.* The length, in seconds, of one tick
+                         of the timing wheel used by
+                         :meth:`~pants.engine.Engine.timeout`. Defaults
+                         to 0.1.
+    edge_triggered       *Optional.* If True, and the engine uses
+                         epoll(), register channels in edge-triggered
+                         mode. Channels are then registered once and
+                         changing the events a channel is waiting for
+                         costs no system calls. Defaults to False.
+    clock                *Optional.* A callable returning the current
+                         time in seconds, used for all timers. Defaults
+                         to the system clock. See
+                         :mod:`pants.util.simulation`.
+    high_resolution      *Optional.* If True, and timerfd is available,
+                         wake the engine for deferreds and cycles with
+                         a kernel timer armed to the exact deadline,
+                         rather than with the poller's timeout, which
+                         is limited to milliseconds and to no less
+                         than 10ms. Defaults to False.
+    ===================  ===============================================
     """
     # Socket events - these correspond to epoll() states.
     NONE = 0x00
@@ -96,18 +139,57 @@ class Engine(object):
     BASE_EVENTS = READ | ERROR | HANGUP
     ALL_EVENTS = BASE_EVENTS | WRITE
 
-    def __init__(self, poller=None):
-        self.latest_poll_time = current_time()
+    def __init__(self, poller=None, timeout_granularity=0.1,
+                 edge_triggered=False, clock=None, high_resolution=False):
+        self._clock = clock if clock is not None else current_time
+        self.latest_poll_time = self._clock()
 
         self._shutdown = False
         self._running = False
 
         self._channels = {}
+        self._registered_events = {}
+        self._dirty_channels = set()
+        self._interest_changes = 0
+        self._interest_changes_applied = 0
         self._poller = None
+        self._edge_triggered = edge_triggered
+        self._edge_triggered_active = False
+        self._ready_writers = set()
+        self._corked_channels = set()
+        self._requeued_channels = {}
+        self._channel_priorities = weakref.WeakKeyDictionary()
+        self._listening_channels = set()
         self._install_poller(poller)
 
+        # The waker is installed by the first poll.
+        self._waker = None
+        self._wakeup_pending = False
+        self._threadsafe_callbacks = collections.deque()
+
+        self._high_resolution = high_resolution
+        self._timer = None
+        if high_resolution:
+            if clock is not None:
+                log.warning("High resolution timers can't be used with a "
+                            "custom clock.")
+            elif _timerfd_create is None:
+                log.warning("High resolution timers require timerfd.")
+            else:
+                self._install_timer()
+
+        self._thread_pool = None
+        self._process_pool = None
+
+        self._stats = None
+
+        # Scratch buffers shared by every channel's reads.
+        self._buffer_pool = _BufferPool()
+
         self._callbacks = []
         self._deferreds = []
+        self._cancelled_deferreds = 0
+        self._timeouts = _TimingWheel(timeout_granularity, self.latest_poll_time)
 
     @classmethod
     def instance(cls):
@@ -172,6 +254,28 @@ class Engine(object):
         if self._running:
             self._shutdown = True
 
+    def close(self):
+        """
+        Close the file descriptors the engine holds for itself: the
+        waker used by :meth:`~pants.engine.Engine.call_threadsafe` and
+        the timer used for high resolution timers. Channels and the
+        poller are left alone.
+
+        An engine that is polled again after being closed installs a
+        new waker, but no longer uses high resolution timers. Callbacks
+        scheduled with :meth:`~pants.engine.Engine.call_threadsafe`
+        while the engine has no waker run on its next poll.
+        """
+        if self._waker is not None:
+            self.remove_channel(self._waker)
+            self._waker.close()
+            self._waker = None
+
+        if self._timer is not None:
+            self.remove_channel(self._timer)
+            self._timer.close()
+            self._timer = None
+
     def poll(self, poll_timeout):
         """
         Poll the engine.
@@ -187,13 +291,28 @@ class Engine(object):
         poll_timeout  The timeout to be passed to the polling object.
         ============= ============
         """
-        self.latest_poll_time = current_time()
+        self.latest_poll_time = self._clock()
+
+        stats = self._stats
+        if stats is not None:
+            stats.start_iteration()
+
+        if self._waker is None:
+            self._install_waker()
+
+        # Callbacks scheduled before the waker was installed are run
+        # here, as nothing will have woken the engine for them.
+        if self._threadsafe_callbacks:
+            self._run_threadsafe_callbacks()
 
         callbacks, self._callbacks = self._callbacks[:], []
 
         for timer in callbacks:
             try:
-                timer.function()
+                if stats is None:
+                    timer.function()
+                else:
+                    stats.dispatch(timer.function, timer.function)
             except Exception:
                 log.exception("Exception raised while executing timer.")
 
@@ -201,47 +320,223 @@ class Engine(object):
                 self._callbacks.append(timer)
 
         while self._deferreds and self._deferreds[0].end <= self.latest_poll_time:
-            timer = self._deferreds.pop(0)
+            timer = heapq.heappop(self._deferreds)
+            timer.in_heap = False
+
+            if timer.function is None:
+                # Cancelled. See _remove_timer.
+                self._cancelled_deferreds -= 1
+                continue
 
             try:
-                timer.function()
+                if stats is None:
+                    timer.function()
+                else:
+                    stats.dispatch(timer.function, timer.function)
             except Exception:
                 log.exception("Exception raised while executing timer.")
 
             if timer.requeue:
                 timer.end = self.latest_poll_time + timer.delay
-                bisect.insort(self._deferreds, timer)
+                if timer.slack:
+                    timer.end = _align_deadline(timer.end, timer.slack)
+                timer.in_heap = True
+                heapq.heappush(self._deferreds, timer)
+
+        for timer in self._timeouts.expire(self.latest_poll_time):
+            try:
+                if stats is None:
+                    timer.function()
+                else:
+                    stats.dispatch(timer.function, timer.function)
+            except Exception:
+                log.exception("Exception raised while executing timer.")
+
+        if stats is not None:
+            stats.end_timers()
 
         if self._shutdown:
+            if stats is not None:
+                stats.end_iteration(0)
             return
 
+        while self._deferreds and self._deferreds[0].function is None:
+            heapq.heappop(self._deferreds).in_heap = False
+            self._cancelled_deferreds -= 1
+
         if self._deferreds:
-            timeout = self._deferreds[0].end - self.latest_poll_time
+            end = self._deferreds[0].end
+            timeout = end - self.latest_poll_time
+            if timeout > 0.0:
+                if self._timer is not None and timeout < poll_timeout:
+                    # The timer wakes the poller at the deadline.
+                    self._timer.arm(end)
+                else:
+                    poll_timeout = max(min(timeout, poll_timeout), 0.01)
+
+        if self._timeouts:
+            timeout = self._timeouts.next_deadline() - self.latest_poll_time
             if timeout > 0.0:
                 poll_timeout = max(min(timeout, poll_timeout), 0.01)
 
-        if not self._channels:
-            time.sleep(poll_timeout)  # Don't burn CPU.
-            return
+        if self._corked_channels:
+            self._flush_corked_channels()
+
+        if self._ready_writers:
+            self._flush_ready_writers()
+            if self._ready_writers:
+                poll_timeout = 0
+
+        if self._requeued_channels:
+            poll_timeout = 0
+
+        if self._dirty_channels:
+            self._apply_interest_changes()
+
+        if stats is not None:
+            stats.start_wait()
 
         try:
-            events = self._poller.poll(poll_timeout)
+            ready = self._poller.poll(poll_timeout)
         except Exception as err:
             if err.args[0] == errno.EINTR:
                 log.debug("Interrupted system call.")
+                if stats is not None:
+                    stats.end_iteration(0)
                 return
             else:
                 raise
 
-        for fileno, events in events.iteritems():
+        if stats is not None:
+            stats.end_wait()
+
+        if self._requeued_channels:
+            requeued, self._requeued_channels = self._requeued_channels, {}
+            for channel, events in requeued.iteritems():
+                fileno = channel.fileno
+                if self._channels.get(fileno) is channel:
+                    ready[fileno] = ready.get(fileno, 0) | events
+
+        edge_triggered = self._edge_triggered_active
+
+        # Listening channels are handled first, so that connections
+        # are accepted before data from those already open is read.
+        listening = self._listening_channels
+        if self._channel_priorities:
+            priorities = self._channel_priorities
+            channels = self._channels
+            items = sorted(ready.iteritems(),
+                           key=lambda item: (-priorities.get(channels[item[0]], 0),
+                                             item[0] not in listening))
+        else:
+            items = ready.iteritems()
+            if listening and len(ready) > 1:
+                first = [(fileno, ready[fileno]) for fileno in listening
+                         if fileno in ready]
+                if first:
+                    items = first + [item for item in ready.iteritems()
+                                     if item[0] not in listening]
+
+        for fileno, events in items:
             channel = self._channels[fileno]
+            if edge_triggered:
+                # Every channel is registered for every event, so drop
+                # those it isn't waiting for.
+                events &= channel._events
+                if not events:
+                    continue
             try:
-                channel._handle_events(events)
+                if stats is None:
+                    channel._handle_events(events)
+                else:
+                    stats.dispatch(channel, channel._handle_events, events)
             except (KeyboardInterrupt, SystemExit):
                 raise
             except Exception:
                 log.exception("Error while handling events on %r." % channel)
 
+        if self._corked_channels:
+            self._flush_corked_channels()
+
+        if stats is not None:
+            stats.end_iteration(len(ready))
+
+    ##### Instrumentation Methods #############################################
+
+    def enable_instrumentation(self, slow_callback_threshold=0.1):
+        """
+        Start collecting statistics about the engine's main loop. See
+        :meth:`~pants.engine.Engine.stats`.
+
+        While instrumentation is enabled, any single timer or channel
+        event handler that runs for longer than
+        *slow_callback_threshold* seconds is logged as a warning, along
+        with the stack of the engine's thread at the time it was found
+        to be running slowly.
+
+        Calling this method again resets the statistics. Times are
+        always measured with the system clock, even if the engine was
+        given a different *clock*.
+
+        ========================  ========================================
+        Argument                  Description
+        ========================  ========================================
+        slow_callback_threshold   *Optional.* The time, in seconds, after
+                                  which a callback is considered slow.
+                                  Defaults to 0.1. None disables
+                                  slow-callback detection.
+        ========================  ========================================
+        """
+        self.disable_instrumentation()
+        self._stats = _EngineStats(slow_callback_threshold)
+
+    def disable_instrumentation(self):
+        """
+        Stop collecting statistics about the engine's main loop.
+        """
+        if self._stats is not None:
+            self._stats.close()
+            self._stats = None
+
+    def stats(self):
+        """
+        Return a dict of statistics about the engine's main loop, or
+        None if :meth:`~pants.engine.Engine.enable_instrumentation` has
+        not been called.
+
+        =======================  =============================================
+        Key                      Description
+        =======================  =============================================
+        iterations               The number of calls to
+                                 :meth:`~pants.engine.Engine.poll`.
+        busy_time                Total seconds spent running timers and
+                                 handling events.
+        timer_time               Total seconds spent running timers.
+        io_time                  Total seconds spent handling channel events.
+        wait_time                Total seconds spent waiting for events.
+        max_iteration_time       The longest time spent on one iteration,
+                                 excluding waiting for events.
+        iteration_histogram      A list of ``(upper bound, count)`` pairs
+                                 counting iterations by busy time, in
+                                 seconds. The last bound is infinite.
+        ready_events             Total number of channels with events.
+        max_ready_events         The most channels with events in one
+                                 iteration.
+        ready_events_histogram   A list of ``(upper bound, count)`` pairs
+                                 counting iterations by the number of
+                                 channels with events.
+        slow_callbacks           The number of slow callbacks detected.
+        interest_changes_saved   See
+                                 :attr:`~pants.engine.Engine.interest_changes_saved`.
+        =======================  =============================================
+        """
+        if self._stats is None:
+            return None
+
+        stats = self._stats.snapshot()
+        stats["interest_changes_saved"] = self.interest_changes_saved
+        return stats
+
     ##### Timer Methods #######################################################
 
     def callback(self, function, *args, **kwargs):
@@ -268,6 +563,119 @@ class Engine(object):
 
         return timer
 
+    def call_threadsafe(self, function, *args, **kwargs):
+        """
+        Schedule a callback from another thread.
+
+        This is the only engine method that is safe to call from a
+        thread other than the one running the engine. The callable is
+        executed on the engine's thread as soon as possible. If the
+        engine is blocked waiting for events it is woken up immediately,
+        rather than at the end of the poll timeout.
+
+        Unlike :meth:`~pants.engine.Engine.callback`, this method does
+        not return a means of cancelling the callback.
+
+        =========  ============
+        Argument   Description
+        =========  ============
+        function   The callable to be executed when the callback is run.
+        args       The positional arguments to be passed to the callable.
+        kwargs     The keyword arguments to be passed to the callable.
+        =========  ============
+        """
+        # deque.append() is atomic. Setting the flag after appending
+        # ensures that any callback appended after the engine clears the
+        # flag will either be run by the engine or trigger a new wakeup.
+        self._threadsafe_callbacks.append(
+            functools.partial(function, *args, **kwargs))
+
+        # Without a waker, the engine hasn't been polled yet and will
+        # run the callback on its first poll.
+        if not self._wakeup_pending:
+            self._wakeup_pending = True
+            waker = self._waker
+            if waker is not None:
+                waker.wake()
+
+    def _run_threadsafe_callbacks(self):
+        """
+        Execute the callbacks scheduled with
+        :meth:`~pants.engine.Engine.call_threadsafe`.
+        """
+        self._wakeup_pending = False
+        popleft = self._threadsafe_callbacks.popleft
+
+        while True:
+            try:
+                function = popleft()
+            except IndexError:
+                break
+
+            try:
+                function()
+            except Exception:
+                log.exception("Exception raised while executing callback.")
+
+    def run_in_executor(self, executor, function, *args, **kwargs):
+        """
+        Run a blocking callable on an executor.
+
+        The callable is run on *executor*, which should be one of the
+        executors from :mod:`pants.util.executor`, or on the engine's
+        default thread pool if *executor* is None. Once it has finished,
+        the ``callback`` keyword argument, if given, is called on the
+        engine's thread with two arguments: the value returned by the
+        callable, and the exception it raised or None. All other keyword
+        arguments are passed to the callable.
+
+        Raises :class:`~pants.util.executor.ExecutorFull` if the
+        executor's queue is full.
+
+        =========  ============
+        Argument   Description
+        =========  ============
+        executor   The executor to run the callable on, or None.
+        function   The callable to run.
+        args       The positional arguments to be passed to the callable.
+        kwargs     The keyword arguments to be passed to the callable.
+        =========  ============
+        """
+        callback = kwargs.pop("callback", None)
+
+        if executor is None:
+            executor = self.thread_pool
+
+        if callback is None:
+            on_done = None
+        else:
+            def on_done(result, error):
+                self.call_threadsafe(callback, result, error)
+
+        executor.submit(function, args, kwargs, on_done)
+
+    @property
+    def thread_pool(self):
+        """
+        The engine's default
+        :class:`~pants.util.executor.ThreadPoolExecutor`, created when it
+        is first used.
+        """
+        if self._thread_pool is None:
+            self._thread_pool = ThreadPoolExecutor()
+        return self._thread_pool
+
+    @property
+    def process_pool(self):
+        """
+        The engine's default
+        :class:`~pants.util.executor.ProcessPoolExecutor`, created when
+        it is first used.
+        """
+        if self._process_pool is None:
+            self._process_pool = ProcessPoolExecutor()
+        return self._process_pool
+
     def loop(self, function, *args, **kwargs):
         """
         Schedule a loop.
@@ -310,14 +718,29 @@ class Engine(object):
         args       The positional arguments to be passed to the
                    callable.
         kwargs     The keyword arguments to be passed to the callable.
+        slack      *Optional.* A keyword argument giving how late, in
+                   seconds, the deferred may be run. Deferreds with
+                   slack are aligned so that those due at around the
+                   same time run together, waking the engine less
+                   often. Without a high resolution timer, a deferred
+                   may still run up to 10ms later than its slack.
+                   Defaults to 0.
         =========  =====================================================
         """
         if delay <= 0:
             raise ValueError("Delay must be greater than 0 seconds.")
 
+        slack = kwargs.pop("slack", 0)
+        if slack < 0:
+            raise ValueError("Slack must not be negative.")
+
         deferred = functools.partial(function, *args, **kwargs)
-        timer = _Timer(self, deferred, False, delay, self.latest_poll_time + delay)
-        bisect.insort(self._deferreds, timer)
+        end = self.latest_poll_time + delay
+        if slack:
+            end = _align_deadline(end, slack)
+        timer = _Timer(self, deferred, False, delay, end, slack)
+        timer.in_heap = True
+        heapq.heappush(self._deferreds, timer)
 
         return timer
 
@@ -337,14 +760,61 @@ class Engine(object):
         function   The callable to be executed when the cycle is run.
         args       The positional arguments to be passed to the callable.
         kwargs     The keyword arguments to be passed to the callable.
+        slack      *Optional.* A keyword argument giving how late, in
+                   seconds, each run of the cycle may be. See
+                   :meth:`~pants.engine.Engine.defer`. Defaults to 0.
         =========  ============
         """
         if interval <= 0:
             raise ValueError("Interval must be greater than 0 seconds.")
 
+        slack = kwargs.pop("slack", 0)
+        if slack < 0:
+            raise ValueError("Slack must not be negative.")
+
         cycle = functools.partial(function, *args, **kwargs)
-        timer = _Timer(self, cycle, True, interval, self.latest_poll_time + interval)
-        bisect.insort(self._deferreds, timer)
+        end = self.latest_poll_time + interval
+        if slack:
+            end = _align_deadline(end, slack)
+        timer = _Timer(self, cycle, True, interval, end, slack)
+        timer.in_heap = True
+        heapq.heappush(self._deferreds, timer)
+
+        return timer
+
+    def timeout(self, delay, function, *args, **kwargs):
+        """
+        Schedule a timeout.
+
+        A timeout is a deferred intended for coarse deadlines that are
+        usually cancelled before they expire, such as connection and
+        idle timeouts. Timeouts are kept in a hashed timing wheel rather
+        than the heap used by :meth:`~pants.engine.Engine.defer`, so
+        both scheduling and cancelling a timeout take constant time. In
+        exchange, a timeout may run up to one tick of the wheel late -
+        see the ``timeout_granularity`` argument of
+        :class:`~pants.engine.Engine`.
+
+        Returns a callable which can be used to cancel the timeout.
+
+        =========  =====================================================
+        Argument   Description
+        =========  =====================================================
+        delay      The delay, in seconds, after which the timeout
+                   should be run.
+        function   The callable to be executed when the timeout is run.
+        args       The positional arguments to be passed to the
+                   callable.
+        kwargs     The keyword arguments to be passed to the callable.
+        =========  =====================================================
+        """
+        if delay <= 0:
+            raise ValueError("Delay must be greater than 0 seconds.")
+
+        timeout = functools.partial(function, *args, **kwargs)
+        timer = _Timer(self, timeout, False, delay, self.latest_poll_time + delay)
+        timer.coarse = True
+        self._timeouts.add(timer)
 
         return timer
 
@@ -352,6 +822,14 @@ class Engine(object):
         """
         Remove a timer from the engine.
 
+        Deferreds and cycles are not removed from the heap immediately.
+        Instead, the timer's function is discarded, leaving a tombstone
+        that is skipped when it reaches the top of the heap. Once
+        tombstones make up more than half of the heap it is compacted.
+        Timers that have already been taken from the heap, such as a
+        deferred that has run or a cycle cancelled from its own
+        function, leave no tombstone.
+
         =========  ============
         Argument   Description
         =========  ============
@@ -363,11 +841,36 @@ class Engine(object):
                 self._callbacks.remove(timer)
             except ValueError:
                 pass  # Callback not present.
-        else:
-            try:
-                self._deferreds.remove(timer)
-            except ValueError:
-                pass  # Callback not present.
+        elif timer.function is not None:
+            timer.function = None
+            timer.requeue = False
+            if timer.coarse:
+                # The timing wheel discards the timer when its slot is
+                # reached.
+                self._timeouts.remove(timer)
+                return
+            if not timer.in_heap:
+                return
+
+            self._cancelled_deferreds += 1
+
+            if (self._cancelled_deferreds > _COMPACTION_THRESHOLD and
+                    self._cancelled_deferreds * 2 > len(self._deferreds)):
+                self._compact_deferreds()
+
+    def _compact_deferreds(self):
+        """
+        Remove all cancelled timers from the heap of deferreds.
+        """
+        deferreds = []
+        for timer in self._deferreds:
+            if timer.function is None:
+                timer.in_heap = False
+            else:
+                deferreds.append(timer)
+        heapq.heapify(deferreds)
+        self._deferreds = deferreds
+        self._cancelled_deferreds = 0
 
     ##### Channel Methods #####################################################
 
@@ -382,19 +885,46 @@ class Engine(object):
         =========  ============
         """
         self._channels[channel.fileno] = channel
+        self._registered_events[channel.fileno] = channel._events
         self._poller.add(channel.fileno, channel._events)
 
     def modify_channel(self, channel):
         """
         Modify the state of a channel.
 
+        The change is not passed on to the poller immediately. Changes
+        are collected and applied once per call to
+        :meth:`~pants.engine.Engine.poll`, just before it waits for
+        events, so a channel that changes its events several times
+        costs at most one system call.
+
         =========  ============
         Argument   Description
         =========  ============
         channel    The channel to be modified.
         =========  ============
         """
-        self._poller.modify(channel.fileno, channel._events)
+        self._interest_changes += 1
+
+        if self._edge_triggered_active:
+            # Nothing to tell the poller. A write edge only arrives once
+            # a write has failed with EAGAIN, so a channel with data to
+            # write on a writable socket is flushed by the engine.
+            if channel._events & Engine.WRITE and not channel._write_blocked:
+                self._ready_writers.add(channel)
+            return
+
+        self._dirty_channels.add(channel)
+
+    @property
+    def interest_changes_saved(self):
+        """
+        The number of changes to the events channels are waiting for
+        that did not require a call to the poller, because they were
+        cancelled out by later changes or because the engine is in
+        edge-triggered mode.
+        """
+        return self._interest_changes - self._interest_changes_applied
 
     def remove_channel(self, channel):
         """
@@ -407,6 +937,12 @@ class Engine(object):
         =========  ============
         """
         self._channels.pop(channel.fileno, None)
+        self._registered_events.pop(channel.fileno, None)
+        self._listening_channels.discard(channel.fileno)
+        self._dirty_channels.discard(channel)
+        self._ready_writers.discard(channel)
+        self._corked_channels.discard(channel)
+        self._requeued_channels.pop(channel, None)
 
         try:
             self._poller.remove(channel.fileno, channel._events)
@@ -432,32 +968,594 @@ class Engine(object):
         if poller is not None:
             self._poller = poller
         elif hasattr(select, "epoll"):
-            self._poller = _EPoll()
+            self._poller = _EPoll(self._edge_triggered)
         elif hasattr(select, "kqueue"):
             self._poller = _KQueue()
         else:
             self._poller = _Select()
 
+        self._edge_triggered_active = (isinstance(self._poller, _EPoll) and
+                                       self._poller.edge_triggered)
+        if self._edge_triggered and not self._edge_triggered_active:
+            log.warning("Edge-triggered mode is only supported with epoll().")
+
+        self._dirty_channels.clear()
         for fileno, channel in self._channels.iteritems():
+            self._registered_events[fileno] = channel._events
             self._poller.add(fileno, channel._events)
 
+    def _requeue_channel(self, channel, events):
+        """
+        Deliver *events* to a channel on the next call to
+        :meth:`~pants.engine.Engine.poll`, without waiting for the
+        poller to report them. Used by channels that stop handling
+        events early to give other channels a turn.
+        """
+        self._requeued_channels[channel] = \
+            self._requeued_channels.get(channel, 0) | events
+
+    def _apply_interest_changes(self):
+        """
+        Pass the net changes to the events channels are waiting for on
+        to the poller.
+        """
+        dirty, self._dirty_channels = self._dirty_channels, set()
+        registered = self._registered_events
+
+        for channel in dirty:
+            fileno = channel.fileno
+            if self._channels.get(fileno) is not channel:
+                continue
+
+            events = channel._events
+            if registered.get(fileno) == events:
+                continue
+
+            registered[fileno] = events
+            self._interest_changes_applied += 1
+            try:
+                self._poller.modify(fileno, events)
+            except (IOError, OSError):
+                log.exception("Error while modifying %r." % channel)
+
+    def _flush_ready_writers(self):
+        """
+        In edge-triggered mode, deliver write events to channels that
+        are waiting to write to sockets that are already writable.
+        """
+        ready, self._ready_writers = self._ready_writers, set()
+
+        stats = self._stats
+
+        for channel in ready:
+            if (channel._closed or channel._write_blocked or
+                    not channel._events & Engine.WRITE):
+                continue
+            try:
+                if stats is None:
+                    channel._handle_events(Engine.WRITE)
+                else:
+                    stats.dispatch(channel, channel._handle_events, Engine.WRITE)
+            except (KeyboardInterrupt, SystemExit):
+                raise
+            except Exception:
+                log.exception("Error while handling events on %r." % channel)
+
+    def _add_listening_channel(self, channel):
+        """
+        Mark a channel as listening for connections. When it is ready
+        along with other channels, its events are handled first, unless
+        the other channels have a higher priority.
+        """
+        self._listening_channels.add(channel.fileno)
+
+    def _cork_channel(self, channel):
+        """
+        Send a channel's buffered data at the end of the current
+        iteration, rather than straight away. Used by streams with
+        ``auto_cork`` enabled.
+        """
+        self._corked_channels.add(channel)
+
+    def _flush_corked_channels(self):
+        """
+        Send the data written to corked channels since they were last
+        flushed. Channels blocked on a full socket are left to their
+        write events.
+        """
+        corked, self._corked_channels = self._corked_channels, set()
+
+        stats = self._stats
+
+        for channel in corked:
+            if (channel._closed or channel._write_blocked or
+                    not channel._send_buffer):
+                continue
+            try:
+                if stats is None:
+                    channel._process_send_buffer()
+                else:
+                    stats.dispatch(channel, channel._process_send_buffer)
+            except (KeyboardInterrupt, SystemExit):
+                raise
+            except Exception:
+                log.exception("Error while flushing %r." % channel)
+
+    def _install_waker(self):
+        """
+        Install a new waker on the engine, replacing any existing one.
+        """
+        if self._waker is not None:
+            self.remove_channel(self._waker)
+            self._waker.close()
+
+        self._waker = _Waker(self)
+        self.add_channel(self._waker)
+
+    def _install_timer(self):
+        """
+        Install a new high resolution timer on the engine, replacing any
+        existing one.
+        """
+        if self._timer is not None:
+            self.remove_channel(self._timer)
+            self._timer.close()
+
+        self._timer = _HighResolutionTimer(self)
+        self.add_channel(self._timer)
+
+
+###############################################################################
+# _EngineStats Class
+###############################################################################
+
+# Upper bounds of the histogram buckets.
+_ITERATION_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5,
+                      1.0, float("inf"))
+_READY_EVENTS_BUCKETS = (0, 1, 4, 16, 64, 256, 1024, float("inf"))
+
+class _EngineStats(object):
+    """
+    Statistics about an engine's main loop, collected while
+    instrumentation is enabled. Times are measured with the system
+    clock, as the engine's own clock need not advance while it works.
+
+    Slow callbacks are detected by a watchdog thread, which records the
+    stack of the engine's thread when a single dispatch has been running
+    for longer than the threshold. The slow callback is logged once it
+    returns.
+
+    ==========  ============
+    Argument    Description
+    ==========  ============
+    threshold   The time, in seconds, after which a callback is slow, or None.
+    ==========  ============
+    """
+    STACK_DEPTH = 8
+
+    def __init__(self, threshold):
+        self.threshold = threshold
+
+        self.iterations = 0
+        self.timer_time = 0.0
+        self.io_time = 0.0
+        self.wait_time = 0.0
+        self.max_iteration_time = 0.0
+        self.iteration_counts = [0] * len(_ITERATION_BUCKETS)
+        self.ready_events = 0
+        self.max_ready_events = 0
+        self.ready_events_counts = [0] * len(_READY_EVENTS_BUCKETS)
+        self.slow_callbacks = 0
+
+        self._iteration_start = 0.0
+        self._timers_end = 0.0
+        self._wait_start = None
+        self._wait_end = None
+
+        # (sequence, start, what) for the dispatch in progress.
+        self._current = None
+        self._sequence = 0
+        self._thread_id = None
+        self._slow_stacks = {}
+
+        self._watchdog = None
+        self._stop = threading.Event()
+        if threshold is not None:
+            self._watchdog = threading.Thread(target=self._watch,
+                                              name="pants-engine-watchdog")
+            self._watchdog.daemon = True
+            self._watchdog.start()
+
+    def close(self):
+        self._stop.set()
+
+    def snapshot(self):
+        return {
+            "iterations": self.iterations,
+            "busy_time": self.timer_time + self.io_time,
+            "timer_time": self.timer_time,
+            "io_time": self.io_time,
+            "wait_time": self.wait_time,
+            "max_iteration_time": self.max_iteration_time,
+            "iteration_histogram": zip(_ITERATION_BUCKETS, self.iteration_counts),
+            "ready_events": self.ready_events,
+            "max_ready_events": self.max_ready_events,
+            "ready_events_histogram": zip(_READY_EVENTS_BUCKETS,
+                                          self.ready_events_counts),
+            "slow_callbacks": self.slow_callbacks,
+        }
+
+    ##### Loop Events #########################################################
+
+    def start_iteration(self):
+        self._iteration_start = current_time()
+        self._wait_start = self._wait_end = None
+        self._thread_id = thread.get_ident()
+
+    def end_timers(self):
+        self._timers_end = current_time()
+
+    def start_wait(self):
+        self._wait_start = current_time()
+
+    def end_wait(self):
+        self._wait_end = current_time()
+
+    def end_iteration(self, ready_events):
+        now = current_time()
+        self.iterations += 1
+
+        # Work done between the timers and the wait - flushing writers
+        # in edge-triggered mode - counts as I/O.
+        io_time = 0.0
+        if self._wait_start is not None:
+            io_time += self._wait_start - self._timers_end
+            if self._wait_end is not None:
+                self.wait_time += self._wait_end - self._wait_start
+                io_time += now - self._wait_end
+            else:
+                self.wait_time += now - self._wait_start
+
+        timer_time = self._timers_end - self._iteration_start
+        self.timer_time += timer_time
+        self.io_time += io_time
+
+        busy = timer_time + io_time
+        if busy > self.max_iteration_time:
+            self.max_iteration_time = busy
+        self.iteration_counts[bisect.bisect_left(_ITERATION_BUCKETS, busy)] += 1
+
+        self.ready_events += ready_events
+        if ready_events > self.max_ready_events:
+            self.max_ready_events = ready_events
+        self.ready_events_counts[
+            bisect.bisect_left(_READY_EVENTS_BUCKETS, ready_events)] += 1
+
+    ##### Dispatch ############################################################
+
+    def dispatch(self, what, function, *args):
+        """
+        Call *function*, which is running on behalf of *what* - a timer
+        function or a channel - and check whether it was slow.
+        """
+        self._sequence += 1
+        sequence = self._sequence
+        start = current_time()
+        self._current = (sequence, start, what)
+        try:
+            return function(*args)
+        finally:
+            self._current = None
+            duration = current_time() - start
+            if self.threshold is not None and duration > self.threshold:
+                self._report_slow(sequence, what, duration)
+
+    def _report_slow(self, sequence, what, duration):
+        self.slow_callbacks += 1
+
+        message = "Slow callback took %.3f seconds: %s" % (
+                duration, _describe_callable(what))
+
+        stack = self._slow_stacks.pop(sequence, None)
+        location = _describe_location(what)
+        if stack:
+            message += "\nStack while running:\n" + "".join(stack).rstrip()
+        elif location:
+            message += " (defined at %s)" % location
+
+        log.warning(message)
+
+    def _watch(self):
+        """
+        Watchdog thread. Samples the engine thread's stack while a
+        dispatch is running for longer than the threshold.
+        """
+        interval = max(self.threshold / 2.0, 0.001)
+        sampled = None
+
+        while not self._stop.wait(interval):
+            current = self._current
+            if current is None or current[0] == sampled:
+                continue
+
+            sequence, start, what = current
+            if current_time() - start <= self.threshold:
+                continue
+
+            frame = sys._current_frames().get(self._thread_id)
+            if frame is None:
+                continue
+
+            sampled = sequence
+            stack = traceback.format_stack(frame)[-self.STACK_DEPTH:]
+            del frame
+            # Only the latest sample is kept, should the engine
+            # thread never pick it up.
+            self._slow_stacks = {sequence: stack}
+
+
+def _describe_callable(what):
+    """
+    Return a readable name for a timer function or channel.
+    """
+    while isinstance(what, functools.partial):
+        what = what.func
+
+    name = getattr(what, "__name__", None)
+    if name is None:
+        return repr(what)
+    return "%s.%s" % (getattr(what, "__module__", "?"), name)
+
+
+def _describe_location(what):
+    """
+    Return the file and line on which a timer function is defined, or
+    None if it isn't a Python function.
+    """
+    while isinstance(what, functools.partial):
+        what = what.func
+
+    code = getattr(getattr(what, "im_func", what), "func_code", None)
+    if code is None:
+        return None
+    return "%s:%d" % (code.co_filename, code.co_firstlineno)
+
+
+###############################################################################
+# _Waker Class
+###############################################################################
+
+_eventfd = None
+if sys.platform.startswith("linux"):
+    _libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+    if hasattr(_libc, "eventfd"):
+        _eventfd = _libc.eventfd
+        _eventfd.argtypes = (ctypes.c_uint, ctypes.c_int)
+
+EFD_CLOEXEC = 0o2000000
+EFD_NONBLOCK = 0o4000
+
+class _Waker(object):
+    """
+    A file descriptor which can be used to wake the engine from another
+    thread. It is registered with the engine like a channel.
+
+    Uses an eventfd where available and falls back to a pipe, or a pair
+    of connected sockets on Windows.
+
+    =========  ============
+    Argument   Description
+    =========  ============
+    engine     The engine to wake.
+    =========  ============
+    """
+    def __init__(self, engine):
+        self.engine = engine
+        self._events = Engine.READ
+        self._sockets = None
+
+        fd = _eventfd(0, EFD_NONBLOCK | EFD_CLOEXEC) if _eventfd else -1
+        if fd != -1:
+            self.fileno = self._write_fileno = fd
+            self._wake_data = struct.pack("=Q", 1)
+            self._read_size = 8
+        else:
+            if sys.platform == "win32":
+                reader, writer = self._socketpair()
+                self._sockets = reader, writer
+                self.fileno = reader.fileno()
+                self._write_fileno = writer.fileno()
+            else:
+                self.fileno, self._write_fileno = os.pipe()
+                import fcntl
+                for fd in (self.fileno, self._write_fileno):
+                    flags = fcntl.fcntl(fd, fcntl.F_GETFL)
+                    fcntl.fcntl(fd, fcntl.F_SETFL, flags | os.O_NONBLOCK)
+                    flags = fcntl.fcntl(fd, fcntl.F_GETFD)
+                    fcntl.fcntl(fd, fcntl.F_SETFD, flags | fcntl.FD_CLOEXEC)
+            self._wake_data = "x"
+            self._read_size = 4096
+
+    def __repr__(self):
+        return "%s #%r (%s)" % (self.__class__.__name__, self.fileno,
+                object.__repr__(self))
+
+    def wake(self):
+        """
+        Wake the engine. Safe to call from any thread.
+        """
+        try:
+            if self._sockets:
+                self._sockets[1].send(self._wake_data)
+            else:
+                os.write(self._write_fileno, self._wake_data)
+        except (IOError, OSError, socket.error) as err:
+            # A full pipe is already as awake as it's going to get.
+            if err.args[0] not in (errno.EAGAIN, errno.EWOULDBLOCK):
+                raise
+
+    def close(self):
+        """
+        Close the waker's file descriptors.
+        """
+        if self._sockets:
+            for sock in self._sockets:
+                sock.close()
+            return
+
+        os.close(self.fileno)
+        if self._write_fileno != self.fileno:
+            os.close(self._write_fileno)
+
+    def _handle_events(self, events):
+        """
+        Drain the waker and run any pending thread-safe callbacks.
+        """
+        while True:
+            try:
+                if self._sockets:
+                    data = self._sockets[0].recv(self._read_size)
+                else:
+                    data = os.read(self.fileno, self._read_size)
+            except (IOError, OSError, socket.error) as err:
+                if err.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    break
+                raise
+            if len(data) < self._read_size:
+                break
+
+        self.engine._run_threadsafe_callbacks()
+
+    def _socketpair(self):
+        """
+        Return a pair of connected, non-blocking loopback sockets.
+        """
+        listener = socket.socket()
+        listener.bind(("127.0.0.1", 0))
+        listener.listen(1)
+        writer = socket.socket()
+        writer.connect(listener.getsockname())
+        reader, _ = listener.accept()
+        listener.close()
+        reader.setblocking(False)
+        writer.setblocking(False)
+        return reader, writer
+
+
+###############################################################################
+# _HighResolutionTimer Class
+###############################################################################
+
+class _timespec(ctypes.Structure):
+    _fields_ = [("tv_sec", ctypes.c_long), ("tv_nsec", ctypes.c_long)]
+
+class _itimerspec(ctypes.Structure):
+    _fields_ = [("it_interval", _timespec), ("it_value", _timespec)]
+
+_timerfd_create = _timerfd_settime = None
+if _eventfd is not None and hasattr(_libc, "timerfd_create"):
+    _timerfd_create = _libc.timerfd_create
+    _timerfd_create.argtypes = (ctypes.c_int, ctypes.c_int)
+    _timerfd_settime = _libc.timerfd_settime
+    _timerfd_settime.argtypes = (ctypes.c_int, ctypes.c_int,
+                                 ctypes.POINTER(_itimerspec),
+                                 ctypes.POINTER(_itimerspec))
+
+CLOCK_MONOTONIC = 1
+TFD_CLOEXEC = EFD_CLOEXEC
+TFD_NONBLOCK = EFD_NONBLOCK
+
+class _HighResolutionTimer(object):
+    """
+    A timerfd which becomes readable when the engine's next deferred is
+    due. It is registered with the engine like a channel.
+
+    =========  ============
+    Argument   Description
+    =========  ============
+    engine     The engine to wake.
+    =========  ============
+    """
+    def __init__(self, engine):
+        self.engine = engine
+        self._events = Engine.READ
+        self._spec = _itimerspec()
+        self.deadline = None
+
+        self.fileno = _timerfd_create(CLOCK_MONOTONIC, TFD_NONBLOCK | TFD_CLOEXEC)
+        if self.fileno == -1:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+
+    def __repr__(self):
+        return "%s #%r (%s)" % (self.__class__.__name__, self.fileno,
+                object.__repr__(self))
+
+    def arm(self, deadline):
+        """
+        Make the timer expire at *deadline*, a time returned by the
+        engine's clock. Does nothing if the timer is already armed for
+        that deadline.
+        """
+        if deadline == self.deadline:
+            return
+        self.deadline = deadline
+
+        # A zero expiry would disarm the timer.
+        delay = max(deadline - self.engine._clock(), 0.000001)
+        value = self._spec.it_value
+        value.tv_sec = int(delay)
+        value.tv_nsec = int((delay - value.tv_sec) * 1000000000)
+
+        if _timerfd_settime(self.fileno, 0, ctypes.byref(self._spec), None) == -1:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+
+    def close(self):
+        """
+        Close the timer's file descriptor.
+        """
+        os.close(self.fileno)
+
+    def _handle_events(self, events):
+        """
+        Acknowledge the expiry. The deferreds that are due are run on
+        the engine's next poll.
+        """
+        self.deadline = None
+        try:
+            os.read(self.fileno, 8)
+        except OSError as err:
+            if err.args[0] not in (errno.EAGAIN, errno.EWOULDBLOCK):
+                raise
+
 
 ###############################################################################
 # _EPoll Class
 ###############################################################################
 
+EPOLLET = getattr(select, "EPOLLET", 1 << 31)
+
 class _EPoll(object):
     """
     An :obj:`~select.epoll`-based poller.
+
+    In edge-triggered mode every file descriptor is registered once, for
+    all events, and :meth:`modify` does nothing. Channels must then read
+    and write until EAGAIN.
     """
-    def __init__(self):
+    def __init__(self, edge_triggered=False):
         self._epoll = select.epoll()
+        self.edge_triggered = edge_triggered
 
     def add(self, fileno, events):
+        if self.edge_triggered:
+            events = Engine.ALL_EVENTS | EPOLLET
         self._epoll.register(fileno, events)
 
     def modify(self, fileno, events):
-        self._epoll.modify(fileno, events)
+        if not self.edge_triggered:
+            self._epoll.modify(fileno, events)
 
     def remove(self, fileno, events):
         self._epoll.unregister(fileno)
@@ -569,10 +1667,239 @@ class _Select(object):
         return events
 
 
+###############################################################################
+# _TimingWheel Class
+###############################################################################
+
+class _TimingWheel(object):
+    """
+    A hierarchical hashed timing wheel.
+
+    Time is divided into ticks of ``granularity`` seconds. The wheel
+    has several levels of 256 slots each: the first level holds timers
+    due within 256 ticks, and each subsequent level covers 256 times
+    the range of the one below it. As time advances, the slots of the
+    higher levels are cascaded down into the lower ones. Adding a timer
+    is a single list append, and cancelled timers are dropped when
+    their slot is reached, or when they come to outnumber the live
+    ones. The length of the wheel is the number of timers in it that
+    haven't been cancelled.
+
+    ============  ====================================================
+    Argument      Description
+    ============  ====================================================
+    granularity   The length, in seconds, of a tick.
+    now           The current time.
+    ============  ====================================================
+    """
+    BITS = 8
+    SLOTS = 1 << BITS
+    MASK = SLOTS - 1
+    LEVELS = 4
+
+    def __init__(self, granularity, now):
+        if granularity <= 0:
+            raise ValueError("Granularity must be greater than 0 seconds.")
+
+        self.granularity = granularity
+        self._tick = int(now / granularity)
+        self._levels = [[[] for _ in xrange(self.SLOTS)]
+                        for _ in xrange(self.LEVELS)]
+        self._level_counts = [0] * self.LEVELS
+        self._count = 0
+        self._cancelled = 0
+
+    def __len__(self):
+        return self._count - self._cancelled
+
+    def add(self, timer):
+        """
+        Add a timer to the wheel.
+        """
+        timer.expires = int(math.ceil(timer.end / self.granularity))
+        timer.in_wheel = True
+        self._insert(timer, self._tick + 1)
+        self._count += 1
+
+    def remove(self, timer):
+        """
+        Cancel a timer in the wheel. The timer stays in its slot until
+        the slot is reached or the wheel is compacted, but is no longer
+        counted.
+        """
+        if timer.in_wheel:
+            timer.in_wheel = False
+            self._cancelled += 1
+
+            if (self._cancelled > _COMPACTION_THRESHOLD and
+                    self._cancelled * 2 > self._count):
+                self._compact()
+
+    def _compact(self):
+        """
+        Remove all cancelled timers from the wheel.
+        """
+        for level, slots in enumerate(self._levels):
+            if not self._level_counts[level]:
+                continue
+
+            count = 0
+            for index, slot in enumerate(slots):
+                if slot:
+                    slot = slots[index] = [timer for timer in slot
+                                           if timer.in_wheel]
+                    count += len(slot)
+            self._level_counts[level] = count
+
+        self._count -= self._cancelled
+        self._cancelled = 0
+
+    def expire(self, now):
+        """
+        Advance the wheel to the given time and return a list of the
+        timers which have expired.
+        """
+        target = int(now / self.granularity)
+        if not self._count:
+            self._tick = max(self._tick, target)
+            return []
+
+        expired = []
+        level0 = self._levels[0]
+
+        while self._tick < target and self._count:
+            if self._level_counts[0]:
+                tick = self._tick + 1
+            else:
+                # Nothing on the first level, so skip ahead to the next
+                # cascade of the lowest occupied level.
+                tick = self._next_cascade()
+                if tick > target:
+                    break
+
+            if not tick & self.MASK:
+                self._cascade(tick)
+
+            self._tick = tick
+            slot = level0[tick & self.MASK]
+            if not slot:
+                continue
+
+            level0[tick & self.MASK] = []
+            self._level_counts[0] -= len(slot)
+            self._count -= len(slot)
+            for timer in slot:
+                if not timer.in_wheel:
+                    self._cancelled -= 1
+                    continue
+                if timer.end > now:
+                    # Parked beyond the range of the wheel. Put it back.
+                    self._insert(timer, tick + 1)
+                    self._count += 1
+                    continue
+                timer.in_wheel = False
+                expired.append(timer)
+
+        self._tick = max(self._tick, target)
+        return expired
+
+    def next_deadline(self):
+        """
+        Return the time at which the wheel next needs to be advanced.
+        This is either the time of the next occupied slot on the first
+        level or the time of the next cascade, whichever comes first.
+        """
+        if not self._level_counts[0]:
+            return self._next_cascade() * self.granularity
+
+        level0 = self._levels[0]
+        tick = self._tick + 1
+        while tick & self.MASK and not level0[tick & self.MASK]:
+            tick += 1
+
+        return tick * self.granularity
+
+    def _next_cascade(self):
+        """
+        Return the tick at which the lowest occupied level above the
+        first will next be cascaded.
+        """
+        for level in xrange(1, self.LEVELS):
+            if self._level_counts[level]:
+                break
+
+        span = 1 << (self.BITS * level)
+        return (self._tick // span + 1) * span
+
+    def _insert(self, timer, base):
+        """
+        Place a timer in the slot appropriate to its expiry tick.
+
+        =========  ====================================================
+        Argument   Description
+        =========  ====================================================
+        timer      The timer to insert.
+        base       The earliest tick which has not yet been processed.
+        =========  ====================================================
+        """
+        expires = max(timer.expires, base)
+        delta = expires - base
+
+        for level in xrange(self.LEVELS):
+            if delta < 1 << (self.BITS * (level + 1)):
+                break
+        else:
+            # Too far in the future. Park the timer in the most distant
+            # slot - it'll be reinserted when it comes around.
+            expires = base + (1 << (self.BITS * self.LEVELS)) - 1
+
+        index = (expires >> (self.BITS * level)) & self.MASK
+        self._levels[level][index].append(timer)
+        self._level_counts[level] += 1
+
+    def _cascade(self, tick):
+        """
+        Move the timers in the higher-level slots that come due at the
+        given tick down the wheel, starting with the highest level.
+        """
+        top = 1
+        while (top < self.LEVELS - 1 and
+               not (tick >> (self.BITS * top)) & self.MASK):
+            top += 1
+
+        for level in xrange(top, 0, -1):
+            index = (tick >> (self.BITS * level)) & self.MASK
+            slot = self._levels[level][index]
+            if not slot:
+                continue
+
+            self._levels[level][index] = []
+            self._level_counts[level] -= len(slot)
+            for timer in slot:
+                if not timer.in_wheel:
+                    self._count -= 1
+                    self._cancelled -= 1
+                else:
+                    self._insert(timer, tick)
+
+
 ###############################################################################
 # _Timer Class
 ###############################################################################
 
+def _align_deadline(end, slack):
+    """
+    Round a deadline up to a multiple of the largest power of two, in
+    seconds, that is no greater than *slack*. Timers whose windows
+    overlap then tend to share a deadline, and run in a single wakeup.
+    Alignment delays a deadline by less than *slack* seconds. The
+    engine may add up to 10ms more, as it waits at least that long
+    between polls unless it has a high resolution timer.
+    """
+    grid = 2.0 ** math.floor(math.log(slack, 2))
+    return math.ceil(end / grid) * grid
+
+
 class _Timer(object):
     """
     A simple class for storing timer information.
@@ -586,14 +1913,20 @@ class _Timer(object):
                run- or None, for a callback/loop.
     end        The time, in seconds since the epoch, after which the
                timer should be run - or None, for a callback/loop.
+    slack      How late, in seconds, the timer may be run.
     =========  ======================================================
     """
-    def __init__(self, engine, function, requeue, delay=None, end=None):
+    def __init__(self, engine, function, requeue, delay=None, end=None,
+                 slack=0):
         self.engine = engine
         self.function = function
         self.requeue = requeue
         self.delay = delay
         self.end = end
+        self.slack = slack
+        self.coarse = False
+        self.in_heap = False
+        self.in_wheel = False
 
     def __call__(self):
         self.cancel()
@@ -537,8 +537,8 @@ class HTTPClient(object):
         if request._timeout_timer:
             request._timeout_timer()
 
-        request._timeout_timer = self.engine.defer(request.timeout,
-                                                   self._timed_out, request)
+        request._timeout_timer = self.engine.timeout(request.timeout,
+                                                     self._timed_out, request)
 
     ##### Stream I/O Handlers #################################################
 
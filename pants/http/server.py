@@ -103,10 +103,33 @@ class HTTPConnection(Stream):
     def _await_request(self):
         """
         Sets the read handler and read delimiter to prepare to read an HTTP
-        request from the socket.
+        request from the socket, and resumes reading if it was paused while
+        handling the previous request.
         """
         self.on_read = self._read_header
         self.read_delimiter = DOUBLE_CRLF
+        self.resume_reading()
+
+    def _handle_request(self, request):
+        """
+        Call the server's request handler for a request. If the request
+        hasn't been finished when the handler returns, reading is paused
+        until it is, so that pipelined requests wait their turn rather than
+        replacing a request that's still being handled asynchronously.
+        """
+        try:
+            self.server.request_handler(request)
+        except Exception:
+            log.exception('Error handling HTTP request.')
+            if request._started:
+                self.close(False)
+            else:
+                request.send_response("500 Internal Server Error", 500)
+                self.close()
+            return
+
+        if self.current_request is request and not self._closed:
+            self.pause_reading()
 
     def _request_finished(self):
         """
@@ -217,16 +240,8 @@ class HTTPConnection(Stream):
             self.close()
             return
 
-        try:
-            # Call the request handler.
-            self.server.request_handler(request)
-        except Exception:
-            log.exception('Error handling HTTP request.')
-            if request._started:
-                self.close(False)
-            else:
-                request.send_response("500 Internal Server Error", 500)
-                self.close()
+        # Call the request handler.
+        self._handle_request(request)
 
     def _read_request_body(self, data):
         """
@@ -267,15 +282,7 @@ class HTTPConnection(Stream):
             self.close()
             return
 
-        try:
-            self.server.request_handler(request)
-        except Exception:
-            log.exception('Error handling HTTP request.')
-            if request._started:
-                self.close(False)
-            else:
-                request.send_response("500 Internal Server Error", 500)
-                self.close()
+        self._handle_request(request)
 
 ###############################################################################
 # HTTPRequest Class
@@ -788,7 +795,8 @@ class HTTPServer(Server):
     def cookie_secret(self, val):
         self._cookie_secret = val
 
-    def listen(self, address=None, backlog=1024, slave=True):
+    def listen(self, address=None, backlog=1024, slave=True, workers=None,
+               cpu_affinity=False):
         """
         Begins listening for connections to the HTTP server.
 
@@ -802,18 +810,22 @@ class HTTPServer(Server):
             See :func:`pants.server.Server.listen` for more information on
             listening servers.
 
-        =========  ============================================================
-        Argument   Description
-        =========  ============================================================
-        address    *Optional.* The local address to listen for connections on.
-                   If this isn't specified, it will be set to either port 80
-                   or port 443, depending on the SSL state, and listen
-                   on INADDR_ANY.
-        backlog    *Optional.* The maximum size of the connection queue.
-        slave      *Optional.* If True, this will cause a Server listening on
-                   IPv6 INADDR_ANY to create a slave Server that listens on
-                   the IPv4 INADDR_ANY.
-        =========  ============================================================
+        =============  ========================================================
+        Argument       Description
+        =============  ========================================================
+        address        *Optional.* The local address to listen for
+                       connections on. If this isn't specified, it will be
+                       set to either port 80 or port 443, depending on the
+                       SSL state, and listen on INADDR_ANY.
+        backlog        *Optional.* The maximum size of the connection queue.
+        slave          *Optional.* If True, this will cause a Server
+                       listening on IPv6 INADDR_ANY to create a slave
+                       Server that listens on the IPv4 INADDR_ANY.
+        workers        *Optional.* The number of worker processes to fork.
+                       See :func:`pants.server.Server.listen`.
+        cpu_affinity   *Optional.* If True, pin each worker process to a
+                       single CPU.
+        =============  ========================================================
         """
         if address is None or isinstance(address, (list,tuple)) and \
                               len(address) > 1 and address[1] is None:
@@ -828,4 +840,5 @@ class HTTPServer(Server):
                 address = tuple(address[0] + (port,) + address[2:])
 
         return Server.listen(self, address=address, backlog=backlog,
-                                slave=slave)
+                             slave=slave, workers=workers,
+                             cpu_affinity=cpu_affinity)
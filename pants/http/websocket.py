@@ -26,7 +26,7 @@ import logging
 import re
 import struct
 
-from pants.stream import StreamBufferOverflow
+from pants.stream import LengthPrefixed, StreamBufferOverflow
 
 from pants.http.utils import log
 
@@ -172,6 +172,7 @@ class WebSocket(object):
             self._connection.on_close = self._con_close
             self._connection.on_write = self._con_write
             self._connection.read_delimiter = 8
+            self._take_over_connection()
             return
 
         if fail:
@@ -206,11 +207,23 @@ class WebSocket(object):
         self._connection.on_close = self._con_close
         self._connection.on_write = self._con_write
         self._connection.read_delimiter = None
+        self._take_over_connection()
 
         self.connected = True
         self._safely_call(self.on_connect, *self._arguments)
         del self._arguments
 
+    def _take_over_connection(self):
+        """
+        Detach the HTTP request that started the WebSocket from its
+        connection. The request is never finished, so the connection
+        would otherwise pause reading when the request handler returns,
+        waiting for it. Reading is resumed in case the WebSocket was
+        created after the handler had already returned.
+        """
+        self._connection.current_request = None
+        self._connection.resume_reading()
+
     def _finish_handshake(self, key3):
         self._connection.read_delimiter = None
         request = self._request
@@ -328,7 +341,8 @@ class WebSocket(object):
         read delimiter determines when the data is passed to the
         callback. Valid values are ``None``, a string, an integer/long,
         a compiled regular expression, an instance of :class:`struct.Struct`,
-        or the ``pants.http.EntireMessage`` object.
+        an instance of :class:`~pants.stream.LengthPrefixed`, or the
+        ``pants.http.EntireMessage`` object.
 
         When the read delimiter is the ``EntireMessage`` object, entire
         WebSocket messages will be passed to
@@ -364,6 +378,12 @@ class WebSocket(object):
                 def on_read(self, packet_type, length, id):
                     pass
 
+        When the read delimiter is a :class:`~pants.stream.LengthPrefixed`
+        instance, a header holding the length of the payload that follows
+        it is fully buffered, then the payload, and both are passed to
+        :meth:`~pants.http.WebSocket.on_read` together. This is meant for
+        protocols that send several messages in binary frames.
+
         When the read delimiter is a compiled regular expression, there
         are two possible behaviors, selected by the value of
         :attr:`~pants.http.WebSocket.regex_search`. If ``regex_search``
@@ -401,6 +421,10 @@ class WebSocket(object):
             self._read_delimiter = value
             self._recv_buffer_size_limit = max(self._buffer_size, value.size)
 
+        elif isinstance(value, LengthPrefixed):
+            self._read_delimiter = value
+            self._recv_buffer_size_limit = value._buffer_limit(self._buffer_size)
+
         elif value is EntireMessage:
             self._read_delimiter = value
             self._recv_buffer_size_limit = self._buffer_size
@@ -453,6 +477,9 @@ class WebSocket(object):
         elif isinstance(self._read_delimiter, Struct):
             self._recv_buffer_size_limit = max(value,
                 self._read_delimiter.size)
+        elif isinstance(self._read_delimiter, LengthPrefixed):
+            self._recv_buffer_size_limit = \
+                self._read_delimiter._buffer_limit(value)
         else:
             self._recv_buffer_size_limit = value
 
@@ -498,6 +525,29 @@ class WebSocket(object):
             self._connection.close(False)
             self._connection = None
 
+    def pause_reading(self):
+        """
+        Stop reading from the WebSocket until :meth:`resume_reading` is
+        called. Messages that have already been received are held back,
+        and the client will eventually stop sending once the socket's
+        buffers fill.
+        """
+        if self._connection is not None:
+            self._connection.pause_reading()
+
+    def resume_reading(self):
+        """
+        Resume reading from a WebSocket that was paused with
+        :meth:`pause_reading`, first passing on any messages that were
+        held back.
+        """
+        if self._connection is None:
+            return
+
+        self._connection.resume_reading()
+        if self._read_buffer:
+            self._process_read_buffer()
+
     ##### Public Event Handlers ###############################################
 
     def on_read(self, data):
@@ -889,6 +939,9 @@ class WebSocket(object):
         EntireMessage.
         """
         while self._read_buffer:
+            if self._connection is not None and self._connection.reading_paused:
+                break
+
             delimiter = self._read_delimiter
 
             if delimiter is None or delimiter is EntireMessage:
@@ -929,6 +982,34 @@ class WebSocket(object):
                 # the parsed data as its own argument.
                 self._safely_call(self.on_read, *data)
 
+            elif isinstance(delimiter, LengthPrefixed):
+                size = delimiter.size
+                if len(self._read_buffer) < size:
+                    break
+
+                # Binary frames are buffered as latin1.
+                try:
+                    fields = delimiter.header.unpack(
+                        self._read_buffer[:size].encode('latin1'))
+                except (UnicodeEncodeError, struct.error):
+                    log.exception("Unable to unpack data on %r." % self)
+                    self.close(False)
+                    break
+
+                length = fields[delimiter.length_field]
+                if not 0 <= length <= delimiter._limit(self._recv_buffer_size_limit):
+                    e = StreamBufferOverflow("Message length %d exceeds limit on %r." % (length, self))
+                    self._safely_call(self.on_overflow_error, e)
+                    break
+
+                if len(self._read_buffer) < size + length:
+                    break
+
+                data = self._read_buffer[size:size + length]
+                self._read_buffer = self._read_buffer[size + length:]
+                self._safely_call(self.on_read,
+                                  *delimiter._arguments(fields, data))
+
             elif isinstance(delimiter, RegexType):
                 # Depending on regex_search, we could do this two ways.
                 if self.regex_search:
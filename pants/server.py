@@ -28,7 +28,10 @@ import ssl
 import weakref
 
 from pants._channel import _Channel, HAS_IPV6
+from pants.engine import Engine
 from pants.stream import Stream
+from pants.util.sockopt import set_socket_options
+from pants.util.workers import fork_workers
 
 
 ###############################################################################
@@ -65,10 +68,18 @@ class Server(_Channel):
                        :meth:`~pants.stream.Server.startSSL` will be
                        called with these options once the server is
                        ready. By default, SSL will not be enabled.
+    socket_options     *Optional.* A dictionary of socket options to
+                       apply to every accepted connection before
+                       :meth:`~pants.server.Server.on_accept` is
+                       called. See :mod:`pants.util.sockopt`.
     =================  ================================================
     """
     ConnectionClass = Stream
 
+    # The number of connections accepted per iteration of the engine
+    # before other channels get a turn. None means no limit.
+    accept_budget = 128
+
     def __init__(self, ConnectionClass=None, **kwargs):
         sock = kwargs.get("socket", None)
         if sock and sock.type != socket.SOCK_STREAM:
@@ -174,7 +185,8 @@ class Server(_Channel):
 
         return self
 
-    def listen(self, address, backlog=1024, slave=True):
+    def listen(self, address, backlog=1024, slave=True, workers=None,
+               cpu_affinity=False):
         """
         Begin listening for connections made to the channel.
 
@@ -197,6 +209,14 @@ class Server(_Channel):
         format or of an inappropriate format for the socket (e.g. if an
         IP address is given to a UNIX socket).
 
+        If ``workers`` is given, the process is forked into that many
+        worker processes before the channel starts listening, and each
+        worker binds its own socket to the address using
+        ``SO_REUSEPORT``. In that case, :meth:`listen()` only returns in
+        the workers - the original process supervises them until they
+        have all shut down. See :func:`pants.util.workers.fork_workers`
+        for details.
+
         Calling :meth:`listen()` on a closed channel or a channel that
         is already listening will raise a :exc:`RuntimeError`.
 
@@ -212,6 +232,10 @@ class Server(_Channel):
                          Server listening on IPv6 INADDR_ANY to
                          create a slave Server that listens on the
                          IPv4 INADDR_ANY.
+        workers          *Optional.* The number of worker processes to
+                         fork. By default, no workers are forked.
+        cpu_affinity     *Optional.* If True, pin each worker process
+                         to a single CPU.
         ===============  ================================================
         """
         if self.listening:
@@ -221,6 +245,10 @@ class Server(_Channel):
             raise RuntimeError("listen() called on closed %r." % self)
 
         address, family = self._format_address(address)
+
+        if workers:
+            fork_workers(workers, cpu_affinity, self.engine)
+
         self._do_listen(address, family, backlog, slave)
 
         return self
@@ -305,6 +333,13 @@ class Server(_Channel):
 
     ##### Internal Methods ####################################################
 
+    def _socket_apply_options(self, sock):
+        """
+        A server's socket options are applied to the connections it
+        accepts, rather than to its listening socket.
+        """
+        pass
+
     def _do_listen(self, addr, family, backlog, slave):
         """
         A callback method to be used with
@@ -355,6 +390,7 @@ class Server(_Channel):
             raise
 
         self.listening = True
+        self.engine._add_listening_channel(self)
         self._safely_call(self.on_listen)
 
         if slave and not isinstance(addr, str) and addr[0] == '' and HAS_IPV6:
@@ -370,7 +406,16 @@ class Server(_Channel):
         """
         Handle a read event raised on the channel.
         """
+        budget = self.accept_budget
+        accepted = 0
+
         while True:
+            if budget is not None and accepted >= budget:
+                # Give other channels a turn, and come back for the rest
+                # of the backlog on the next iteration.
+                self.engine._requeue_channel(self, Engine.READ)
+                return
+
             try:
                 sock, addr = self._socket_accept()
             except socket.error:
@@ -384,6 +429,17 @@ class Server(_Channel):
             if sock is None:
                 return
 
+            accepted += 1
+
+            if self.socket_options:
+                try:
+                    set_socket_options(sock, self.socket_options)
+                except (socket.error, ValueError) as err:
+                    log.error("Could not set socket options on connection "
+                              "from %r: %s" % (addr, err))
+                    sock.close()
+                    continue
+
             if self.ssl_enabled:
                 try:
                     sock.setblocking(False)
@@ -413,6 +469,7 @@ class _SlaveServer(Server):
     def __init__(self, engine, server, addr, backlog):
         Server.__init__(self, engine=engine)
         self.server = server
+        self.socket_options = server.socket_options
 
         # Now, listen our way.
         if server._socket.family == socket.AF_INET6:
@@ -441,6 +498,7 @@ class _SlaveServer(Server):
         self._local_address = None
 
         self.listening = True
+        self.engine._add_listening_channel(self)
 
         self.on_accept = self.server.on_accept
 
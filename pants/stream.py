@@ -24,14 +24,18 @@ server connection handlers.
 # Imports
 ###############################################################################
 
+import collections
 import errno
 import functools
 import os
 import re
 import socket
+import sre_constants
+import sre_parse
 import ssl
 import struct
 
+from pants._buffer import _RecvBuffer
 from pants._channel import _Channel, HAS_IPV6
 from pants.engine import Engine
 
@@ -43,6 +47,33 @@ from pants.engine import Engine
 RegexType = type(re.compile(""))
 Struct = struct.Struct
 
+# Writes smaller than this are joined onto the previous write, as long as
+# the result is no larger. Bigger writes are buffered without copying.
+_WRITE_JOIN_THRESHOLD = 2 ** 10
+
+# The bounds within which the amount of data asked of the socket by each
+# read adapts to the size of the bursts it receives.
+_RECV_AMOUNT_MIN = 2 ** 12
+_RECV_AMOUNT_MAX = 2 ** 18
+
+# The largest amount of data in a single TLS record, and the most data
+# passed to each SSL write, which is kept a multiple of it so that only
+# the last write before the send buffer empties ends in a partial record.
+_TLS_RECORD_SIZE = 2 ** 14
+_TLS_WRITE_AMOUNT = _TLS_RECORD_SIZE * 16
+
+
+# The regular expression operators whose matches can depend on data
+# outside of the width reported by sre_parse. Lookbehind assertions are
+# the exception, as they only look at data before the match. AT covers
+# zero-width assertions such as \b, \B and $, which look at the
+# character after the match.
+_UNBOUNDED_REGEX_OPS = (sre_constants.ASSERT, sre_constants.ASSERT_NOT,
+                        sre_constants.AT, sre_constants.GROUPREF,
+                        sre_constants.GROUPREF_EXISTS)
+
+_regex_widths = {}
+
 
 ###############################################################################
 # Logging
@@ -52,6 +83,55 @@ import logging
 log = logging.getLogger("pants")
 
 
+###############################################################################
+# Delimiter Scanning
+###############################################################################
+
+def _regex_width(regex):
+    """
+    Return the greatest length of string a compiled regular expression
+    can match, or None if there is no limit or the length of a match
+    can depend on the data around it.
+    """
+    try:
+        return _regex_widths[regex]
+    except KeyError:
+        pass
+
+    try:
+        parsed = sre_parse.parse(regex.pattern, regex.flags)
+    except (sre_constants.error, TypeError):
+        width = None
+    else:
+        width = parsed.getwidth()[1]
+        if width >= sre_constants.MAXREPEAT or _has_unbounded_op(parsed):
+            width = None
+
+    _regex_widths[regex] = width
+    return width
+
+def _has_unbounded_op(parsed):
+    """
+    Return True if a parsed regular expression contains any operators
+    in :data:`_UNBOUNDED_REGEX_OPS`.
+    """
+    for op, av in parsed:
+        if op in (sre_constants.ASSERT, sre_constants.ASSERT_NOT) and av[0] < 0:
+            continue
+        if op in _UNBOUNDED_REGEX_OPS:
+            return True
+        for item in av if isinstance(av, (tuple, list)) else ():
+            if isinstance(item, sre_parse.SubPattern):
+                if _has_unbounded_op(item):
+                    return True
+            elif isinstance(item, (tuple, list)):
+                for sub in item:
+                    if isinstance(sub, sre_parse.SubPattern) and \
+                            _has_unbounded_op(sub):
+                        return True
+    return False
+
+
 ###############################################################################
 # Stream Class
 ###############################################################################
@@ -78,6 +158,9 @@ class Stream(_Channel):
                        :meth:`~pants.stream.Stream.startSSL` will be
                        called with these options once the stream is
                        ready. By default, SSL will not be enabled.
+    socket_options     *Optional.* A dictionary of socket options, such
+                       as ``{"nodelay": True}``, overriding the class's
+                       ``socket_options``. See :mod:`pants.util.sockopt`.
     =================  ================================================
     """
     SEND_STRING = 0
@@ -98,9 +181,11 @@ class Stream(_Channel):
 
         # I/O attributes
         self._read_delimiter = None
-        self._recv_buffer = ""
+        self._recv_buffer = _RecvBuffer()
+        self._recv_scan_offset = 0
         self._recv_buffer_size_limit = self._buffer_size
-        self._send_buffer = []
+        self._send_buffer = collections.deque()
+        self._send_offset = 0
 
         # Channel state
         self.connected = False
@@ -202,7 +287,9 @@ class Stream(_Channel):
         :meth:`~pants.stream.Stream.on_read` callback. The value of the
         read delimiter determines when the data is passed to the
         callback. Valid values are ``None``, a string, an integer/long,
-        a compiled regular expression, or an instance of :class:`struct.Struct`.
+        a compiled regular expression, an instance of :class:`struct.Struct`,
+        an instance of :class:`~pants.stream.LengthPrefixed`, or a parser
+        object.
 
         When the read delimiter is ``None``, data will be passed to
         :meth:`~pants.stream.Stream.on_read` immediately after it is
@@ -233,6 +320,32 @@ class Stream(_Channel):
                 def on_read(self, packet_type, length, id):
                     pass
 
+        When the read delimiter is a :class:`~pants.stream.LengthPrefixed`
+        instance, a header holding the length of the payload that follows
+        it is fully buffered, then the payload, and both are passed to
+        :meth:`on_read` together. See :class:`~pants.stream.LengthPrefixed`.
+
+        When the read delimiter is a parser object, one with a
+        ``feed(buffer, offset)`` method, the parser decides where
+        messages end. ``feed`` is called with a read-only :obj:`buffer`
+        over all of the unconsumed data, which must not be kept after
+        it returns, and the number of bytes at its start that the parser
+        has already been shown. It returns a tuple of the number of bytes
+        to consume and a list of messages, each of which is passed to
+        :meth:`on_read`. A parser should return every complete message
+        it finds, up to any point where the read delimiter will need to
+        change, as all of them are passed on. Example::
+
+            class LineParser(object):
+                def feed(self, buffer, offset):
+                    lines = buffer[:].split("\n")
+                    rest = lines.pop()
+                    return len(buffer) - len(rest), lines
+
+            class Example(Stream):
+                def on_connect(self):
+                    self.read_delimiter = LineParser()
+
         When the read delimiter is a compiled regular expression, there
         are two possible behaviors, selected by the value of
         :attr:`~pants.stream.Stream.regex_search`. If ``regex_search``
@@ -247,6 +360,13 @@ class Stream(_Channel):
         giving you access to the capture groups. Again, all data up to
         the end of the matched content is removed from the buffer.
 
+        When the read delimiter is None, a number of bytes or a
+        :class:`~pants.stream.LengthPrefixed` instance and
+        :attr:`~pants.stream.Stream.read_views` is True, the data is
+        passed to :meth:`~pants.stream.Stream.on_read` as a
+        :obj:`memoryview` rather than a string. A view that takes all
+        of the buffered data is handed over without being copied.
+
         Attempting to set the read delimiter to any other value will
         raise a :exc:`TypeError`.
 
@@ -257,6 +377,8 @@ class Stream(_Channel):
 
     @read_delimiter.setter
     def read_delimiter(self, value):
+        self._recv_scan_offset = 0
+
         if value is None or isinstance(value, basestring) or \
                 isinstance(value, RegexType):
             self._read_delimiter = value
@@ -270,6 +392,14 @@ class Stream(_Channel):
             self._read_delimiter = value
             self._recv_buffer_size_limit = max(self._buffer_size, value.size)
 
+        elif isinstance(value, LengthPrefixed):
+            self._read_delimiter = value
+            self._recv_buffer_size_limit = value._buffer_limit(self._buffer_size)
+
+        elif hasattr(value, "feed"):
+            self._read_delimiter = value
+            self._recv_buffer_size_limit = self._buffer_size
+
         else:
             raise TypeError("Attempted to set read_delimiter to a value with an invalid type.")
 
@@ -278,6 +408,50 @@ class Stream(_Channel):
     regex_search = True
     _buffer_size = 2 ** 16  # 64kb
 
+    # If True, data passed to on_read when the read delimiter is None,
+    # a number of bytes or LengthPrefixed is a memoryview, handed over
+    # without being copied when it takes everything in the buffer.
+    read_views = False
+
+    # If True, writes and flushes are held until the end of the
+    # engine's current iteration, and everything written during it is
+    # then sent together.
+    auto_cork = False
+
+    #: *Optional.* If set to a callable, it is called with a list of
+    #: every complete message in the buffer after each read, instead
+    #: of :meth:`on_read` being called once per message. With a
+    #: :class:`struct.Struct` read delimiter, each message is a tuple of
+    #: the record's fields, and records are unpacked many at a time.
+    #: Changes to the read delimiter made by the callback apply from the
+    #: next batch.
+    on_read_batch = None
+
+    # The number of bytes read from the socket per iteration of the
+    # engine before other channels get a turn. None means no limit.
+    read_budget = 2 ** 18  # 256kb
+
+    @property
+    def writable(self):
+        """
+        True if data written to the channel now can be sent without
+        taking the amount of buffered outgoing data above
+        :attr:`~pants._channel._Channel.write_high_water`. False if the
+        channel is not connected, is closing, or is waiting to drain,
+        between calls to :meth:`~pants.stream.Stream.on_pause_writing`
+        and :meth:`~pants.stream.Stream.on_drain`.
+        """
+        return (self.connected and not self._closing and
+                not self._closed and not self._writing_paused)
+
+    @property
+    def reading_paused(self):
+        """
+        True if reading has been paused with
+        :meth:`~pants.stream.Stream.pause_reading`.
+        """
+        return self._reading_paused
+
     @property
     def buffer_size(self):
         """
@@ -318,6 +492,9 @@ class Stream(_Channel):
         elif isinstance(self._read_delimiter, Struct):
             self._recv_buffer_size_limit = max(value,
                                                self._read_delimiter.size)
+        elif isinstance(self._read_delimiter, LengthPrefixed):
+            self._recv_buffer_size_limit = \
+                self._read_delimiter._buffer_limit(value)
         else:
             self._recv_buffer_size_limit = value
 
@@ -357,6 +534,13 @@ class Stream(_Channel):
         ``ca_certs`` options. The ``do_handshake_on_connect`` option
         **must** be ``False``, or a :exc:`ValueError` will be raised.
 
+        Once SSL is enabled, queued data is encrypted in writes of whole
+        TLS records. OpenSSL sends each record with its own system call,
+        so Nagle's algorithm can hold back the partial record that ends
+        a write until the peer's delayed ACK arrives. Streams that send
+        large responses over SSL should set the ``nodelay`` socket
+        option.
+
         Attempting to enable SSL on a closed channel or a channel that
         already has SSL enabled on it will raise a :exc:`RuntimeError`.
 
@@ -452,8 +636,11 @@ class Stream(_Channel):
             return
 
         self.read_delimiter = None
-        self._recv_buffer = ""
-        self._send_buffer = []
+        self._recv_buffer.clear()
+        self._send_buffer = collections.deque()
+        self._send_offset = 0
+        self._send_buffered = 0
+        self._writing_paused = False
 
         self.connected = False
         self.connecting = False
@@ -481,6 +668,14 @@ class Stream(_Channel):
 
         Data will not be written immediately, but will be buffered
         internally until it can be sent without blocking the process.
+        Consecutive writes are sent together with as few system calls as
+        possible, and only small writes are copied to do so.
+
+        When the amount of buffered data rises above
+        :attr:`~pants._channel._Channel.write_high_water`,
+        :meth:`~pants.stream.Stream.on_pause_writing` is called. Data
+        is still accepted, but callers should stop writing until
+        :meth:`~pants.stream.Stream.on_drain` is called.
 
         Calling :meth:`write()` on a closed or disconnected channel will
         raise a :exc:`RuntimeError`.
@@ -488,7 +683,10 @@ class Stream(_Channel):
         ==========  ===================================================
         Arguments   Description
         ==========  ===================================================
-        data        A string of data to write to the channel.
+        data        A string of data to write to the channel. A
+                    :obj:`memoryview`, :obj:`buffer` or
+                    :obj:`bytearray` is copied into a string when it
+                    is queued.
         flush       *Optional.* If True, flush the internal write
                     buffer. See :meth:`~pants.stream.Stream.flush` for
                     details.
@@ -500,17 +698,35 @@ class Stream(_Channel):
         if not self.connected:
             raise RuntimeError("write() called on disconnected %r." % self)
 
-        if self._send_buffer and self._send_buffer[-1][0] == Stream.SEND_STRING:
-            data_type, existing_data = self._send_buffer.pop(-1)
-            data = existing_data + data
+        if isinstance(data, memoryview):
+            data = data.tobytes()
+        elif isinstance(data, (buffer, bytearray)):
+            data = str(data)
+
+        size = len(data)
+        send_buffer = self._send_buffer
+        if send_buffer and send_buffer[-1][0] == Stream.SEND_STRING:
+            buffers = send_buffer[-1][1]
+            if len(buffers[-1]) + size <= _WRITE_JOIN_THRESHOLD:
+                buffers[-1] += data
+            else:
+                buffers.append(data)
+        else:
+            send_buffer.append((Stream.SEND_STRING, [data]))
 
-        self._send_buffer.append((Stream.SEND_STRING, data))
+        self._send_buffered += size
 
-        if flush:
+        if self.auto_cork:
+            self.engine._cork_channel(self)
+        elif flush:
             self._process_send_buffer()
-        else:
+        elif not self._events & Engine.WRITE:
             self._start_waiting_for_write_event()
 
+        if self._send_buffered > self.write_high_water and \
+                not self._writing_paused:
+            self._pause_writing()
+
     def write_file(self, sfile, nbytes=0, offset=0, flush=False):
         """
         Write a file to the channel.
@@ -542,7 +758,9 @@ class Stream(_Channel):
 
         self._send_buffer.append((Stream.SEND_FILE, (sfile, offset, nbytes)))
 
-        if flush:
+        if self.auto_cork:
+            self.engine._cork_channel(self)
+        elif flush:
             self._process_send_buffer()
         else:
             self._start_waiting_for_write_event()
@@ -577,13 +795,64 @@ class Stream(_Channel):
             self.write(self._read_delimiter.pack(*data),
                        kwargs.get("flush", False))
 
+    def write_many(self, format, records, flush=False):
+        """
+        Write many records of packed binary data to the channel at once.
+
+        The records are packed into a single string, which is queued as
+        one piece of data, rather than packed and written one by one as
+        with :meth:`~pants.stream.Stream.write_packed`.
+
+        ==========  ====================================================
+        Argument    Description
+        ==========  ====================================================
+        format      A :class:`struct.Struct` or format string to pack
+                    each record with. If None, the read delimiter is
+                    used, and must be a :class:`struct.Struct`.
+        records     An iterable of tuples, each holding the values of
+                    one record, or a NumPy array with items of the
+                    format's size, such as a record array, which is
+                    written as it is.
+        flush       *Optional.* If True, flush the internal write
+                    buffer. See :meth:`~pants.stream.Stream.flush`
+                    for details.
+        ==========  ====================================================
+        """
+        if self._closed or self._closing:
+            raise RuntimeError("write_many() called on closed %r." % self)
+
+        if not self.connected:
+            raise RuntimeError("write_many() called on disconnected %r." % self)
+
+        if format is None:
+            if not isinstance(self._read_delimiter, Struct):
+                raise ValueError("No format is available for writing packed data.")
+            format = self._read_delimiter
+        elif not isinstance(format, Struct):
+            format = Struct(format)
+
+        if hasattr(records, "dtype"):
+            if records.dtype.itemsize != format.size:
+                raise ValueError("Array items are %d bytes, not the %d bytes "
+                                 "of a record." % (records.dtype.itemsize,
+                                                   format.size))
+            data = records.tostring()
+        else:
+            pack = format.pack
+            data = "".join([pack(*record) for record in records])
+
+        if data:
+            self.write(data, flush)
+
     def flush(self):
         """
         Attempt to immediately write any internally buffered data to the
         channel without waiting for a write event.
 
         This method can be fairly expensive to call and should be used
-        sparingly.
+        sparingly. If :attr:`auto_cork` is True, the data is instead
+        sent at the end of the engine's current iteration, along with
+        anything else written before then.
 
         Calling :meth:`flush()` on a closed or disconnected channel will
         raise a :exc:`RuntimeError`.
@@ -597,9 +866,41 @@ class Stream(_Channel):
         if not self._send_buffer:
             return
 
+        if self.auto_cork:
+            self.engine._cork_channel(self)
+            return
+
         self._stop_waiting_for_write_event()
         self._process_send_buffer()
 
+    def pause_reading(self):
+        """
+        Stop reading data from the channel until
+        :meth:`~pants.stream.Stream.resume_reading` is called.
+
+        Data that has already been received but not yet passed to
+        :meth:`~pants.stream.Stream.on_read` stays buffered. Data the
+        peer sends meanwhile is left with the operating system, so
+        that once its buffers fill, TCP flow control stops the peer
+        sending any more. Use this when the channel can't keep up
+        with incoming data, such as while a previous message is
+        still being handled.
+
+        If the peer closes the connection while reading is paused, the
+        channel isn't closed until reading resumes and the data it
+        sent first has been passed on.
+        """
+        self._stop_reading()
+
+    def resume_reading(self):
+        """
+        Start reading data from the channel again after a call to
+        :meth:`~pants.stream.Stream.pause_reading`. Buffered data is
+        passed to :meth:`~pants.stream.Stream.on_read` on the engine's
+        next iteration, if not sooner.
+        """
+        self._start_reading()
+
     ##### Public Event Handlers ###############################################
 
     def on_ssl_handshake(self):
@@ -697,35 +998,68 @@ class Stream(_Channel):
         """
         if self.ssl_enabled and not self._ssl_handshake_done:
             self._ssl_do_handshake()
-            return
-
-        while True:
-            try:
-                data = self._socket_recv()
-            except socket.error as err:
-                self._safely_call(self.on_read_error, err)
+            # Application data may have arrived along with the end of
+            # the handshake, and won't raise another read event.
+            if self._closed or not self._ssl_handshake_done:
                 return
 
-            if not data:
-                break
-            else:
-                self._recv_buffer += data
+        budget = self.read_budget
+        received = 0
+
+        # Data is received into a buffer borrowed from the engine, and
+        # only what arrives is copied out of it.
+        pool = self.engine._buffer_pool
+        scratch = pool.acquire(self._recv_amount)
+
+        try:
+            while True:
+                try:
+                    data = self._socket_recv_into(scratch)
+                except socket.error as err:
+                    self._safely_call(self.on_read_error, err)
+                    return
 
-                if len(self._recv_buffer) > self._recv_buffer_size_limit:
-                    # Try processing the buffer to reduce its length.
-                    self._process_recv_buffer()
+                if not data:
+                    break
+                else:
+                    self._recv_buffer.append(data)
 
-                    # If the buffer's still too long, overflow error.
                     if len(self._recv_buffer) > self._recv_buffer_size_limit:
-                        e = StreamBufferOverflow("Buffer length exceeded upper limit on %r." % self)
-                        self._safely_call(self.on_overflow_error, e)
-                        return
+                        # Try processing the buffer to reduce its length.
+                        self._process_recv_buffer()
+
+                        # If reading has been paused, leave the rest of
+                        # the data with the kernel for now.
+                        if self._reading_paused:
+                            break
+
+                        # If the buffer's still too long, overflow error.
+                        if len(self._recv_buffer) > self._recv_buffer_size_limit:
+                            e = StreamBufferOverflow("Buffer length exceeded upper limit on %r." % self)
+                            self._safely_call(self.on_overflow_error, e)
+                            return
+
+                    received += len(data)
+                    if budget is not None and received >= budget:
+                        # Give other channels a turn. There may be more
+                        # data waiting, so come back on the next
+                        # iteration.
+                        self.engine._requeue_channel(self, Engine.READ)
+                        break
+        finally:
+            pool.release(scratch)
 
+        self._adapt_recv_amount(received)
         self._process_recv_buffer()
 
         # This block was moved out of the above loop to address issue #41.
         if data is None:
-            self.close(flush=False)
+            if self._reading_paused:
+                # Data is still buffered. Close once reading resumes
+                # and it has been passed on.
+                self._hangup_pending = True
+            else:
+                self.close(flush=False)
 
     def _handle_write_event(self):
         """
@@ -773,43 +1107,102 @@ class Stream(_Channel):
 
     ##### Internal Processing Methods #########################################
 
+    def _adapt_recv_amount(self, received):
+        """
+        Adjust :attr:`_recv_amount` to the size of a burst of received
+        data. Bursts that took more than one read double it, and bursts
+        that used less than a quarter of it halve it.
+        """
+        if received > self._recv_amount:
+            self._recv_amount = min(self._recv_amount * 2, _RECV_AMOUNT_MAX)
+        elif received < self._recv_amount // 4:
+            self._recv_amount = max(self._recv_amount // 2, _RECV_AMOUNT_MIN)
+
     def _process_recv_buffer(self):
         """
         Process the :attr:`~pants.stream.Stream._recv_buffer`, passing
-        chunks of data to :meth:`~pants.stream.Stream.on_read`.
+        chunks of data to :meth:`~pants.stream.Stream.on_read`, or
+        lists of them to :attr:`~pants.stream.Stream.on_read_batch`.
         """
-        while self._recv_buffer:
+        if self.on_read_batch is None:
+            self._read_messages(None)
+            return
+
+        buf = self._recv_buffer
+
+        while buf and not self._reading_paused:
+            batch = []
+            self._read_messages(batch)
+            if not batch:
+                break
+
+            self._safely_call(self.on_read_batch, batch)
+
+            if self._closed or not self.connected or self.on_read_batch is None:
+                break
+
+        # The callback may have removed itself, leaving messages to be
+        # passed to on_read.
+        if self.on_read_batch is None and buf and self.connected:
+            self._read_messages(None)
+
+    def _read_messages(self, batch):
+        """
+        Take messages from the :attr:`~pants.stream.Stream._recv_buffer`
+        until it runs out of complete ones, passing each to
+        :meth:`~pants.stream.Stream.on_read`, or appending them to
+        *batch* if it isn't None.
+        """
+        buf = self._recv_buffer
+
+        while buf and not self._reading_paused:
             delimiter = self.read_delimiter
 
             if delimiter is None:
-                data = self._recv_buffer
-                self._recv_buffer = ""
+                if self.read_views:
+                    data = buf.read_view()
+                else:
+                    data = buf.read()
+                if batch is not None:
+                    batch.append(data)
+                    break
                 self._safely_call(self.on_read, data)
 
             elif isinstance(delimiter, (int, long)):
-                if len(self._recv_buffer) < delimiter:
+                if len(buf) < delimiter:
                     break
-                data = self._recv_buffer[:delimiter]
-                self._recv_buffer = self._recv_buffer[delimiter:]
+                if self.read_views:
+                    data = buf.read_view(delimiter)
+                else:
+                    data = buf.read(delimiter)
+                if batch is not None:
+                    batch.append(data)
+                    continue
                 self._safely_call(self.on_read, data)
 
             elif isinstance(delimiter, basestring):
-                mark = self._recv_buffer.find(delimiter)
-                if mark == -1:
+                data = buf.read_until(delimiter, self._recv_scan_offset)
+                if data is None:
+                    # Only the end of the buffer, which could hold the
+                    # start of the delimiter, needs searching again.
+                    self._recv_scan_offset = max(0, len(buf) - len(delimiter) + 1)
                     break
-                data = self._recv_buffer[:mark]
-                self._recv_buffer = self._recv_buffer[mark + len(delimiter):]
+                self._recv_scan_offset = 0
+                if batch is not None:
+                    batch.append(data)
+                    continue
                 self._safely_call(self.on_read, data)
 
             elif isinstance(delimiter, Struct):
-                if len(self._recv_buffer) < delimiter.size:
+                if len(buf) < delimiter.size:
                     break
-                data = self._recv_buffer[:delimiter.size]
-                self._recv_buffer = self._recv_buffer[delimiter.size:]
 
                 # Safely unpack it. This should *probably* never error.
                 try:
-                    data = delimiter.unpack(data)
+                    if batch is not None:
+                        batch.extend(buf.unpack_many(delimiter))
+                        break
+                    data = buf.unpack(delimiter)
                 except struct.error:
                     log.exception("Unable to unpack data on %r." % self)
                     self.close()
@@ -819,27 +1212,94 @@ class Stream(_Channel):
                 # the parsed data as its own argument.
                 self._safely_call(self.on_read, *data)
 
+            elif isinstance(delimiter, LengthPrefixed):
+                size = delimiter.size
+                if len(buf) < size:
+                    break
+
+                fields = buf.unpack_from(delimiter.header)
+                length = fields[delimiter.length_field]
+                if not 0 <= length <= delimiter._limit(self._recv_buffer_size_limit):
+                    e = StreamBufferOverflow("Message length %d exceeds limit on %r." % (length, self))
+                    self._safely_call(self.on_overflow_error, e)
+                    break
+
+                if len(buf) < size + length:
+                    break
+
+                buf.skip(size)
+                if self.read_views:
+                    payload = buf.read_view(length)
+                else:
+                    payload = buf.read(length)
+
+                data = delimiter._arguments(fields, payload)
+                if batch is not None:
+                    batch.append(data if len(data) > 1 else payload)
+                    continue
+                self._safely_call(self.on_read, *data)
+
             elif isinstance(delimiter, RegexType):
                 # Depending on regex_search, we could do this two ways.
                 if self.regex_search:
-                    match = delimiter.search(self._recv_buffer)
+                    match = delimiter.search(buf.view(), self._recv_scan_offset)
                     if not match:
+                        # A match can't start further back from the end
+                        # than the longest string the delimiter matches.
+                        width = _regex_width(delimiter)
+                        if width is not None:
+                            self._recv_scan_offset = max(0, len(buf) - width + 1)
                         break
 
-                    data = self._recv_buffer[:match.start()]
-                    self._recv_buffer = self._recv_buffer[match.end():]
+                    self._recv_scan_offset = 0
+                    data = buf.read(match.start())
+                    buf.skip(match.end() - match.start())
 
                 else:
-                    # Require the match to be at the beginning.
-                    data = delimiter.match(self._recv_buffer)
-                    if not data:
+                    # Require the match to be at the beginning. The match
+                    # is handed to on_read, so it must be made against a
+                    # string that won't change underneath it.
+                    if not delimiter.match(buf.view()):
                         break
 
-                    self._recv_buffer = self._recv_buffer[data.end():]
+                    data = delimiter.match(buf.peek())
+                    buf.skip(data.end())
 
                 # Send either the string or the match object.
+                if batch is not None:
+                    batch.append(data)
+                    continue
                 self._safely_call(self.on_read, data)
 
+            elif hasattr(delimiter, "feed"):
+                size = len(buf)
+                if self._recv_scan_offset >= size:
+                    # Nothing has arrived that the parser hasn't seen.
+                    break
+                try:
+                    consumed, messages = delimiter.feed(buf.view(),
+                                                        self._recv_scan_offset)
+                except Exception:
+                    log.exception("Error parsing data on %r." % self)
+                    self.close()
+                    break
+
+                if consumed:
+                    buf.skip(consumed)
+                # The parser has now seen everything left in the buffer.
+                self._recv_scan_offset = size - consumed
+
+                if batch is not None:
+                    batch.extend(messages)
+                else:
+                    for data in messages:
+                        self._safely_call(self.on_read, data)
+                        if self._closed or not self.connected:
+                            break
+
+                if not consumed and not messages:
+                    break
+
             else:
                 # The safeguards in the read delimiter property should
                 # prevent this from happening unless people start
@@ -859,13 +1319,15 @@ class Stream(_Channel):
         :meth:`~pants.stream.Stream.on_write` when sending has finished.
         """
         while self._send_buffer:
-            data_type, data = self._send_buffer.pop(0)
+            data_type, data = self._send_buffer[0]
 
             if data_type == Stream.SEND_STRING:
-                bytes_sent = self._process_send_string(data)
+                bytes_sent = self._process_send_strings(data)
             elif data_type == Stream.SEND_FILE:
+                self._send_buffer.popleft()
                 bytes_sent = self._process_send_file(*data)
             elif data_type == Stream.SEND_SSL_HANDSHAKE:
+                self._send_buffer.popleft()
                 bytes_sent = self._process_send_ssl_handshake(data)
 
             if bytes_sent == 0:
@@ -877,19 +1339,34 @@ class Stream(_Channel):
             if self._closing:
                 self.close(flush=False)
 
-    def _process_send_string(self, data):
+    def _process_send_strings(self, buffers):
         """
-        Send data from a string to the remote socket.
+        Send data from a list of strings, written one after another, to
+        the remote socket. Strings that are sent completely are removed
+        from the list, and the list from the send buffer once it is
+        empty. :attr:`_send_offset` records how much of the first
+        remaining string has been sent.
         """
         try:
-            bytes_sent = self._socket_send(data)
+            bytes_sent = self._socket_sendv(buffers, self._send_offset)
         except socket.error as err:
             self._safely_call(self.on_write_error, err)
             return 0
 
-        if len(data) > bytes_sent:
-            self._send_buffer.insert(0, (Stream.SEND_STRING, data[bytes_sent:]))
+        remaining = self._send_offset + bytes_sent
+        count = len(buffers)
+        i = 0
+        while i < count and remaining >= len(buffers[i]):
+            remaining -= len(buffers[i])
+            i += 1
 
+        if i == count:
+            self._send_buffer.popleft()
+        elif i:
+            del buffers[:i]
+        self._send_offset = remaining
+
+        self._data_sent(bytes_sent)
         return bytes_sent
 
     def _process_send_file(self, sfile, offset, nbytes):
@@ -916,7 +1393,7 @@ class Stream(_Channel):
             # Reached the end of the file.
             return bytes_sent
 
-        self._send_buffer.insert(0, (Stream.SEND_FILE, (sfile, offset, nbytes)))
+        self._send_buffer.appendleft((Stream.SEND_FILE, (sfile, offset, nbytes)))
 
         return bytes_sent
 
@@ -969,6 +1446,30 @@ class Stream(_Channel):
             else:
                 raise
 
+    def _socket_recv_into(self, buf):
+        """
+        Receive data from the socket into a writable buffer.
+
+        Returns a read-only buffer over the data received. The data is
+        None if the socket has been closed.
+
+        Overrides :meth:`pants._channel._Channel._socket_recv_into` to
+        handle SSL-specific behaviour.
+
+        =========  ============
+        Argument   Description
+        =========  ============
+        buf        A :obj:`bytearray` to receive into.
+        =========  ============
+        """
+        try:
+            return _Channel._socket_recv_into(self, buf)
+        except ssl.SSLError as err:
+            if err.args[0] == ssl.SSL_ERROR_WANT_READ:
+                return ''
+            else:
+                raise
+
     def _socket_send(self, data):
         """
         Send data to the socket.
@@ -988,7 +1489,7 @@ class Stream(_Channel):
             bytes_sent = _Channel._socket_send(self, data)
         except ssl.SSLError as err:
             if err.args[0] == ssl.SSL_ERROR_WANT_WRITE:
-                self._start_waiting_for_write_event()
+                self._wait_until_writable()
                 return 0
             else:
                 raise
@@ -996,9 +1497,54 @@ class Stream(_Channel):
         # SSLSocket.send() can return 0 rather than raise an exception
         # if it needs a write event.
         if self.ssl_enabled and bytes_sent == 0:
-            self._start_waiting_for_write_event()
+            self._wait_until_writable()
         return bytes_sent
 
+    def _socket_sendv(self, buffers, offset=0):
+        """
+        Send data from a list of strings to the socket.
+
+        Returns the number of bytes that were sent to the socket.
+
+        Overrides :meth:`pants._channel._Channel._socket_sendv` to handle
+        SSL-specific behaviour. With SSL enabled, up to
+        ``_TLS_WRITE_AMOUNT`` bytes from the start of the strings are
+        passed to a single SSL write, so that they are encrypted into
+        full TLS records.
+
+        =========  ============
+        Argument   Description
+        =========  ============
+        buffers    The strings of data to send.
+        offset     *Optional.* The number of bytes of the first string
+                   that have already been sent.
+        =========  ============
+        """
+        if not self.ssl_enabled:
+            return _Channel._socket_sendv(self, buffers, offset)
+
+        # A write that failed with SSL_ERROR_WANT_WRITE must be retried
+        # with the same data, which this gives as long as the strings and
+        # offset are unchanged.
+        first = buffers[0]
+        size = len(first) - offset
+        if size >= _TLS_WRITE_AMOUNT:
+            return self._socket_send(buffer(first, offset, _TLS_WRITE_AMOUNT))
+        if len(buffers) == 1:
+            return self._socket_send(buffer(first, offset) if offset else first)
+
+        chunks = [first[offset:] if offset else first]
+        for i in xrange(1, len(buffers)):
+            data = buffers[i]
+            space = _TLS_WRITE_AMOUNT - size
+            if len(data) >= space:
+                chunks.append(data[:space])
+                break
+            chunks.append(data)
+            size += len(data)
+
+        return self._socket_send("".join(chunks))
+
     def _socket_sendfile(self, sfile, offset, nbytes):
         """
         Send data from a file to a remote socket.
@@ -1028,7 +1574,7 @@ class Stream(_Channel):
             if err.args[0] == ssl.SSL_ERROR_WANT_READ:
                 return 0
             elif err.args[0] == ssl.SSL_ERROR_WANT_WRITE:
-                self._start_waiting_for_write_event()
+                self._wait_until_writable()
                 return 0
             elif err.args[0] in (ssl.SSL_ERROR_EOF, ssl.SSL_ERROR_ZERO_RETURN):
                 self.close(flush=False)
@@ -1052,6 +1598,145 @@ class Stream(_Channel):
             return None
 
 
+###############################################################################
+# LengthPrefixed Class
+###############################################################################
+
+class LengthPrefixed(object):
+    """
+    A read delimiter for messages made up of a fixed-size header, one
+    field of which holds the length of the payload that follows it.
+    Works with :class:`~pants.stream.Stream`,
+    :class:`~pants.datagram.Datagram` and
+    :class:`~pants.http.websocket.WebSocket`.
+
+    The header is unpacked where it lies in the buffer and the payload
+    is taken in the same pass, once all of it has arrived. The header's
+    fields are passed to ``on_read`` as separate arguments, as with a
+    :class:`struct.Struct` delimiter, but with the payload in place of
+    the length. Example::
+
+        class Example(Stream):
+            def on_connect(self):
+                self.read_delimiter = LengthPrefixed("!BI", length_field=1)
+
+            def on_read(self, packet_type, payload):
+                pass
+
+    A message longer than *max_length*, or with a negative length, is
+    passed to ``on_overflow_error`` instead.
+
+    ============  ============
+    Argument      Description
+    ============  ============
+    header        A :class:`struct.Struct` or format string describing
+                  the header.
+    length_field  *Optional.* The index of the header field that holds
+                  the payload's length. Defaults to 0.
+    max_length    *Optional.* The longest payload to accept. By
+                  default, a message and its header must fit in the
+                  channel's ``buffer_size``. If larger, the channel's
+                  buffer grows to hold such a message.
+    ============  ============
+    """
+    def __init__(self, header, length_field=0, max_length=None):
+        if not isinstance(header, Struct):
+            header = Struct(header)
+
+        fields = len(header.unpack("\0" * header.size))
+        if not -fields <= length_field < fields:
+            raise ValueError("The header has no field %d." % length_field)
+
+        self.header = header
+        self.length_field = length_field % fields
+        self.max_length = max_length
+        self.size = header.size
+        self._fields = fields
+
+    def __repr__(self):
+        return "%s(%r, %d, %r)" % (self.__class__.__name__,
+                self.header.format, self.length_field, self.max_length)
+
+    def _buffer_limit(self, buffer_size):
+        """
+        Return the buffer size limit needed for messages to fit.
+        """
+        if self.max_length is None:
+            return buffer_size
+        return max(buffer_size, self.size + self.max_length)
+
+    def _limit(self, buffer_limit):
+        """
+        Return the longest payload to accept, given a channel's buffer
+        size limit.
+        """
+        if self.max_length is None:
+            return buffer_limit - self.size
+        return self.max_length
+
+    def _arguments(self, fields, payload):
+        """
+        Return the arguments for ``on_read``: the header's fields, with
+        the payload in place of the length.
+        """
+        if self._fields == 1:
+            return (payload,)
+        fields = list(fields)
+        fields[self.length_field] = payload
+        return tuple(fields)
+
+
+###############################################################################
+# Pipe Function
+###############################################################################
+
+def pipe(src, dst):
+    """
+    Write all data read from one stream to another, reading from the
+    first only as fast as the second can send.
+
+    Whenever *dst* has more buffered outgoing data than its
+    :attr:`~pants._channel._Channel.write_high_water`, *src* stops
+    reading from its socket until *dst* drains, so that a fast sender
+    and a slow receiver cannot make *dst* buffer without limit. TCP
+    flow control then slows the sender down.
+
+    The read delimiter of *src* is set to None and its
+    :meth:`~pants.stream.Stream.on_read` is replaced. Any
+    :meth:`~pants.stream.Stream.on_pause_writing` and
+    :meth:`~pants.stream.Stream.on_drain` handlers of *dst* are still
+    called. Closing either stream is left to the caller.
+
+    =========  ============
+    Argument   Description
+    =========  ============
+    src        The stream to read from.
+    dst        The stream to write to.
+    =========  ============
+    """
+    pause_writing = dst.on_pause_writing
+    drain = dst.on_drain
+
+    def on_read(data):
+        dst.write(data)
+
+    def on_pause_writing():
+        src.pause_reading()
+        pause_writing()
+
+    def on_drain():
+        src.resume_reading()
+        drain()
+
+    src.read_delimiter = None
+    src.on_read = on_read
+    dst.on_pause_writing = on_pause_writing
+    dst.on_drain = on_drain
+
+    if dst._writing_paused:
+        src.pause_reading()
+
+
 ###############################################################################
 # Exceptions
 ###############################################################################
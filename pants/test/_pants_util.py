@@ -35,3 +35,5 @@ class PantsTestCase(unittest.TestCase):
         self._engine.stop()
         if self._engine_thread:
             self._engine_thread.join(1.0)
+            if not self._engine_thread.is_alive():
+                self._engine.close()
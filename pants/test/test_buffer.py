@@ -0,0 +1,139 @@
+###############################################################################
+#
+# Copyright 2012 Pants Developers (see AUTHORS.txt)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+###############################################################################
+
+import re
+import struct
+import unittest
+
+from pants._buffer import (_BufferPool, _RecvBuffer, _COMPACTION_THRESHOLD,
+                           _POOL_MAX_FREE, _POOL_MAX_SIZE, _POOL_MIN_SIZE)
+
+class TestRecvBuffer(unittest.TestCase):
+    def setUp(self):
+        self.buf = _RecvBuffer()
+
+    def test_empty(self):
+        self.assertFalse(self.buf)
+        self.assertEqual(len(self.buf), 0)
+        self.assertEqual(self.buf.read(), "")
+
+    def test_read(self):
+        self.buf.append("hello ")
+        self.buf.append("world")
+        self.assertEqual(len(self.buf), 11)
+        self.assertEqual(self.buf.read(5), "hello")
+        self.assertEqual(self.buf.peek(), " world")
+        self.assertEqual(self.buf.read(), " world")
+        self.assertFalse(self.buf)
+
+    def test_read_returns_str(self):
+        self.buf.append("abc")
+        self.assertIs(type(self.buf.read(2)), str)
+
+    def test_find_is_relative(self):
+        self.buf.append("ab\r\ncd\r\n")
+        self.buf.skip(4)
+        self.assertEqual(self.buf.find("\r\n"), 2)
+        self.assertEqual(self.buf.find("\r\n", 3), -1)
+
+    def test_find_across_appends(self):
+        self.buf.append("header\r")
+        self.assertEqual(self.buf.find("\r\n"), -1)
+        self.buf.append("\nbody")
+        self.assertEqual(self.buf.find("\r\n"), 6)
+
+    def test_read_until_from_offset(self):
+        self.buf.append("a,b,c")
+        self.assertEqual(self.buf.read_until(",", 2), "a,b")
+        self.assertEqual(self.buf.read_until(",", 2), None)
+        self.assertEqual(self.buf.read(), "c")
+
+    def test_view(self):
+        self.buf.append("xxhello world")
+        self.buf.skip(2)
+        match = re.compile("o w").search(self.buf.view())
+        self.assertEqual(match.start(), 4)
+        self.assertEqual(self.buf.view(6)[:], "world")
+
+    def test_read_view(self):
+        self.buf.append("hello world")
+        data = self.buf._data
+        view = self.buf.read_view(6)
+        self.assertTrue(isinstance(view, memoryview))
+        self.assertEqual(view.tobytes(), "hello ")
+        view = self.buf.read_view()
+        self.assertEqual(view.tobytes(), "world")
+        self.assertFalse(self.buf)
+        self.assertTrue(self.buf._data is not data)
+        self.buf.append("more")
+        self.assertEqual(view.tobytes(), "world")
+
+    def test_unpack(self):
+        self.buf.append("x" + struct.pack("!HI", 1, 2) + "rest")
+        self.buf.skip(1)
+        self.assertEqual(self.buf.unpack(struct.Struct("!HI")), (1, 2))
+        self.assertEqual(self.buf.read(), "rest")
+
+    def test_unpack_many(self):
+        records = [(i * 3, i) for i in xrange(150)]
+        for fmt in ("!HI", "IB"):
+            record = struct.Struct(fmt)
+            self.buf.append("".join(record.pack(*r) for r in records) + "xy")
+            self.assertEqual(self.buf.unpack_many(record), records)
+            self.assertEqual(self.buf.read(), "xy")
+
+    def test_unpack_many_incomplete(self):
+        self.buf.append("abc")
+        self.assertEqual(self.buf.unpack_many(struct.Struct("!I")), [])
+        self.assertEqual(len(self.buf), 3)
+
+    def test_compaction(self):
+        size = _COMPACTION_THRESHOLD
+        self.buf.append("a" * size + "b" * (size // 2))
+        self.buf.skip(size)
+        self.buf.append("c")
+        self.assertEqual(self.buf._start, 0)
+        self.assertEqual(len(self.buf._data), size // 2 + 1)
+        self.assertEqual(self.buf.read(), "b" * (size // 2) + "c")
+
+    def test_clear(self):
+        self.buf.append("data")
+        self.buf.clear()
+        self.assertFalse(self.buf)
+
+class TestBufferPool(unittest.TestCase):
+    def setUp(self):
+        self.pool = _BufferPool()
+
+    def test_size_classes(self):
+        self.assertEqual(len(self.pool.acquire(1)), _POOL_MIN_SIZE)
+        self.assertEqual(len(self.pool.acquire(_POOL_MIN_SIZE + 1)), _POOL_MIN_SIZE * 2)
+        self.assertEqual(len(self.pool.acquire(_POOL_MAX_SIZE * 4)), _POOL_MAX_SIZE)
+
+    def test_reuse(self):
+        buf = self.pool.acquire(100)
+        self.pool.release(buf)
+        self.assertTrue(self.pool.acquire(_POOL_MIN_SIZE) is buf)
+        self.assertFalse(self.pool.acquire(_POOL_MIN_SIZE) is buf)
+        self.assertEqual(self.pool.allocations, 2)
+
+    def test_max_free(self):
+        bufs = [self.pool.acquire(1) for i in xrange(_POOL_MAX_FREE + 2)]
+        for buf in bufs:
+            self.pool.release(buf)
+        self.assertEqual(len(self.pool._free[_POOL_MIN_SIZE]), _POOL_MAX_FREE)
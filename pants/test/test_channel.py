@@ -26,6 +26,7 @@ from mock import MagicMock
 from pants.engine import Engine
 from pants._channel import _Channel, HAS_UNIX, HAS_IPV6, InvalidAddressFormatError
 import pants._channel
+import pants.util.writev
 
 class TestChannelConstructorArguments(unittest.TestCase):
     def test_channel_constructor_no_args(self):
@@ -57,6 +58,20 @@ class TestChannelEngineInteraction(unittest.TestCase):
         channel.close()
         engine.remove_channel.assert_called_once_with(channel)
 
+class TestChannelPriority(unittest.TestCase):
+    def test_default_priority(self):
+        channel = _Channel(engine=Engine())
+        self.assertEqual(channel.priority, 0)
+
+    def test_set_priority(self):
+        engine = Engine()
+        channel = _Channel(engine=engine)
+        channel.priority = 5
+        self.assertEqual(channel.priority, 5)
+        self.assertEqual(engine._channel_priorities[channel], 5)
+        channel.priority = 0
+        self.assertFalse(channel in engine._channel_priorities)
+
 class TestChannelFileno(unittest.TestCase):
     def test_channel_fileno_with_no_socket(self):
         channel = _Channel()
@@ -110,6 +125,42 @@ class TestChannelSocketSet(unittest.TestCase):
         sock.type = 9001
         self.assertRaises(ValueError, self.channel._socket_set, sock)
 
+class TestChannelSocketOptions(unittest.TestCase):
+    def test_socket_options_applied_by_socket_set(self):
+        sock = socket.socket()
+        channel = _Channel(socket=sock, socket_options={"nodelay": True})
+        self.assertTrue(sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY))
+        channel.close()
+
+    def test_socket_options_class_attribute(self):
+        class Channel(_Channel):
+            socket_options = {"keepalive": True, "rcvbuf": 2 ** 16}
+        sock = socket.socket()
+        Channel(socket=sock)
+        self.assertTrue(sock.getsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE))
+        self.assertGreaterEqual(sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF), 2 ** 16)
+        sock.close()
+
+    def test_socket_options_skip_tcp_options_on_udp(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        _Channel(socket=sock, socket_options={"nodelay": True, "sndbuf": 2 ** 16})
+        self.assertGreaterEqual(sock.getsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF), 2 ** 16)
+        sock.close()
+
+    def test_socket_options_unknown_option(self):
+        sock = socket.socket()
+        self.assertRaises(ValueError, _Channel, socket=sock,
+                          socket_options={"nagle": False})
+        sock.close()
+
+    def test_socket_options_checked_without_socket(self):
+        self.assertRaises(ValueError, _Channel, socket_options={"nagle": False})
+        self.assertRaises(ValueError, _Channel, socket_options={"sndbuf": "big"})
+
+        class Channel(_Channel):
+            socket_options = {"nagle": False}
+        self.assertRaises(ValueError, Channel)
+
 class TestChannelSocketConnect(unittest.TestCase):
     def setUp(self):
         self.channel = _Channel()
@@ -280,6 +331,41 @@ class TestChannelSocketRecv(unittest.TestCase):
         self.sock.recv = MagicMock(side_effect=socket.error(-1))
         self.assertRaises(socket.error, self.channel._socket_recv)
 
+class TestChannelSocketRecvInto(unittest.TestCase):
+    def setUp(self):
+        self.channel = _Channel()
+        self.sock = MagicMock()
+        self.channel._socket = self.sock
+        self.buf = bytearray(8192)
+
+    def test_socket_recv_into(self):
+        def recv_into(buf, nbytes):
+            buf[:3] = "foo"
+            return 3
+        self.sock.recv_into = MagicMock(side_effect=recv_into)
+        result = self.channel._socket_recv_into(self.buf)
+        self.assertEquals(result[:], "foo")
+        self.sock.recv_into.assert_called_once_with(self.buf, self.channel._recv_amount)
+
+    def test_recv_into_returns_no_data(self):
+        self.sock.recv_into = MagicMock(return_value=0)
+        result = self.channel._socket_recv_into(self.buf)
+        self.assertEquals(result, None)
+
+    def test_recv_into_raises_EAGAIN(self):
+        self.sock.recv_into = MagicMock(side_effect=socket.error(errno.EAGAIN))
+        result = self.channel._socket_recv_into(self.buf)
+        self.assertEquals(result, "")
+
+    def test_recv_into_raises_ECONNRESET(self):
+        self.sock.recv_into = MagicMock(side_effect=socket.error(errno.ECONNRESET))
+        result = self.channel._socket_recv_into(self.buf)
+        self.assertEquals(result, None)
+
+    def test_recv_into_raises_unknown(self):
+        self.sock.recv_into = MagicMock(side_effect=socket.error(-1))
+        self.assertRaises(socket.error, self.channel._socket_recv_into, self.buf)
+
 class TestChannelSocketRecvFrom(unittest.TestCase):
     def setUp(self):
         self.channel = _Channel()
@@ -355,6 +441,35 @@ class TestChannelSocketSend(unittest.TestCase):
         self.sock.send = MagicMock(side_effect=Exception(-1))
         self.assertRaises(Exception, self.channel._socket_send)
 
+class TestChannelSocketSendv(unittest.TestCase):
+    def setUp(self):
+        self.channel = _Channel()
+        self.sock = MagicMock()
+        self.channel._socket = self.sock
+
+    def test_socket_sendv_fallback_joins(self):
+        self.sock.send = MagicMock(return_value=5)
+        self.assertEquals(self.channel._socket_sendv(["foo", "bar"], 1), 5)
+        self.sock.send.assert_called_once_with("oobar")
+
+    def test_sendv_raises_EAGAIN(self):
+        self.sock.send = MagicMock(side_effect=socket.error(errno.EAGAIN))
+        self.channel._start_waiting_for_write_event = MagicMock()
+        result = self.channel._socket_sendv(["foo", "bar"])
+        self.assertEquals(result, 0)
+        self.channel._start_waiting_for_write_event.assert_called_once_with()
+
+    @unittest.skipIf(pants.util.writev.writev is pants.util.writev.writev_fallback,
+                     "writev() is not available")
+    def test_socket_sendv_writev(self):
+        a, b = socket.socketpair()
+        self.channel._socket = a
+        result = self.channel._socket_sendv(["foo", "bar", "baz"], 2)
+        self.assertEquals(result, 7)
+        self.assertEquals(b.recv(100), "obarbaz")
+        a.close()
+        b.close()
+
 class TestChannelSocketSendTo(unittest.TestCase):
     def setUp(self):
         self.channel = _Channel()
@@ -441,7 +556,7 @@ class TestChannelSocketSendfile(unittest.TestCase):
 
 class TestChannelStartWaitingForWriteEvent(unittest.TestCase):
     def setUp(self):
-        self.channel = _Channel()
+        self.channel = _Channel(engine=Engine())
 
     def test_when_write_needs_to_be_added(self):
         self.channel._events = Engine.NONE
@@ -459,7 +574,7 @@ class TestChannelStartWaitingForWriteEvent(unittest.TestCase):
 
 class TestChannelStopWaitingForWriteEvent(unittest.TestCase):
     def setUp(self):
-        self.channel = _Channel()
+        self.channel = _Channel(engine=Engine())
 
     def test_when_write_needs_to_be_removed(self):
         self.channel._events = Engine.WRITE
@@ -572,7 +687,7 @@ class TestChannelResolveAddress(unittest.TestCase):
 
 class TestChannelHandleEvents(unittest.TestCase):
     def setUp(self):
-        self.channel = _Channel()
+        self.channel = _Channel(engine=Engine())
         self.channel._handle_read_event = MagicMock()
         self.channel._handle_write_event = MagicMock()
         self.channel._handle_error_event = MagicMock()
@@ -16,10 +16,13 @@
 #
 ###############################################################################
 
+import select
 import socket
+import threading
 import unittest
 
 import pants
+from pants.engine import Engine
 
 from pants.test._pants_util import *
 
@@ -82,3 +85,43 @@ class TestEcho(PantsTestCase):
     def tearDown(self):
         PantsTestCase.tearDown(self)
         self.server.close()
+
+@unittest.skipUnless(hasattr(select, "epoll"), "epoll-specific functionality.")
+class TestEchoEdgeTriggered(PantsTestCase):
+    def setUp(self):
+        engine = Engine(edge_triggered=True)
+        self.server = pants.Server(ConnectionClass=Echo, engine=engine).listen(('127.0.0.1', 4040))
+        PantsTestCase.setUp(self, engine)
+
+    def test_echo(self):
+        sock = socket.socket()
+        sock.settimeout(1.0)
+        sock.connect(('127.0.0.1', 4040))
+        for i in range(3):
+            request = "%s %d" % (repr(sock), i)
+            sock.send(request)
+            response = sock.recv(1024)
+            self.assertEquals(response, request)
+        sock.close()
+
+    def test_echo_large(self):
+        # Large enough to fill the socket buffers and make writes block.
+        sock = socket.socket()
+        sock.settimeout(5.0)
+        sock.connect(('127.0.0.1', 4040))
+        request = "x" * (8 * 1024 * 1024)
+        sender = threading.Thread(target=sock.sendall, args=(request,))
+        sender.start()
+        received = 0
+        while received < len(request):
+            data = sock.recv(65536)
+            if not data:
+                break
+            received += len(data)
+        sender.join()
+        self.assertEquals(received, len(request))
+        sock.close()
+
+    def tearDown(self):
+        PantsTestCase.tearDown(self)
+        self.server.close()
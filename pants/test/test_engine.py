@@ -18,12 +18,14 @@
 
 import errno
 import select
+import sys
 import time
 import unittest
 
-from mock import call, MagicMock
+from mock import call, MagicMock, patch
 
-from pants.engine import Engine, _EPoll, _KQueue, _Select, _Timer
+from pants.engine import (Engine, EPOLLET, _COMPACTION_THRESHOLD, _EPoll,
+                          _KQueue, _Select, _Timer, _TimingWheel)
 
 class TestEngine(unittest.TestCase):
     def test_engine_global_instance(self):
@@ -42,6 +44,9 @@ class TestEngineStart(unittest.TestCase):
     def setUp(self):
         self.engine = Engine()
 
+    def tearDown(self):
+        self.engine.close()
+
     def test_when_shutdown_is_true(self):
         self.engine._shutdown = True
         self.engine.start()
@@ -85,6 +90,9 @@ class TestEngineStop(unittest.TestCase):
     def setUp(self):
         self.engine = Engine()
 
+    def tearDown(self):
+        self.engine.close()
+
     def test_when_running(self):
         self.engine._shutdown = False
         self.engine._running = True
@@ -101,6 +109,9 @@ class TestEnginePoll(unittest.TestCase):
     def setUp(self):
         self.engine = Engine()
 
+    def tearDown(self):
+        self.engine.close()
+
     def test_poll_updates_time(self):
         current_time = self.engine.latest_poll_time
         time.sleep(0.02)
@@ -273,10 +284,72 @@ class TestEnginePoll(unittest.TestCase):
         self.engine._poller.poll = MagicMock(return_value={1:Engine.ALL_EVENTS})
         self.assertRaises(SystemExit, self.engine.poll, 0.02)
 
+class TestEngineInstrumentation(unittest.TestCase):
+    def setUp(self):
+        self.engine = Engine()
+        self.engine.enable_instrumentation(0.05)
+
+    def tearDown(self):
+        self.engine.disable_instrumentation()
+        self.engine.close()
+
+    def test_stats_disabled(self):
+        self.engine.disable_instrumentation()
+        self.assertTrue(self.engine.stats() is None)
+
+    def test_iterations_counted(self):
+        for i in range(3):
+            self.engine.poll(0.01)
+        stats = self.engine.stats()
+        self.assertEqual(stats["iterations"], 3)
+        self.assertEqual(sum(count for bound, count in stats["iteration_histogram"]), 3)
+        self.assertGreater(stats["wait_time"], 0.0)
+
+    def test_timer_time(self):
+        self.engine.callback(time.sleep, 0.02)
+        self.engine.poll(0.01)
+        stats = self.engine.stats()
+        self.assertGreaterEqual(stats["timer_time"], 0.02)
+        self.assertGreaterEqual(stats["max_iteration_time"], 0.02)
+
+    def test_ready_events_counted(self):
+        channel = MagicMock()
+        channel.fileno = "foo"
+        channel._events = Engine.ALL_EVENTS
+        self.engine._channels["foo"] = channel
+        self.engine._channels["bar"] = channel
+        self.engine._poller = MagicMock()
+        self.engine._poller.poll = MagicMock(return_value={"foo": Engine.READ, "bar": Engine.READ})
+        self.engine.poll(0.01)
+        stats = self.engine.stats()
+        self.assertEqual(stats["ready_events"], 2)
+        self.assertEqual(stats["max_ready_events"], 2)
+        self.assertEqual(channel._handle_events.call_count, 2)
+
+    @patch.object(sys.modules["pants.engine"], "log")
+    def test_slow_callback_logged(self, log):
+        self.engine.callback(time.sleep, 0.2)
+        self.engine.poll(0.01)
+        self.assertEqual(self.engine.stats()["slow_callbacks"], 1)
+        message = log.warning.call_args[0][0]
+        self.assertTrue("Slow callback" in message)
+        self.assertTrue("time.sleep" in message)
+        self.assertTrue("Stack while running" in message)
+
+    @patch.object(sys.modules["pants.engine"], "log")
+    def test_fast_callback_not_logged(self, log):
+        self.engine.callback(lambda: None)
+        self.engine.poll(0.01)
+        self.assertEqual(self.engine.stats()["slow_callbacks"], 0)
+        self.assertFalse(log.warning.called)
+
 class TestEngineTimers(unittest.TestCase):
     def setUp(self):
         self.engine = Engine()
 
+    def tearDown(self):
+        self.engine.close()
+
     def test_callback_added(self):
         timer = self.engine.callback(MagicMock())
         self.assertTrue(timer in self.engine._callbacks)
@@ -305,6 +378,25 @@ class TestEngineTimers(unittest.TestCase):
     def test_cycle_with_negative_delay(self):
         self.assertRaises(ValueError, self.engine.cycle, -1, MagicMock())
 
+    def test_timeout_added(self):
+        timer = self.engine.timeout(10, MagicMock())
+        self.assertTrue(timer.coarse)
+        self.assertEqual(len(self.engine._timeouts), 1)
+        self.assertFalse(timer in self.engine._deferreds)
+
+    def test_timeout_with_zero_delay(self):
+        self.assertRaises(ValueError, self.engine.timeout, 0, MagicMock())
+
+    def test_timeout_with_negative_delay(self):
+        self.assertRaises(ValueError, self.engine.timeout, -1, MagicMock())
+
+    def test_remove_timeout(self):
+        timer = self.engine.timeout(10, MagicMock())
+        self.engine._remove_timer(timer)
+        self.assertTrue(timer.function is None)
+        self.assertEqual(len(self.engine._timeouts), 0)
+        self.assertEqual(self.engine._cancelled_deferreds, 0)
+
     def test_remove_timer_with_no_end(self):
         timer = self.engine.callback(MagicMock())
         self.engine._remove_timer(timer)
@@ -323,6 +415,124 @@ class TestEngineTimers(unittest.TestCase):
         timer.end = 1
         self.engine._remove_timer(timer)
 
+    def test_removed_deferred_is_skipped(self):
+        function = MagicMock()
+        timer = self.engine.defer(10, function)
+        self.engine._remove_timer(timer)
+        timer.end = self.engine.latest_poll_time - 1
+        self.engine.poll(0.01)
+        self.assertFalse(function.called)
+        self.assertFalse(timer in self.engine._deferreds)
+
+    def test_cancelling_fired_deferred_leaves_no_tombstone(self):
+        timer = self.engine.defer(0.01, MagicMock())
+        timer.end = self.engine.latest_poll_time - 1
+        self.engine.poll(0.01)
+        self.assertFalse(timer in self.engine._deferreds)
+
+        timer.cancel()
+        self.assertEqual(self.engine._cancelled_deferreds, 0)
+
+    def test_cycle_cancelled_from_its_function_leaves_no_tombstone(self):
+        timers = []
+        timers.append(self.engine.cycle(0.01, lambda: timers[0].cancel()))
+        timers[0].end = self.engine.latest_poll_time - 1
+        self.engine.poll(0.01)
+
+        self.assertFalse(timers[0] in self.engine._deferreds)
+        self.assertEqual(self.engine._cancelled_deferreds, 0)
+
+    def test_removing_many_deferreds_compacts_heap(self):
+        timers = [self.engine.defer(10, MagicMock()) for _ in range(2000)]
+        for timer in timers[:1500]:
+            timer.cancel()
+        self.assertTrue(len(self.engine._deferreds) < 1500)
+        self.assertTrue(self.engine._cancelled_deferreds < 1000)
+        for timer in timers[1500:]:
+            self.assertTrue(timer in self.engine._deferreds)
+
+    def test_deferreds_run_in_order(self):
+        order = []
+        for delay in (5, 3, 9, 1, 7):
+            timer = self.engine.defer(delay, order.append, delay)
+        for timer in self.engine._deferreds:
+            timer.end = self.engine.latest_poll_time - 10 + timer.delay
+        self.engine.poll(0.01)
+        self.assertEqual(order, [1, 3, 5, 7, 9])
+
+class TestTimingWheel(unittest.TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        self.wheel = _TimingWheel(0.1, self.now)
+
+    def add(self, delay):
+        timer = _Timer(None, MagicMock(), False, delay, self.now + delay)
+        self.wheel.add(timer)
+        return timer
+
+    def test_timer_expires_after_its_end(self):
+        timer = self.add(1)
+        self.assertEqual(self.wheel.expire(self.now + 0.9), [])
+        self.assertEqual(self.wheel.expire(self.now + 1.1), [timer])
+        self.assertEqual(len(self.wheel), 0)
+
+    def test_timers_on_higher_levels_are_cascaded(self):
+        timers = [self.add(delay) for delay in (30, 3000, 300000)]
+        expired = []
+        now = self.now
+        while len(self.wheel):
+            now += 7
+            for timer in self.wheel.expire(now):
+                self.assertTrue(timer.end <= now < timer.end + 7.1)
+                expired.append(timer)
+        self.assertEqual(expired, timers)
+
+    def test_timer_beyond_range_is_parked(self):
+        timer = self.add(2 ** 32)
+        self.assertEqual(self.wheel.expire(self.now + 2 ** 31), [])
+        self.assertEqual(self.wheel.expire(self.now + 2 ** 32 + 1), [timer])
+
+    def test_cancelled_timer_is_dropped(self):
+        timer = self.add(1)
+        self.wheel.remove(timer)
+        self.assertEqual(len(self.wheel), 0)
+        self.assertEqual(self.wheel.expire(self.now + 2), [])
+        self.assertEqual(len(self.wheel), 0)
+
+    def test_cancelled_timer_on_higher_level_is_dropped(self):
+        timer = self.add(30)
+        function = timer.function
+        timer.function = None
+        self.wheel.remove(timer)
+        self.assertEqual(self.wheel.expire(self.now + 26), [])
+        self.assertTrue(len(self.wheel) >= 0)
+        self.assertEqual(self.wheel.expire(self.now + 31), [])
+        self.assertEqual(len(self.wheel), 0)
+        self.assertFalse(function.called)
+
+    def test_rearming_keeps_wheel_compact(self):
+        timer = self.add(30)
+        for _ in xrange(10000):
+            self.wheel.remove(timer)
+            timer = self.add(30)
+        entries = sum(len(slot) for level in self.wheel._levels
+                      for slot in level)
+        self.assertTrue(entries <= 2 * (_COMPACTION_THRESHOLD + 1))
+        self.assertEqual(len(self.wheel), 1)
+        self.assertEqual(self.wheel.expire(self.now + 31), [timer])
+        self.assertEqual(len(self.wheel), 0)
+
+    def test_removing_expired_timer_is_ignored(self):
+        timer = self.add(1)
+        self.add(5)
+        self.assertEqual(self.wheel.expire(self.now + 2), [timer])
+        self.wheel.remove(timer)
+        self.assertEqual(len(self.wheel), 1)
+
+    def test_next_deadline(self):
+        self.add(1)
+        self.assertAlmostEqual(self.wheel.next_deadline(), self.now + 1)
+
 class TestEngineAddChannel(unittest.TestCase):
     def setUp(self):
         self.engine = Engine()
@@ -333,6 +543,9 @@ class TestEngineAddChannel(unittest.TestCase):
         self.channel.fileno = "foo"
         self.channel._events = "bar"
 
+    def tearDown(self):
+        self.engine.close()
+
     def test_channel_is_added_to_engine(self):
         self.engine.add_channel(self.channel)
         self.assertTrue(self.channel.fileno in self.engine._channels)
@@ -343,14 +556,204 @@ class TestEngineAddChannel(unittest.TestCase):
         self.poller.add.assert_called_once_with(self.channel.fileno, self.channel._events)
 
 class TestEngineModifyChannel(unittest.TestCase):
+    def setUp(self):
+        self.engine = Engine()
+        self.engine._poller = MagicMock()
+        self.engine._poller.poll = MagicMock(return_value={})
+        self.channel = MagicMock()
+        self.channel.fileno = "foo"
+        self.channel._events = Engine.BASE_EVENTS
+        self.engine.add_channel(self.channel)
+
+    def tearDown(self):
+        self.engine.close()
+
     def test_channel_is_modified_on_poller(self):
-        engine = Engine()
-        channel = MagicMock()
-        channel.fileno = "foo"
-        channel._events = "bar"
-        engine._poller.modify = MagicMock()
-        engine.modify_channel(channel)
-        engine._poller.modify.assert_called_once_with(channel.fileno, channel._events)
+        self.channel._events = Engine.ALL_EVENTS
+        self.engine.modify_channel(self.channel)
+        self.assertFalse(self.engine._poller.modify.called)
+        self.engine.poll(0.01)
+        self.engine._poller.modify.assert_called_once_with(self.channel.fileno, Engine.ALL_EVENTS)
+
+    def test_changes_are_merged(self):
+        self.channel._events = Engine.ALL_EVENTS
+        self.engine.modify_channel(self.channel)
+        self.channel._events = Engine.READ
+        self.engine.modify_channel(self.channel)
+        self.engine.poll(0.01)
+        self.engine._poller.modify.assert_called_once_with(self.channel.fileno, Engine.READ)
+        self.assertEqual(self.engine.interest_changes_saved, 1)
+
+    def test_changes_that_cancel_out_are_dropped(self):
+        self.channel._events = Engine.ALL_EVENTS
+        self.engine.modify_channel(self.channel)
+        self.channel._events = Engine.BASE_EVENTS
+        self.engine.modify_channel(self.channel)
+        self.engine.poll(0.01)
+        self.assertFalse(self.engine._poller.modify.called)
+        self.assertEqual(self.engine.interest_changes_saved, 2)
+
+    def test_removed_channel_is_not_modified(self):
+        self.channel._events = Engine.ALL_EVENTS
+        self.engine.modify_channel(self.channel)
+        self.engine.remove_channel(self.channel)
+        self.engine.poll(0.01)
+        self.assertFalse(self.engine._poller.modify.called)
+
+class TestEngineCorkedChannels(unittest.TestCase):
+    def setUp(self):
+        self.engine = Engine()
+        self.channel = MagicMock()
+        self.channel.fileno = "foo"
+        self.channel._closed = False
+        self.channel._write_blocked = False
+        self.channel._send_buffer = ["data"]
+
+    def tearDown(self):
+        self.engine.close()
+
+    def test_corked_channel_flushed_before_waiting(self):
+        self.engine._cork_channel(self.channel)
+        self.engine._cork_channel(self.channel)
+        self.engine.poll(0.01)
+        self.channel._process_send_buffer.assert_called_once_with()
+        self.assertFalse(self.engine._corked_channels)
+
+    def test_corked_channel_flushed_after_events(self):
+        self.engine._channels["foo"] = self.channel
+        self.engine._poller.poll = MagicMock(return_value={"foo": Engine.READ})
+        self.channel._handle_events.side_effect = \
+                lambda events: self.engine._cork_channel(self.channel)
+        self.engine.poll(0.01)
+        self.channel._process_send_buffer.assert_called_once_with()
+
+    def test_write_blocked_channel_not_flushed(self):
+        self.channel._write_blocked = True
+        self.engine._cork_channel(self.channel)
+        self.engine.poll(0.01)
+        self.assertFalse(self.channel._process_send_buffer.called)
+
+    def test_remove_channel_discards_corked_channel(self):
+        self.engine._poller.remove = MagicMock()
+        self.engine._cork_channel(self.channel)
+        self.engine.remove_channel(self.channel)
+        self.assertFalse(self.engine._corked_channels)
+
+@unittest.skipUnless(hasattr(select, "epoll"), "epoll-specific functionality.")
+class TestEngineEdgeTriggered(unittest.TestCase):
+    def setUp(self):
+        self.engine = Engine(edge_triggered=True)
+        self.engine._poller.modify = MagicMock()
+        self.channel = MagicMock()
+        self.channel.fileno = "foo"
+        self.channel._closed = False
+        self.channel._write_blocked = False
+        self.channel._events = Engine.ALL_EVENTS
+
+    def tearDown(self):
+        self.engine.close()
+
+    def test_modify_channel_skips_poller(self):
+        self.engine.modify_channel(self.channel)
+        self.assertFalse(self.engine._poller.modify.called)
+
+    def test_modify_channel_waiting_to_write(self):
+        self.engine.modify_channel(self.channel)
+        self.assertTrue(self.channel in self.engine._ready_writers)
+        self.engine.poll(0.01)
+        self.channel._handle_events.assert_called_once_with(Engine.WRITE)
+        self.assertFalse(self.engine._ready_writers)
+
+    def test_modify_channel_write_blocked(self):
+        self.channel._write_blocked = True
+        self.engine.modify_channel(self.channel)
+        self.assertFalse(self.engine._ready_writers)
+
+    def test_modify_channel_not_waiting_to_write(self):
+        self.channel._events = Engine.BASE_EVENTS
+        self.engine.modify_channel(self.channel)
+        self.assertFalse(self.engine._ready_writers)
+
+    def test_remove_channel_discards_ready_writer(self):
+        self.engine._poller.remove = MagicMock()
+        self.engine.modify_channel(self.channel)
+        self.engine.remove_channel(self.channel)
+        self.assertFalse(self.engine._ready_writers)
+
+    def test_unwanted_events_are_masked(self):
+        self.channel._events = Engine.BASE_EVENTS
+        self.engine._channels[self.channel.fileno] = self.channel
+        self.engine._poller.poll = MagicMock(return_value={"foo": Engine.READ | Engine.WRITE})
+        self.engine.poll(0.01)
+        self.channel._handle_events.assert_called_once_with(Engine.READ)
+
+class TestEngineRequeueChannel(unittest.TestCase):
+    def setUp(self):
+        self.engine = Engine()
+        self.engine._poller = MagicMock()
+        self.engine._poller.poll = MagicMock(side_effect=lambda timeout: {})
+        self.channel = MagicMock()
+        self.channel.fileno = "foo"
+        self.channel._events = Engine.ALL_EVENTS
+        self.engine._channels["foo"] = self.channel
+
+    def tearDown(self):
+        self.engine.close()
+
+    def test_requeued_channel_is_dispatched(self):
+        self.engine._requeue_channel(self.channel, Engine.READ)
+        self.engine.poll(1.0)
+        self.engine._poller.poll.assert_called_once_with(0)
+        self.channel._handle_events.assert_called_once_with(Engine.READ)
+        self.engine.poll(0.01)
+        self.assertEqual(self.channel._handle_events.call_count, 1)
+
+    def test_requeued_events_are_merged(self):
+        self.engine._poller.poll = MagicMock(return_value={"foo": Engine.WRITE})
+        self.engine._requeue_channel(self.channel, Engine.READ)
+        self.engine.poll(0.01)
+        self.channel._handle_events.assert_called_once_with(Engine.READ | Engine.WRITE)
+
+    def test_removed_channel_is_not_dispatched(self):
+        self.engine._requeue_channel(self.channel, Engine.READ)
+        self.engine.remove_channel(self.channel)
+        self.engine.poll(0.01)
+        self.assertFalse(self.channel._handle_events.called)
+
+    def test_priority_order(self):
+        order = []
+        channels = {}
+        for name, priority in (("low", 0), ("high", 10), ("mid", 5)):
+            channel = MagicMock()
+            channel.fileno = name
+            channel._events = Engine.ALL_EVENTS
+            channel._handle_events.side_effect = lambda events, name=name: order.append(name)
+            if priority:
+                self.engine._channel_priorities[channel] = priority
+            self.engine._channels[name] = channel
+            channels[name] = channel
+        self.engine._poller.poll = MagicMock(return_value=dict.fromkeys(channels, Engine.READ))
+        self.engine.poll(0.01)
+        self.assertEqual(order, ["high", "mid", "low"])
+
+    def test_listening_channel_first(self):
+        order = []
+        for fileno in (10, 3):
+            channel = MagicMock()
+            channel.fileno = fileno
+            channel._events = Engine.ALL_EVENTS
+            channel._handle_events.side_effect = lambda events, fileno=fileno: order.append(fileno)
+            self.engine._channels[fileno] = channel
+        self.engine._add_listening_channel(self.engine._channels[3])
+        self.engine._poller.poll = MagicMock(return_value={3: Engine.READ, 10: Engine.READ})
+        self.engine.poll(0.01)
+        self.assertEqual(order, [3, 10])
+
+        del order[:]
+        self.engine.remove_channel(self.engine._channels[3])
+        self.engine._channels[3] = channel
+        self.engine.poll(0.01)
+        self.assertEqual(order, [10, 3])
 
 class TestEngineRemoveChannel(unittest.TestCase):
     def setUp(self):
@@ -363,6 +766,9 @@ class TestEngineRemoveChannel(unittest.TestCase):
         self.channel._events = "bar"
         self.engine._channels[self.channel.fileno] = self.channel
 
+    def tearDown(self):
+        self.engine.close()
+
     def test_channel_is_removed_from_engine(self):
         self.engine.remove_channel(self.channel)
         self.assertFalse(self.channel.fileno in self.engine._channels)
@@ -390,6 +796,9 @@ class TestEngineInstallPoller(unittest.TestCase):
     def setUp(self):
         self.engine = Engine()
 
+    def tearDown(self):
+        self.engine.close()
+
     def test_custom_poller(self):
         poller = MagicMock()
         self.engine._poller = None
@@ -453,6 +862,22 @@ class TestEpoll(unittest.TestCase):
         self.assertTrue(isinstance(ret, dict))
         self.epoll.poll.assert_called_once_with(timeout)
 
+@unittest.skipUnless(hasattr(select, "epoll"), "epoll-specific functionality.")
+class TestEpollEdgeTriggered(unittest.TestCase):
+    def setUp(self):
+        self.poller = _EPoll(edge_triggered=True)
+        self.epoll = MagicMock()
+        self.poller._epoll = self.epoll
+        self.fileno = "foo"
+
+    def test_epoll_add(self):
+        self.poller.add(self.fileno, Engine.BASE_EVENTS)
+        self.epoll.register.assert_called_once_with(self.fileno, Engine.ALL_EVENTS | EPOLLET)
+
+    def test_epoll_modify(self):
+        self.poller.modify(self.fileno, Engine.BASE_EVENTS)
+        self.assertFalse(self.epoll.modify.called)
+
 @unittest.skip("Not yet implemented.")
 @unittest.skipUnless(hasattr(select, "kqueue"), "kqueue-specific functionality.")
 class TestKQueue(unittest.TestCase):
@@ -0,0 +1,232 @@
+###############################################################################
+#
+# Copyright 2012 Pants Developers (see AUTHORS.txt)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+###############################################################################
+
+import os
+import socket
+import threading
+import time
+import unittest
+
+from mock import MagicMock
+
+from pants.engine import Engine
+from pants.http import HTTPServer
+from pants.util.executor import (ThreadPoolExecutor, ProcessPoolExecutor,
+                                 ExecutorFull, ExecutorShutdown, RemoteError)
+from pants.web import Application, async
+
+from pants.test._pants_util import *
+
+def _getpid():
+    return os.getpid()
+
+def _fail():
+    raise ValueError("failed")
+
+class _TwoArgumentError(Exception):
+    def __init__(self, a, b):
+        Exception.__init__(self, "%s %s" % (a, b))
+
+def _fail_unpicklable():
+    raise _TwoArgumentError(1, 2)
+
+class TestThreadPoolExecutor(unittest.TestCase):
+    def setUp(self):
+        self.engine = Engine()
+        self.executor = ThreadPoolExecutor(2)
+
+    def tearDown(self):
+        self.executor.shutdown()
+        self.engine.close()
+
+    def poll_until(self, condition):
+        end = time.time() + 5.0
+        while not condition() and time.time() < end:
+            self.engine.poll(0.5)
+
+    def test_result_delivered_on_engine_thread(self):
+        callback = MagicMock()
+        threads = []
+        def function(x, y=None):
+            threads.append(threading.current_thread())
+            return x + y
+        callback.side_effect = lambda *a: threads.append(threading.current_thread())
+        self.engine.run_in_executor(self.executor, function, 1, y=2,
+                                    callback=callback)
+        self.poll_until(lambda: callback.called)
+        callback.assert_called_once_with(3, None)
+        self.assertNotEqual(threads[0], threading.current_thread())
+        self.assertEqual(threads[1], threading.current_thread())
+
+    def test_exception_delivered(self):
+        callback = MagicMock()
+        self.engine.run_in_executor(self.executor, _fail, callback=callback)
+        self.poll_until(lambda: callback.called)
+        result, error = callback.call_args[0]
+        self.assertIsNone(result)
+        self.assertIsInstance(error, ValueError)
+        self.assertEqual(self.executor.stats()["failed"], 1)
+
+    def test_default_thread_pool(self):
+        callback = MagicMock()
+        self.engine.run_in_executor(None, lambda: 42, callback=callback)
+        self.poll_until(lambda: callback.called)
+        callback.assert_called_once_with(42, None)
+        self.assertIs(self.engine.thread_pool, self.engine.thread_pool)
+        self.engine.thread_pool.shutdown()
+
+    def test_queue_full(self):
+        executor = ThreadPoolExecutor(1, max_queue=2)
+        event = threading.Event()
+        for i in range(2):
+            executor.submit(event.wait)
+        self.assertRaises(ExecutorFull, executor.submit, event.wait)
+        event.set()
+        executor.shutdown()
+        stats = executor.stats()
+        self.assertEqual(stats["completed"], 2)
+        self.assertEqual(stats["rejected"], 1)
+        self.assertEqual(stats["pending"], 0)
+        self.assertEqual(stats["max_pending"], 2)
+
+    def test_stats(self):
+        for i in range(4):
+            self.executor.submit(time.sleep, (0.05,))
+        self.executor.shutdown()
+        stats = self.executor.stats()
+        self.assertEqual(stats["completed"], 4)
+        self.assertEqual(stats["running"], 0)
+        self.assertGreaterEqual(stats["run_time"], 0.19)
+        self.assertGreater(stats["wait_time"], 0.0)
+
+    def test_submit_after_shutdown(self):
+        self.executor.shutdown()
+        self.assertRaises(ExecutorShutdown, self.executor.submit, _getpid)
+
+class TestProcessPoolExecutor(unittest.TestCase):
+    def setUp(self):
+        self.engine = Engine()
+        self.executor = ProcessPoolExecutor(1)
+
+    def tearDown(self):
+        self.executor.shutdown()
+        self.engine.close()
+
+    def poll_until(self, condition):
+        end = time.time() + 10.0
+        while not condition() and time.time() < end:
+            self.engine.poll(0.5)
+
+    def test_runs_in_other_process(self):
+        callback = MagicMock()
+        self.engine.run_in_executor(self.executor, _getpid, callback=callback)
+        self.poll_until(lambda: callback.called)
+        pid, error = callback.call_args[0]
+        self.assertIsNone(error)
+        self.assertNotEqual(pid, os.getpid())
+
+    def test_exception_delivered(self):
+        callback = MagicMock()
+        self.engine.run_in_executor(self.executor, _fail, callback=callback)
+        self.poll_until(lambda: callback.called)
+        self.assertIsInstance(callback.call_args[0][1], ValueError)
+
+    def test_unpicklable_exception_delivered_as_remote_error(self):
+        first = MagicMock()
+        second = MagicMock()
+        self.engine.run_in_executor(self.executor, _fail_unpicklable, callback=first)
+        self.engine.run_in_executor(self.executor, _getpid, callback=second)
+        self.poll_until(lambda: second.called)
+        self.assertIsInstance(first.call_args[0][1], RemoteError)
+        self.assertIsNone(second.call_args[0][1])
+        self.assertEqual(self.executor.stats()["pending"], 0)
+
+    def test_unpicklable_call(self):
+        self.assertRaises(Exception, self.executor.submit, lambda: None)
+        self.assertEqual(self.executor.stats()["pending"], 0)
+
+class TestAsyncRunInExecutor(PantsTestCase):
+    def setUp(self):
+        self.app = Application()
+
+        @self.app.route("/")
+        @async
+        def index(request):
+            value = yield async.run_in_executor(None, lambda: "offloaded")
+            yield value
+
+        @self.app.route("/error")
+        @async
+        def error(request):
+            try:
+                yield async.run_in_executor(None, _fail)
+            except ValueError:
+                yield "caught"
+
+        @self.app.route("/many")
+        @async
+        def many(request):
+            values = yield [async.run_in_executor(None, lambda: "a"),
+                            async.run_in_executor(None, lambda: "b")]
+            yield "".join(values)
+
+        @self.app.route("/many_error")
+        @async
+        def many_error(request):
+            try:
+                yield [async.run_in_executor(None, lambda: "a"),
+                       async.run_in_executor(None, _fail)]
+            except ValueError:
+                yield "caught"
+
+        engine = Engine()
+        self.server = HTTPServer(self.app, engine=engine)
+        self.server.listen(('127.0.0.1', 4062))
+        PantsTestCase.setUp(self, engine)
+
+    def tearDown(self):
+        PantsTestCase.tearDown(self)
+        self.server.close()
+        self._engine.thread_pool.shutdown()
+
+    def get(self, path):
+        sock = socket.socket()
+        sock.settimeout(5.0)
+        sock.connect(('127.0.0.1', 4062))
+        sock.sendall("GET %s HTTP/1.1\r\nHost: localhost\r\n"
+                     "Connection: close\r\n\r\n" % path)
+        data = ""
+        while True:
+            chunk = sock.recv(4096)
+            if not chunk:
+                break
+            data += chunk
+        sock.close()
+        return data.split("\r\n\r\n", 1)[1]
+
+    def test_yield_run_in_executor(self):
+        self.assertEqual(self.get("/"), "offloaded")
+
+    def test_yield_run_in_executor_exception(self):
+        self.assertEqual(self.get("/error"), "caught")
+
+    def test_yield_many_run_in_executor(self):
+        self.assertEqual(self.get("/many"), "ab")
+
+    def test_yield_many_run_in_executor_exception(self):
+        self.assertEqual(self.get("/many_error"), "caught")
@@ -22,12 +22,13 @@
 ###############################################################################
 
 import json
+import socket
 try:
     import requests
 except ImportError:
     requests = None
 
-from pants.http import HTTPServer
+from pants.http import HTTPServer, WebSocket
 from pants.engine import Engine
 
 from pants.test._pants_util import *
@@ -124,3 +125,59 @@ class ResponseBody(HTTPTestCase):
         response = requests.post("http://127.0.0.1:4040/", json.dumps(range(50)), timeout=0.5)
         data = json.loads(response.text)
         self.assertListEqual(data, range(49, -1, -1))
+
+class PipelineTest(HTTPTestCase):
+    def request_handler(self, request):
+        # Finish the request later, as an asynchronous handler would.
+        self._engine.defer(0.05, request.send_response, request.path)
+
+    def test_pipelined_requests_answered_in_order(self):
+        sock = socket.create_connection(('127.0.0.1', 4040))
+        sock.settimeout(2.0)
+        sock.sendall("GET /first HTTP/1.1\r\nHost: localhost\r\n\r\n"
+                     "GET /second HTTP/1.1\r\nHost: localhost\r\n"
+                     "Connection: close\r\n\r\n")
+
+        data = ""
+        while True:
+            chunk = sock.recv(4096)
+            if not chunk:
+                break
+            data += chunk
+        sock.close()
+
+        self.assertEqual(data.count("HTTP/1.1 200"), 2)
+        self.assertLess(data.index("/first"), data.index("/second"))
+
+class EchoWebSocket(WebSocket):
+    def on_read(self, data):
+        self.write(data)
+
+class WebSocketTest(HTTPTestCase):
+    def request_handler(self, request):
+        EchoWebSocket(request)
+
+    def test_frame_after_handshake_is_read(self):
+        sock = socket.create_connection(('127.0.0.1', 4040))
+        sock.settimeout(2.0)
+        sock.sendall("GET / HTTP/1.1\r\nHost: localhost\r\n"
+                     "Upgrade: websocket\r\nConnection: Upgrade\r\n"
+                     "Sec-WebSocket-Key: dGhlIHNhbXBsZSBub25jZQ==\r\n"
+                     "Sec-WebSocket-Version: 13\r\n\r\n")
+
+        data = ""
+        while "\r\n\r\n" not in data:
+            data += sock.recv(4096)
+        self.assertTrue(data.startswith("HTTP/1.1 101"))
+        data = data.partition("\r\n\r\n")[2]
+
+        mask = "\x01\x02\x03\x04"
+        payload = "".join(chr(ord(c) ^ ord(mask[i % 4]))
+                          for i, c in enumerate("hello"))
+        sock.sendall("\x81\x85" + mask + payload)
+
+        while len(data) < 7:
+            data += sock.recv(4096)
+        sock.close()
+
+        self.assertEqual(data, "\x81\x05hello")
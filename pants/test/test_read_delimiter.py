@@ -21,7 +21,11 @@ import socket
 import struct
 import unittest
 
+from mock import MagicMock
+
 import pants
+from pants.datagram import Datagram
+from pants.stream import LengthPrefixed
 
 from pants.test._pants_util import *
 
@@ -126,3 +130,67 @@ class TestReadDelimiterChunk(PantsTestCase):
     def tearDown(self):
         PantsTestCase.tearDown(self)
         self.server.close()
+
+class LengthPrefixedOriented(pants.Stream):
+    def on_connect(self):
+        self.read_delimiter = LengthPrefixed("!BH", length_field=1)
+
+    def on_read(self, kind, payload):
+        self.write(payload * kind)
+
+class TestReadDelimiterLengthPrefixed(PantsTestCase):
+    def setUp(self):
+        self.server = pants.Server(LengthPrefixedOriented).listen(('127.0.0.1', 4040))
+        PantsTestCase.setUp(self)
+
+    def tearDown(self):
+        PantsTestCase.tearDown(self)
+        self.server.close()
+
+    def test_read_delimiter_length_prefixed(self):
+        sock = socket.socket()
+        sock.settimeout(1.0)
+        sock.connect(('127.0.0.1', 4040))
+        sock.send(struct.pack("!BH", 2, 3) + "abc" + struct.pack("!BH", 1, 0))
+        sock.send(struct.pack("!BH", 3, 2) + "de")
+        response = ""
+        while len(response) < 12:
+            response += sock.recv(1024)
+        self.assertEquals(response, "abcabcdedede")
+        sock.close()
+
+class TestReadDelimiterLengthPrefixedDatagram(unittest.TestCase):
+    def test_read_delimiter_length_prefixed_datagram(self):
+        channel = Datagram(engine=MagicMock())
+        channel.read_delimiter = LengthPrefixed("!H")
+        channel.on_read = MagicMock()
+        channel.on_overflow_error = MagicMock()
+        addr = ('127.0.0.1', 4041)
+
+        channel._recv_buffer[addr] = struct.pack("!H", 3) + "abc" + struct.pack("!H", 2) + "d"
+        channel._process_recv_buffer()
+        channel.on_read.assert_called_once_with("abc")
+        self.assertEqual(channel._recv_buffer[addr], struct.pack("!H", 2) + "d")
+
+        channel._recv_buffer[addr] = struct.pack("!H", 65535) + "x"
+        channel._process_recv_buffer()
+        self.assertEqual(channel.on_overflow_error.call_count, 1)
+        self.assertFalse(addr in channel._recv_buffer)
+        channel.close()
+
+    def test_read_delimiter_datagram_buffer_limit(self):
+        channel = Datagram(engine=MagicMock())
+        self.assertEqual(channel._recv_buffer_size_limit, 2 ** 16)
+
+        channel.read_delimiter = LengthPrefixed("!I", max_length=2 ** 20)
+        self.assertEqual(channel._recv_buffer_size_limit, 4 + 2 ** 20)
+
+        channel.read_delimiter = 2 ** 17
+        self.assertEqual(channel._recv_buffer_size_limit, 2 ** 17)
+
+        channel.read_delimiter = "\r\n"
+        self.assertEqual(channel._recv_buffer_size_limit, 2 ** 16)
+
+        self.assertRaises(TypeError, setattr, channel, "read_delimiter", object())
+        self.assertEqual(channel.read_delimiter, "\r\n")
+        channel.close()
@@ -0,0 +1,239 @@
+###############################################################################
+#
+# Copyright 2012 Pants Developers (see AUTHORS.txt)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+###############################################################################
+
+import errno
+import socket
+import time
+import unittest
+
+from mock import MagicMock
+
+from pants.engine import Engine
+from pants.stream import Stream, pipe
+from pants.util.simulation import VirtualClock, VirtualEngine, socketpair
+
+class Echo(Stream):
+    def on_read(self, data):
+        self.write(data)
+
+class Chatty(Stream):
+    def on_read(self, data):
+        for piece in data:
+            self.write(piece, flush=True)
+
+class Collector(Stream):
+    def __init__(self, **kwargs):
+        Stream.__init__(self, **kwargs)
+        self.received = []
+
+    def on_read(self, data):
+        self.received.append(data)
+
+class TestVirtualClock(unittest.TestCase):
+    def test_advance(self):
+        clock = VirtualClock(10)
+        self.assertEqual(clock(), 10.0)
+        clock.advance(5)
+        self.assertEqual(clock(), 15.0)
+        clock.advance(-1)
+        self.assertEqual(clock(), 15.0)
+
+class TestVirtualSocket(unittest.TestCase):
+    def test_send_recv(self):
+        a, b = socketpair()
+        self.assertEqual(a.send("hello"), 5)
+        self.assertEqual(b.recv(3), "hel")
+        self.assertEqual(b.recv(10), "lo")
+        self.assertRaises(socket.error, b.recv, 10)
+
+    def test_send_full(self):
+        a, b = socketpair()
+        a.buffer_size = 4
+        self.assertEqual(a.send("hello"), 4)
+        try:
+            a.send("o")
+        except socket.error as err:
+            self.assertEqual(err.args[0], errno.EAGAIN)
+        else:
+            self.fail("send() did not raise EAGAIN.")
+
+    def test_close(self):
+        a, b = socketpair()
+        a.close()
+        self.assertEqual(b.recv(10), "")
+        self.assertTrue(b._poll() & Engine.HANGUP)
+
+class TestVirtualEngineTimers(unittest.TestCase):
+    def setUp(self):
+        self.engine = VirtualEngine()
+
+    def tearDown(self):
+        self.engine.close()
+
+    def test_defer_runs_at_deadline(self):
+        times = []
+        self.engine.defer(3600, lambda: times.append(self.engine.latest_poll_time))
+        start = time.time()
+        self.engine.run(7200)
+        self.assertLess(time.time() - start, 1.0)
+        self.assertEqual(len(times), 1)
+        self.assertAlmostEqual(times[0], 3600, places=6)
+
+    def test_cycle(self):
+        timer = MagicMock()
+        self.engine.cycle(60, timer)
+        self.engine.run(3600)
+        self.assertEqual(timer.call_count, 60)
+
+    def test_timeout(self):
+        timer = MagicMock()
+        self.engine.timeout(30, timer)
+        self.engine.run(29)
+        self.assertFalse(timer.called)
+        self.engine.run(1)
+        timer.assert_called_once_with()
+
+    def test_many_timers(self):
+        timer = MagicMock()
+        for i in xrange(1, 10001):
+            self.engine.defer(i * 0.5, timer)
+        self.engine.run(5000)
+        self.assertEqual(timer.call_count, 10000)
+
+    def test_repeatable(self):
+        def trace():
+            engine = VirtualEngine()
+            times = []
+            for delay in (0.3, 1.7, 0.05, 12.0):
+                engine.defer(delay, lambda: times.append(engine.latest_poll_time))
+            engine.cycle(0.7, lambda: times.append(engine.latest_poll_time))
+            engine.run(20)
+            return times
+        self.assertEqual(trace(), trace())
+
+    def test_instrumentation_uses_system_clock(self):
+        self.engine.enable_instrumentation(None)
+        self.engine.defer(5, MagicMock())
+        self.engine.run(10)
+        stats = self.engine.stats()
+        self.engine.disable_instrumentation()
+
+        self.assertLess(stats["timer_time"], 1.0)
+        self.assertLess(stats["max_iteration_time"], 1.0)
+        self.assertGreater(stats["iterations"], 0)
+        self.assertEqual(stats["iteration_histogram"][-1][1], 0)
+
+    def test_negative_slack(self):
+        self.assertRaises(ValueError, self.engine.defer, 1, MagicMock(), slack=-1)
+        self.assertRaises(ValueError, self.engine.cycle, 1, MagicMock(), slack=-1)
+
+    def test_slack_within_window(self):
+        times = []
+        def record(delay):
+            times.append((delay, self.engine.latest_poll_time))
+        for delay in (0.3, 1.7, 2.05, 12.0):
+            self.engine.defer(delay, record, delay, slack=0.05)
+        self.engine.run(20)
+        self.assertEqual(len(times), 4)
+        for delay, when in times:
+            self.assertGreaterEqual(when, delay)
+            self.assertLessEqual(when, delay + 0.05 + 0.01)
+
+    def test_slack_batches_wakeups(self):
+        def wakeups(slack):
+            engine = VirtualEngine()
+            timer = MagicMock()
+            for i in xrange(100):
+                engine.cycle(1 + i * 0.0003, timer, slack=slack)
+            polls = engine._poller.polls
+            engine.run(10)
+            self.assertGreaterEqual(timer.call_count, 900)
+            return engine._poller.polls - polls
+        self.assertLess(wakeups(0.05) * 4, wakeups(0))
+
+class TestVirtualEngineStreams(unittest.TestCase):
+    def setUp(self):
+        self.engine = VirtualEngine()
+
+    def tearDown(self):
+        self.engine.close()
+
+    def test_stream_pair(self):
+        client, server = self.engine.stream_pair(Collector, Echo)
+        self.assertTrue(client.connected)
+        self.assertTrue(server.connected)
+        client.write("hello")
+        self.engine.run(0.1)
+        self.assertEqual("".join(client.received), "hello")
+
+    def test_large_write(self):
+        client, server = self.engine.stream_pair(Collector, Echo)
+        data = "x" * (4 * 2 ** 20)
+        client.write(data)
+        self.engine.run(1.0)
+        self.assertEqual(len("".join(client.received)), len(data))
+
+    def test_close(self):
+        client, server = self.engine.stream_pair(Collector, Echo)
+        server.on_close = MagicMock()
+        client.close()
+        self.engine.run(0.1)
+        server.on_close.assert_called_once_with()
+
+    def test_pipe_applies_backpressure(self):
+        client, proxy_in = self.engine.stream_pair(Stream, Stream)
+        proxy_out, sink = self.engine.stream_pair(Stream, Collector)
+        pipe(proxy_in, proxy_out)
+        sink.pause_reading()
+
+        data = "x" * (4 * 2 ** 20)
+        client.write(data)
+        self.engine.run(1.0)
+        self.assertTrue(proxy_in.reading_paused)
+        self.assertLessEqual(proxy_out._send_buffered,
+                             proxy_out.write_high_water + Stream.read_budget)
+        self.assertGreater(len(client._send_buffer), 0)
+
+        sink.resume_reading()
+        self.engine.run(1.0)
+        self.assertFalse(proxy_in.reading_paused)
+        self.assertEqual(len("".join(sink.received)), len(data))
+
+    def test_pipe_with_read_views(self):
+        client, proxy_in = self.engine.stream_pair(Stream, Stream)
+        proxy_out, sink = self.engine.stream_pair(Stream, Collector)
+        proxy_in.read_views = True
+        pipe(proxy_in, proxy_out)
+
+        client.write("abcdefgh")
+        self.engine.run(0.1)
+        self.assertEqual("".join(sink.received), "abcdefgh")
+
+    def test_auto_cork_sends_once_per_iteration(self):
+        def sends(auto_cork):
+            client, server = self.engine.stream_pair(Collector, Chatty)
+            server.auto_cork = auto_cork
+            sock = server._socket
+            send = sock.send
+            sock.send = MagicMock(side_effect=send)
+            client.write("abcdefgh")
+            self.engine.run(0.1)
+            self.assertEqual("".join(client.received), "abcdefgh")
+            return sock.send.call_count
+        self.assertEqual(sends(False), 8)
+        self.assertEqual(sends(True), 1)
@@ -1,10 +1,14 @@
 
+import re
 import socket
+import struct
 import unittest
 
 from mock import call, MagicMock
 
-from pants.stream import Stream
+from pants.engine import Engine
+from pants.server import Server
+from pants.stream import LengthPrefixed, Stream, _TLS_RECORD_SIZE, _TLS_WRITE_AMOUNT
 
 class TestStream(unittest.TestCase):
     def test_stream_constructor_with_invalid_socket(self):
@@ -25,7 +29,7 @@ class TestStream(unittest.TestCase):
     def test_stream_handle_read_event_processes_recv_buffer_before_closing(self):
         # to ensure we don't reintroduce issue #41
         stream = Stream()
-        stream._socket_recv = MagicMock(return_value=None)
+        stream._socket_recv_into = MagicMock(return_value=None)
 
         manager = MagicMock()
         stream._process_recv_buffer = manager._process_recv_buffer
@@ -35,3 +39,525 @@ class TestStream(unittest.TestCase):
 
         expected_calls = [call._process_recv_buffer(), call.close(flush=False)]
         self.assertTrue(manager.mock_calls == expected_calls)
+
+    def test_stream_handle_read_event_stops_at_read_budget(self):
+        engine = MagicMock()
+        stream = Stream(engine=engine)
+        stream.read_budget = 8
+        stream._socket_recv_into = MagicMock(side_effect=["abcd", "efgh", "ijkl", ""])
+        stream.on_read = MagicMock()
+
+        stream._handle_read_event()
+
+        self.assertEqual(stream._socket_recv_into.call_count, 2)
+        stream.on_read.assert_called_once_with("abcdefgh")
+        engine._requeue_channel.assert_called_once_with(stream, Engine.READ)
+
+    def test_stream_handle_read_event_without_read_budget(self):
+        engine = MagicMock()
+        stream = Stream(engine=engine)
+        stream.read_budget = None
+        stream._socket_recv_into = MagicMock(side_effect=["abcd", "efgh", "ijkl", ""])
+        stream.on_read = MagicMock()
+
+        stream._handle_read_event()
+
+        stream.on_read.assert_called_once_with("abcdefghijkl")
+        self.assertFalse(engine._requeue_channel.called)
+
+    def test_stream_recv_amount_adapts_to_bursts(self):
+        stream = Stream(engine=MagicMock())
+        start = stream._recv_amount
+        stream._adapt_recv_amount(start * 3)
+        self.assertEqual(stream._recv_amount, start * 2)
+        stream._adapt_recv_amount(start * 2)
+        self.assertEqual(stream._recv_amount, start * 2)
+        stream._adapt_recv_amount(10)
+        self.assertEqual(stream._recv_amount, start)
+        stream._adapt_recv_amount(10)
+        self.assertEqual(stream._recv_amount, start)
+
+    def test_stream_read_views(self):
+        stream = Stream(engine=MagicMock())
+        stream.connected = True
+        stream.read_views = True
+        stream.read_delimiter = 4
+        stream.on_read = MagicMock()
+        stream._recv_buffer.append("abcdefgh")
+
+        stream._process_recv_buffer()
+
+        views = [args[0] for args, kwargs in stream.on_read.call_args_list]
+        self.assertEqual([view.tobytes() for view in views], ["abcd", "efgh"])
+        self.assertTrue(all(isinstance(view, memoryview) for view in views))
+
+    def test_stream_on_read_batch(self):
+        stream = Stream(engine=MagicMock())
+        stream.connected = True
+        stream.read_delimiter = "\n"
+        stream.on_read = MagicMock()
+        stream.on_read_batch = MagicMock()
+        stream._recv_buffer.append("a\nb\nc\nd")
+
+        stream._process_recv_buffer()
+
+        stream.on_read_batch.assert_called_once_with(["a", "b", "c"])
+        self.assertFalse(stream.on_read.called)
+
+    def test_stream_on_read_batch_struct(self):
+        record = struct.Struct("!HI")
+        records = [(i, i * 2) for i in xrange(100)]
+        stream = Stream(engine=MagicMock())
+        stream.connected = True
+        stream.read_delimiter = record
+        stream.on_read_batch = MagicMock()
+        stream._recv_buffer.append("".join(record.pack(*r) for r in records) + "x")
+
+        stream._process_recv_buffer()
+
+        stream.on_read_batch.assert_called_once_with(records)
+        self.assertEqual(len(stream._recv_buffer), 1)
+
+    def test_stream_on_read_batch_delimiter_change(self):
+        stream = Stream(engine=MagicMock())
+        stream.connected = True
+        stream.read_delimiter = "\n"
+        batches = []
+        def on_read_batch(messages):
+            batches.append(messages)
+            stream.read_delimiter = 2
+        stream.on_read_batch = on_read_batch
+        stream._recv_buffer.append("head\nabcd")
+
+        stream._process_recv_buffer()
+
+        self.assertEqual(batches, [["head"], ["ab", "cd"]])
+
+    def test_stream_length_prefixed_delimiter(self):
+        stream = Stream(engine=MagicMock())
+        stream.connected = True
+        stream.read_delimiter = LengthPrefixed(struct.Struct("!I"))
+        data = struct.pack("!I", 5) + "hello" + struct.pack("!I", 0) + \
+               struct.pack("!I", 3) + "abc"
+
+        messages = self._dribble(stream, data, 3)
+
+        self.assertEqual(messages, ["hello", "", "abc"])
+        self.assertEqual(len(stream._recv_buffer), 0)
+
+    def test_stream_length_prefixed_header_fields(self):
+        stream = Stream(engine=MagicMock())
+        stream.connected = True
+        stream.read_delimiter = LengthPrefixed("!HBI", length_field=-1)
+        stream.on_read = MagicMock()
+        stream._recv_buffer.append(struct.pack("!HBI", 7, 1, 2) + "hi")
+
+        stream._process_recv_buffer()
+
+        stream.on_read.assert_called_once_with(7, 1, "hi")
+
+    def test_stream_length_prefixed_max_length(self):
+        stream = Stream(engine=MagicMock())
+        stream.connected = True
+        stream.buffer_size = 1024
+        stream.read_delimiter = LengthPrefixed("!I")
+        self.assertEqual(stream._recv_buffer_size_limit, 1024)
+
+        stream.on_overflow_error = MagicMock()
+        stream.on_read = MagicMock()
+        stream._recv_buffer.append(struct.pack("!I", 1021))
+        stream._process_recv_buffer()
+        self.assertEqual(stream.on_overflow_error.call_count, 1)
+        self.assertFalse(stream.on_read.called)
+
+        stream.read_delimiter = LengthPrefixed("!I", max_length=4096)
+        self.assertEqual(stream._recv_buffer_size_limit, 4100)
+        stream._recv_buffer.append("x" * 1021)
+        stream._process_recv_buffer()
+        stream.on_read.assert_called_once_with("x" * 1021)
+
+    def test_length_prefixed_invalid_field(self):
+        self.assertRaises(ValueError, LengthPrefixed, "!HH", 2)
+
+    def test_stream_parser_delimiter(self):
+        class LineParser(object):
+            def __init__(self):
+                self.calls = []
+            def feed(self, buffer, offset):
+                self.calls.append((buffer[:], offset))
+                lines = buffer[:].split("\n")
+                rest = lines.pop()
+                return len(buffer) - len(rest), lines
+
+        stream = Stream(engine=MagicMock())
+        stream.connected = True
+        parser = stream.read_delimiter = LineParser()
+        self.assertEqual(stream._recv_buffer_size_limit, stream.buffer_size)
+
+        self.assertEqual(self._dribble(stream, "ab\ncd\nef", 5), ["ab", "cd"])
+        self.assertEqual(self._dribble(stream, "\n"), ["ef"])
+        self.assertEqual(len(stream._recv_buffer), 0)
+        self.assertEqual(parser.calls, [("ab\ncd", 0), ("cd\nef", 2),
+                                        ("ef\n", 2)])
+
+    def test_stream_parser_delimiter_batch(self):
+        class PairParser(object):
+            def feed(self, buffer, offset):
+                count = len(buffer) // 2
+                return count * 2, [buffer[i * 2:i * 2 + 2] for i in xrange(count)]
+
+        stream = Stream(engine=MagicMock())
+        stream.connected = True
+        stream.read_delimiter = PairParser()
+        stream.on_read_batch = MagicMock()
+        stream._recv_buffer.append("abcdefg")
+
+        stream._process_recv_buffer()
+
+        stream.on_read_batch.assert_called_once_with(["ab", "cd", "ef"])
+        self.assertEqual(len(stream._recv_buffer), 1)
+
+    def test_stream_parser_delimiter_error_closes(self):
+        class BrokenParser(object):
+            def feed(self, buffer, offset):
+                raise ValueError("Malformed data.")
+
+        stream = Stream(engine=MagicMock())
+        stream.connected = True
+        stream.read_delimiter = BrokenParser()
+        stream.close = MagicMock()
+        stream.on_read = MagicMock()
+        stream._recv_buffer.append("data")
+
+        stream._process_recv_buffer()
+
+        stream.close.assert_called_once_with()
+        self.assertFalse(stream.on_read.called)
+
+    def _dribble(self, stream, data, piece=1):
+        stream.on_read = MagicMock()
+        for i in xrange(0, len(data), piece):
+            stream._recv_buffer.append(data[i:i + piece])
+            stream._process_recv_buffer()
+        return [args[0] for args, kwargs in stream.on_read.call_args_list]
+
+    def test_stream_string_delimiter_scan_resumes(self):
+        stream = Stream(engine=MagicMock())
+        stream.connected = True
+        stream.read_delimiter = "\r\n\r\n"
+
+        self.assertEqual(self._dribble(stream, "a\r\nb\r\n\r\nc\r\n\r"), ["a\r\nb"])
+        self.assertEqual(stream._recv_scan_offset, 1)
+        self.assertEqual(self._dribble(stream, "\n"), ["c"])
+        self.assertEqual(stream._recv_scan_offset, 0)
+
+    def test_stream_regex_delimiter_scan_resumes(self):
+        stream = Stream(engine=MagicMock())
+        stream.connected = True
+        stream.read_delimiter = re.compile(r"\r?\n\r?\n")
+
+        self.assertEqual(self._dribble(stream, "abc\r\n\r\ndef\n\nxyz\r\n"),
+                         ["abc", "def"])
+        self.assertEqual(stream._recv_scan_offset, 2)
+
+    def test_stream_regex_delimiter_with_lookahead_rescans(self):
+        stream = Stream(engine=MagicMock())
+        stream.connected = True
+        stream.read_delimiter = re.compile(r"x(?=yyyy)")
+
+        self.assertEqual(self._dribble(stream, "axyyyyb"), ["a"])
+        self.assertEqual(stream._recv_scan_offset, 0)
+
+    def test_stream_regex_delimiter_with_word_boundary_rescans(self):
+        stream = Stream(engine=MagicMock())
+        stream.connected = True
+        stream.read_delimiter = re.compile(r"a\B")
+
+        self.assertEqual(self._dribble(stream, "xa", 2), [])
+        self.assertEqual(stream._recv_scan_offset, 0)
+        self.assertEqual(self._dribble(stream, "a"), ["x"])
+
+    def test_stream_scan_offset_reset_by_read_delimiter(self):
+        stream = Stream(engine=MagicMock())
+        stream.connected = True
+        stream.read_delimiter = "\r\n"
+        self._dribble(stream, "abcdef")
+        self.assertEqual(stream._recv_scan_offset, 5)
+        stream.read_delimiter = "c"
+        self.assertEqual(stream._recv_scan_offset, 0)
+        stream._process_recv_buffer()
+        stream.on_read.assert_called_once_with("ab")
+
+    def test_stream_write_watermarks(self):
+        stream = Stream(engine=MagicMock())
+        stream.connected = True
+        stream.write_high_water = 4096
+        stream.write_low_water = 1024
+        stream.on_pause_writing = MagicMock()
+        stream.on_drain = MagicMock()
+        self._record_sendv(stream, [2048, 0, 2048, 2])
+
+        stream.write("x" * 4096)
+        self.assertTrue(stream.writable)
+        stream.write("x")
+        stream.write("x")
+        stream.on_pause_writing.assert_called_once_with()
+        self.assertFalse(stream.writable)
+
+        stream._process_send_buffer()
+        self.assertFalse(stream.on_drain.called)
+        stream._process_send_buffer()
+        stream.on_drain.assert_called_once_with()
+        self.assertTrue(stream.writable)
+        self.assertEqual(stream._send_buffered, 0)
+
+    def test_stream_pause_reading_holds_data(self):
+        engine = MagicMock()
+        stream = Stream(engine=engine)
+        stream.connected = True
+        stream.read_delimiter = "\n"
+        stream.on_read = MagicMock(side_effect=lambda data: stream.pause_reading())
+        stream._socket_recv_into = MagicMock(side_effect=["one\ntwo\n", ""])
+
+        stream._handle_read_event()
+        stream.on_read.assert_called_once_with("one")
+        self.assertTrue(stream.reading_paused)
+        self.assertFalse(stream._events & Engine.READ)
+
+        stream.on_read = MagicMock()
+        stream.resume_reading()
+        self.assertFalse(stream.reading_paused)
+        self.assertTrue(stream._events & Engine.READ)
+        engine._requeue_channel.assert_called_once_with(stream, Engine.READ)
+
+        stream._socket_recv_into = MagicMock(return_value="")
+        stream._handle_read_event()
+        stream.on_read.assert_called_once_with("two")
+
+    def test_stream_hangup_while_paused_waits_for_resume(self):
+        engine = MagicMock()
+        stream = Stream(engine=engine)
+        stream.connected = True
+        stream.read_delimiter = "\n"
+        stream.on_read = MagicMock(side_effect=lambda data: stream.pause_reading())
+        stream.on_close = MagicMock()
+        stream._socket_recv_into = MagicMock(side_effect=["one\ntwo\n", ""])
+
+        stream._handle_events(Engine.READ)
+        stream._handle_events(Engine.HANGUP)
+        stream.on_read.assert_called_once_with("one")
+        self.assertFalse(stream.on_close.called)
+        self.assertFalse(stream._events & Engine.HANGUP)
+
+        stream.on_read = MagicMock()
+        stream.resume_reading()
+        engine._requeue_channel.assert_called_once_with(stream, Engine.READ | Engine.HANGUP)
+
+        stream._socket_recv_into = MagicMock(return_value=None)
+        stream._handle_events(Engine.READ | Engine.HANGUP)
+        stream.on_read.assert_called_once_with("two")
+        stream.on_close.assert_called_once_with()
+
+    def test_stream_paused_channel_ignores_read_events(self):
+        stream = Stream(engine=MagicMock())
+        stream.connected = True
+        stream.pause_reading()
+        stream._handle_read_event = MagicMock()
+
+        stream._handle_events(Engine.READ)
+        self.assertFalse(stream._handle_read_event.called)
+
+    def test_stream_auto_cork_defers_flushes(self):
+        engine = MagicMock()
+        stream = Stream(engine=engine)
+        stream.connected = True
+        stream.auto_cork = True
+        calls = self._record_sendv(stream, [6])
+
+        stream.write("foo", flush=True)
+        stream.write("bar")
+        stream.flush()
+        self.assertEqual(calls, [])
+        self.assertEqual(engine._cork_channel.call_args_list, [call(stream)] * 3)
+
+        stream._process_send_buffer()
+        self.assertEqual(calls, [(["foobar"], 0)])
+
+    def test_stream_write_many(self):
+        record = struct.Struct("!HI")
+        records = [(i, i * 2) for i in xrange(200)]
+        expected = "".join(record.pack(*r) for r in records)
+
+        for format in (record, "!HI"):
+            stream = Stream(engine=MagicMock())
+            stream.connected = True
+            stream.write_many(format, records)
+            self.assertEqual(list(stream._send_buffer),
+                             [(Stream.SEND_STRING, [expected])])
+
+    def test_stream_write_many_uses_read_delimiter(self):
+        stream = Stream(engine=MagicMock())
+        stream.connected = True
+        self.assertRaises(ValueError, stream.write_many, None, [(1,)])
+
+        stream.read_delimiter = struct.Struct("!H")
+        stream.write_many(None, [(1,), (2,)])
+        self.assertEqual(list(stream._send_buffer),
+                         [(Stream.SEND_STRING, ["\x00\x01\x00\x02"])])
+
+    def test_stream_write_many_array(self):
+        array = MagicMock()
+        array.dtype.itemsize = 6
+        array.tostring.return_value = "abcdef" * 2
+        stream = Stream(engine=MagicMock())
+        stream.connected = True
+
+        stream.write_many("!HI", array)
+        self.assertEqual(list(stream._send_buffer),
+                         [(Stream.SEND_STRING, ["abcdef" * 2])])
+
+        array.dtype.itemsize = 4
+        self.assertRaises(ValueError, stream.write_many, "!HI", array)
+
+    def _record_sendv(self, stream, results):
+        calls = []
+        results = iter(results)
+        def sendv(buffers, offset):
+            calls.append((list(buffers), offset))
+            return next(results)
+        stream._socket_sendv = sendv
+        return calls
+
+    def test_stream_small_writes_are_joined(self):
+        stream = Stream(engine=MagicMock())
+        stream.connected = True
+
+        stream.write("foo")
+        stream.write("bar")
+        stream.write("x" * 2048)
+
+        self.assertEqual(list(stream._send_buffer),
+                         [(Stream.SEND_STRING, ["foobar", "x" * 2048])])
+
+    def test_stream_writes_are_sent_together(self):
+        stream = Stream(engine=MagicMock())
+        stream.connected = True
+        stream.on_write = MagicMock()
+        foo, bar = "f" * 2048, "b" * 2048
+        calls = self._record_sendv(stream, [2049, 0])
+
+        stream.write(foo)
+        stream.write(bar)
+        stream.write_file(MagicMock())
+        stream._process_send_buffer()
+
+        self.assertEqual(calls, [([foo, bar], 0), ([bar], 1)])
+        self.assertEqual(stream._send_offset, 1)
+        self.assertEqual(stream._send_buffer[0], (Stream.SEND_STRING, [bar]))
+
+    def test_stream_partial_write_resumes_at_offset(self):
+        stream = Stream(engine=MagicMock())
+        stream.connected = True
+        stream.on_write = MagicMock()
+        foo, bar = "f" * 2048, "b" * 2048
+        calls = self._record_sendv(stream, [2049, 0, 2047])
+
+        stream.write(foo)
+        stream.write(bar)
+        stream._process_send_buffer()
+        stream._process_send_buffer()
+
+        self.assertEqual(calls, [([foo, bar], 0), ([bar], 1), ([bar], 1)])
+        self.assertEqual(len(stream._send_buffer), 0)
+        self.assertEqual(stream._send_offset, 0)
+        stream.on_write.assert_called_once_with()
+
+    def test_stream_write_memoryview(self):
+        sock, peer = socket.socketpair()
+        self.addCleanup(peer.close)
+        stream = Stream(engine=MagicMock(), socket=sock)
+        self.addCleanup(stream.close, flush=False)
+        stream.connected = True
+        data = "y" * 70000
+
+        stream.write("x" * 2000)
+        stream.write(memoryview(data), flush=True)
+
+        self.assertEqual(list(stream._send_buffer), [])
+        received = []
+        while sum(map(len, received)) < 72000:
+            received.append(peer.recv(72000))
+        self.assertEqual("".join(received), "x" * 2000 + data)
+
+    def test_stream_ssl_writes_fill_tls_records(self):
+        stream = Stream(engine=MagicMock())
+        stream.ssl_enabled = True
+        sent = []
+        def send(data):
+            sent.append(data[:])
+            return len(data)
+        stream._socket_send = send
+        large = "".join(chr(i % 256) for i in xrange(_TLS_WRITE_AMOUNT + 10))
+
+        stream._socket_sendv(["ab", large], 0)
+        stream._socket_sendv([large], 5)
+        stream._socket_sendv(["ab", "cd", "ef"], 1)
+
+        self.assertEqual(sent, [("ab" + large)[:_TLS_WRITE_AMOUNT],
+                                large[5:5 + _TLS_WRITE_AMOUNT], "bcdef"])
+
+    def test_stream_ssl_send_leaves_socket_options_alone(self):
+        stream = Stream(engine=MagicMock())
+        stream._socket = MagicMock()
+        stream._socket.send.side_effect = len
+        stream.ssl_enabled = True
+
+        stream._socket_sendv(["x" * (_TLS_RECORD_SIZE + 1)], 0)
+
+        self.assertFalse(stream._socket.setsockopt.called)
+
+class TestServer(unittest.TestCase):
+    def test_server_handle_read_event_stops_at_accept_budget(self):
+        engine = MagicMock()
+        server = Server(engine=engine)
+        server.accept_budget = 2
+        server._socket_accept = MagicMock(return_value=(MagicMock(), ("127.0.0.1", 1)))
+        server.on_accept = MagicMock()
+
+        server._handle_read_event()
+
+        self.assertEqual(server.on_accept.call_count, 2)
+        engine._requeue_channel.assert_called_once_with(server, Engine.READ)
+
+    def test_server_applies_socket_options_before_on_accept(self):
+        server = Server(engine=MagicMock(), socket_options={"nodelay": True})
+        sock = socket.socket()
+        server._socket_accept = MagicMock(side_effect=[(sock, ("127.0.0.1", 1)), (None, None)])
+        nodelay = []
+        server.on_accept = lambda sock, addr: nodelay.append(
+                sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY))
+
+        server._handle_read_event()
+
+        self.assertEqual(len(nodelay), 1)
+        self.assertTrue(nodelay[0])
+        sock.close()
+
+    def test_server_closes_socket_when_socket_options_fail(self):
+        server = Server(engine=MagicMock(), socket_options={"nodelay": True})
+        server.socket_options["nagle"] = False
+        sock = MagicMock()
+        server._socket_accept = MagicMock(side_effect=[(sock, ("127.0.0.1", 1)), (None, None)])
+        server.on_accept = MagicMock()
+
+        server._handle_read_event()
+
+        sock.close.assert_called_once_with()
+        self.assertFalse(server.on_accept.called)
+
+    def test_server_listening_socket_keeps_default_options(self):
+        server = Server(engine=MagicMock(), socket_options={"nodelay": True})
+        sock = socket.socket()
+        server._socket_set(sock)
+        self.assertFalse(sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY))
+        sock.close()
@@ -16,19 +16,24 @@
 #
 ###############################################################################
 
+import os
 import sys
+import threading
 import time
 import unittest
 
 from mock import MagicMock, call
 
-from pants.engine import Engine
+from pants.engine import Engine, _timerfd_create
 
 class TestTimers(unittest.TestCase):
     def setUp(self):
         self.times_called = []
         self.engine = Engine()
 
+    def tearDown(self):
+        self.engine.close()
+
     def timer(self):
         self.times_called.append(self.engine.latest_poll_time)
 
@@ -121,3 +126,112 @@ class TestTimers(unittest.TestCase):
         timer.assert_has_calls([call() for _ in range(2)])
         for i in range(2):
             self.assertLess(abs(expected_times[i] - self.times_called[i]), 0.01)
+
+    def test_cycle_cancel_from_within_cycle(self):
+        self.engine.poll(0.01)
+        timer = MagicMock()
+        def function():
+            timer()
+            cancel_cycle()
+        cancel_cycle = self.engine.cycle(0.01, function)
+        self.engine.poll(0.2)
+        self.engine.poll(0.2)
+        self.engine.poll(0.2)
+        timer.assert_called_once_with()
+
+    def test_timeout(self):
+        self.engine.poll(0.01)
+        timer = MagicMock(side_effect=self.timer)
+        expected_time = self.engine.latest_poll_time + 0.1
+        self.engine.timeout(0.1, timer)
+        self.engine.poll(0.2)
+        self.engine.poll(0.2)
+        self.engine.poll(0.2)
+        timer.assert_called_once_with()
+        self.assertTrue(self.times_called[0] >= expected_time)
+        self.assertLess(self.times_called[0] - expected_time, 0.11)
+
+    def test_timeout_cancel(self):
+        timer = MagicMock()
+        cancel_timeout = self.engine.timeout(0.1, timer)
+        cancel_timeout()
+        self.engine.poll(0.2)
+        self.engine.poll(0.2)
+        self.assertRaises(AssertionError, timer.assert_called_with)
+
+    def test_call_threadsafe(self):
+        timer = MagicMock()
+        self.engine.call_threadsafe(timer, 1, 2, foo="bar")
+        self.engine.poll(0.01)
+        timer.assert_called_once_with(1, 2, foo="bar")
+
+    def test_call_threadsafe_wakes_engine(self):
+        timer = MagicMock()
+        thread = threading.Timer(0.05, self.engine.call_threadsafe, (timer,))
+        thread.start()
+        start = time.time()
+        self.engine.poll(5.0)
+        thread.join()
+        timer.assert_called_once_with()
+        self.assertLess(time.time() - start, 1.0)
+
+    def test_call_threadsafe_many(self):
+        timer = MagicMock()
+        threads = [threading.Thread(target=self.engine.call_threadsafe,
+                                    args=(timer, i)) for i in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.engine.poll(0.01)
+        self.assertEqual(timer.call_count, 10)
+        self.assertFalse(self.engine._wakeup_pending)
+
+    def test_waker_installed_by_first_poll(self):
+        self.assertIsNone(self.engine._waker)
+        self.engine.poll(0.01)
+        fileno = self.engine._waker.fileno
+        os.fstat(fileno)
+
+        self.engine.close()
+        self.assertIsNone(self.engine._waker)
+        self.assertRaises(OSError, os.fstat, fileno)
+
+        timer = MagicMock()
+        self.engine.call_threadsafe(timer)
+        self.engine.poll(0.01)
+        timer.assert_called_once_with()
+
+@unittest.skipIf(_timerfd_create is None, "timerfd is not available")
+class TestHighResolutionTimers(unittest.TestCase):
+    def setUp(self):
+        self.engine = Engine(high_resolution=True)
+
+    def tearDown(self):
+        self.engine.close()
+
+    def test_short_deferreds(self):
+        # Without the timer each of these would wait at least 10ms.
+        times = []
+        def tick():
+            times.append(time.time())
+            if len(times) < 20:
+                self.engine.defer(0.001, tick)
+        self.engine.defer(0.001, tick)
+        start = time.time()
+        while len(times) < 20 and time.time() - start < 2.0:
+            self.engine.poll(0.2)
+        self.assertEqual(len(times), 20)
+        self.assertLess(times[-1] - start, 0.15)
+
+    def test_timer_rearmed(self):
+        timer = MagicMock()
+        self.engine.defer(0.002, timer)
+        self.engine.poll(0.2)
+        self.assertIsNone(self.engine._timer.deadline)
+        self.engine.poll(0.2)
+        timer.assert_called_once_with()
+
+    def test_custom_clock(self):
+        engine = Engine(high_resolution=True, clock=time.time)
+        self.assertIsNone(engine._timer)
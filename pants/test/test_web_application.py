@@ -28,7 +28,7 @@ try:
 except ImportError:
     requests = None
 
-from mock import MagicMock
+from mock import MagicMock, patch
 
 from pants.http import HTTPServer, HTTPRequest
 from pants.engine import Engine
@@ -201,3 +201,15 @@ class TestUrlFor(AppTestCase):
     def test_context(self):
         with self.assertRaises(RuntimeError):
             url_for('index')
+
+class TestApplicationRun(unittest.TestCase):
+    def test_run_passes_worker_options_to_listen(self):
+        app = Application()
+        engine = MagicMock()
+        with patch("pants.web.application.HTTPServer") as server:
+            app.run(("127.0.0.1", 4040), engine=engine, workers=4,
+                    cpu_affinity=True)
+
+        server.return_value.listen.assert_called_once_with(
+            ("127.0.0.1", 4040), workers=4, cpu_affinity=True)
+        engine.start.assert_called_once_with()
@@ -0,0 +1,137 @@
+###############################################################################
+#
+# Copyright 2012 Pants Developers (see AUTHORS.txt)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+###############################################################################
+
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+
+from mock import MagicMock, patch
+
+import pants
+import pants.server
+
+# Each worker appends "<worker id> <pid>" to the given file and then
+# serves its worker ID to anyone who connects.
+WORKER_SCRIPT = """
+import os
+import sys
+
+import pants
+
+class WhoAmI(pants.Stream):
+    def on_connect(self):
+        self.write(str(pants.util.workers.worker_id()))
+        self.close()
+
+import pants.util.workers
+
+server = pants.Server(ConnectionClass=WhoAmI)
+server.listen(('127.0.0.1', 4060), workers=2)
+
+with open(sys.argv[1], "a") as f:
+    f.write("%d %d\\n" % (pants.util.workers.worker_id(), os.getpid()))
+
+pants.engine.start()
+"""
+
+@unittest.skipUnless(hasattr(os, "fork"), "fork()-specific functionality.")
+class TestWorkers(unittest.TestCase):
+    def setUp(self):
+        fd, self.script = tempfile.mkstemp(suffix=".py")
+        os.write(fd, WORKER_SCRIPT)
+        os.close(fd)
+        fd, self.output = tempfile.mkstemp()
+        os.close(fd)
+
+        env = dict(os.environ)
+        root = os.path.dirname(os.path.dirname(
+            os.path.abspath(pants.__file__)))
+        env["PYTHONPATH"] = root + os.pathsep + env.get("PYTHONPATH", "")
+        self.supervisor = subprocess.Popen([sys.executable, self.script,
+                                            self.output], env=env)
+
+    def tearDown(self):
+        if self.supervisor.poll() is None:
+            self.supervisor.send_signal(signal.SIGTERM)
+            self.supervisor.wait()
+        os.remove(self.script)
+        os.remove(self.output)
+
+    def wait_for_workers(self, count, timeout=5.0):
+        end = time.time() + timeout
+        while time.time() < end:
+            with open(self.output) as f:
+                workers = [map(int, line.split()) for line in f]
+            if len(workers) >= count:
+                return workers
+            time.sleep(0.05)
+        self.fail("Workers did not start.")
+
+    def test_workers_share_port(self):
+        self.wait_for_workers(2)
+        sock = socket.create_connection(('127.0.0.1', 4060), 1.0)
+        self.assertTrue(sock.recv(16) in ("0", "1"))
+        sock.close()
+
+    def test_crashed_worker_is_restarted(self):
+        workers = self.wait_for_workers(2)
+        id, pid = workers[0]
+        os.kill(pid, signal.SIGKILL)
+        workers = self.wait_for_workers(3)
+        self.assertEqual(workers[2][0], id)
+        self.assertNotEqual(workers[2][1], pid)
+
+    def test_sighup_is_ignored_by_supervisor(self):
+        workers = self.wait_for_workers(2)
+        self.supervisor.send_signal(signal.SIGHUP)
+        time.sleep(0.5)
+        self.assertIsNone(self.supervisor.poll())
+        for id, pid in workers:
+            os.kill(pid, 0)
+        self.assertEqual(len(self.wait_for_workers(2)), 2)
+
+    def test_sigterm_stops_workers_and_supervisor(self):
+        workers = self.wait_for_workers(2)
+        self.supervisor.send_signal(signal.SIGTERM)
+        end = time.time() + 5.0
+        while self.supervisor.poll() is None and time.time() < end:
+            time.sleep(0.05)
+        self.assertEqual(self.supervisor.returncode, 0)
+        for id, pid in workers:
+            self.assertRaises(OSError, os.kill, pid, 0)
+
+class TestServerListenWithWorkers(unittest.TestCase):
+    def test_listen_forks_workers(self):
+        server = pants.Server()
+        with patch.object(pants.server, "fork_workers") as fork_workers:
+            server.listen(('127.0.0.1', 4061), workers=3, cpu_affinity=True)
+        fork_workers.assert_called_once_with(3, True, server.engine)
+        self.assertTrue(server.listening)
+        server.close()
+
+    def test_listen_without_workers_does_not_fork(self):
+        server = pants.Server()
+        with patch.object(pants.server, "fork_workers") as fork_workers:
+            server.listen(('127.0.0.1', 4061))
+        self.assertFalse(fork_workers.called)
+        server.close()
@@ -813,7 +813,7 @@ class Resolver(object):
             message.id = self._last_id
 
         # Timeout in timeout seconds.
-        df_timeout = self.engine.defer(timeout, self._error, message.id)
+        df_timeout = self.engine.timeout(timeout, self._error, message.id)
 
         # Send the Message
         msg = str(message)
@@ -0,0 +1,416 @@
+###############################################################################
+#
+# Copyright 2012 Pants Developers (see AUTHORS.txt)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+###############################################################################
+"""
+Thread and process pools for running blocking code.
+
+Pants runs everything on a single thread, so a call to a blocking
+library stalls every other channel on the engine. The executors in this
+module run such calls elsewhere. They are normally used through
+:meth:`Engine.run_in_executor() <pants.engine.Engine.run_in_executor>`,
+which delivers the result back on the engine's thread.
+
+Both executors are bounded. Once *max_queue* calls are waiting to run,
+further calls are rejected with :class:`ExecutorFull` rather than being
+queued indefinitely.
+"""
+
+###############################################################################
+# Imports
+###############################################################################
+
+import collections
+import cPickle as pickle
+import multiprocessing
+import sys
+import threading
+import time
+import traceback
+
+
+###############################################################################
+# Logging
+###############################################################################
+
+import logging
+log = logging.getLogger("pants")
+
+
+###############################################################################
+# Exceptions
+###############################################################################
+
+class ExecutorFull(Exception):
+    """
+    Raised when a call is submitted to an executor whose queue is full.
+    """
+    pass
+
+
+class ExecutorShutdown(Exception):
+    """
+    Raised when a call is submitted to an executor that has been shut
+    down.
+    """
+    pass
+
+
+class RemoteError(Exception):
+    """
+    Raised in place of an exception from a worker process that could
+    not be sent back to the engine's process. The message contains the
+    formatted traceback from the worker.
+    """
+    pass
+
+
+###############################################################################
+# _Executor Class
+###############################################################################
+
+class _Executor(object):
+    """
+    Base class for executors. Keeps track of the queue and of timing
+    statistics.
+    """
+    def __init__(self, max_workers, max_queue):
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1.")
+
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+
+        self._lock = threading.Lock()
+        self._shutdown = False
+
+        self._pending = 0
+        self._running = 0
+        self._max_pending = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._wait_time = 0.0
+        self._run_time = 0.0
+
+    def submit(self, function, args=(), kwargs=None, on_done=None):
+        """
+        Schedule a call to run on the executor.
+
+        *on_done* is called with ``(result, error)`` once the call has
+        finished, where *error* is the exception raised by the call or
+        None. It is called from a thread belonging to the executor, not
+        from the engine's thread.
+
+        =========  ============
+        Argument   Description
+        =========  ============
+        function   The callable to run.
+        args       *Optional.* The positional arguments to pass to the callable.
+        kwargs     *Optional.* The keyword arguments to pass to the callable.
+        on_done    *Optional.* The callable to notify of the result.
+        =========  ============
+        """
+        with self._lock:
+            if self._shutdown:
+                raise ExecutorShutdown("Executor has been shut down.")
+
+            if self.max_queue is not None and self._pending >= self.max_queue:
+                self._rejected += 1
+                raise ExecutorFull("Executor queue is full (%d calls)." %
+                                   self._pending)
+
+            self._pending += 1
+            if self._pending > self._max_pending:
+                self._max_pending = self._pending
+
+        try:
+            self._submit(function, args, kwargs or {}, on_done, time.time())
+        except Exception:
+            with self._lock:
+                self._pending -= 1
+            raise
+
+    def shutdown(self, wait=True):
+        """
+        Stop accepting new calls and release the executor's workers.
+        Calls that have already been submitted are still run.
+
+        =========  ============
+        Argument   Description
+        =========  ============
+        wait       *Optional.* If True, wait for the submitted calls to finish.
+        =========  ============
+        """
+        with self._lock:
+            if self._shutdown:
+                return
+            self._shutdown = True
+
+        self._shutdown_workers(wait)
+
+    def stats(self):
+        """
+        Return a dict of statistics that can be used to size the
+        executor.
+
+        ==============  ============
+        Key             Description
+        ==============  ============
+        max_workers     The number of workers.
+        max_queue       The maximum number of calls that may wait to run.
+        pending         The number of calls waiting to run.
+        running         The number of calls currently running.
+        max_pending     The largest number of calls that have waited at once.
+        completed       The number of calls that returned a result.
+        failed          The number of calls that raised an exception.
+        rejected        The number of calls rejected with ExecutorFull.
+        wait_time       Total seconds spent by calls waiting to run.
+        run_time        Total seconds spent running calls.
+        ==============  ============
+        """
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "pending": self._pending,
+                "running": self._running,
+                "max_pending": self._max_pending,
+                "completed": self._completed,
+                "failed": self._failed,
+                "rejected": self._rejected,
+                "wait_time": self._wait_time,
+                "run_time": self._run_time,
+            }
+
+    ##### Internal Methods ####################################################
+
+    def _submit(self, function, args, kwargs, on_done, submitted):
+        raise NotImplementedError
+
+    def _shutdown_workers(self, wait):
+        raise NotImplementedError
+
+    def _started(self, submitted, started):
+        """
+        Record that a call has left the queue.
+        """
+        with self._lock:
+            self._pending -= 1
+            self._running += 1
+            self._wait_time += max(0.0, started - submitted)
+
+    def _finished(self, run_time, error, on_done, result):
+        """
+        Record that a call has finished and notify *on_done*.
+        """
+        with self._lock:
+            self._running -= 1
+            self._run_time += run_time
+            if error is None:
+                self._completed += 1
+            else:
+                self._failed += 1
+
+        if on_done is None:
+            if error is not None:
+                log.error("Exception raised in executor call: %r" % error)
+            return
+
+        try:
+            on_done(result, error)
+        except Exception:
+            log.exception("Exception raised while delivering executor result.")
+
+
+###############################################################################
+# ThreadPoolExecutor Class
+###############################################################################
+
+class ThreadPoolExecutor(_Executor):
+    """
+    An executor that runs calls on a pool of daemon threads. The threads
+    are started when they are first needed.
+
+    ============  ============
+    Argument      Description
+    ============  ============
+    max_workers   *Optional.* The number of threads. Defaults to five times
+                  the number of CPUs.
+    max_queue     *Optional.* The number of calls that may wait for a free
+                  thread. Defaults to 1024. None means no limit.
+    ============  ============
+    """
+    def __init__(self, max_workers=None, max_queue=1024):
+        if max_workers is None:
+            max_workers = cpu_count() * 5
+
+        _Executor.__init__(self, max_workers, max_queue)
+
+        self._queue = collections.deque()
+        self._condition = threading.Condition(threading.Lock())
+        self._threads = []
+        self._idle = 0
+
+    def _submit(self, function, args, kwargs, on_done, submitted):
+        with self._condition:
+            self._queue.append((function, args, kwargs, on_done, submitted))
+            if self._idle:
+                self._condition.notify()
+            elif len(self._threads) < self.max_workers:
+                thread = threading.Thread(target=self._work,
+                                          name="pants-executor-%d" %
+                                          len(self._threads))
+                thread.daemon = True
+                self._threads.append(thread)
+                thread.start()
+
+    def _shutdown_workers(self, wait):
+        with self._condition:
+            self._condition.notify_all()
+            threads = self._threads[:]
+
+        if wait:
+            for thread in threads:
+                thread.join()
+
+    def _work(self):
+        """
+        Run calls from the queue until the executor is shut down.
+        """
+        condition = self._condition
+        queue = self._queue
+
+        while True:
+            with condition:
+                while not queue:
+                    if self._shutdown:
+                        return
+                    self._idle += 1
+                    condition.wait()
+                    self._idle -= 1
+                function, args, kwargs, on_done, submitted = queue.popleft()
+
+            started = time.time()
+            self._started(submitted, started)
+
+            result = error = None
+            try:
+                result = function(*args, **kwargs)
+            except Exception as err:
+                error = err
+
+            self._finished(time.time() - started, error, on_done, result)
+            del function, args, kwargs, on_done, result, error
+
+
+###############################################################################
+# ProcessPoolExecutor Class
+###############################################################################
+
+class ProcessPoolExecutor(_Executor):
+    """
+    An executor that runs calls on a :class:`multiprocessing.Pool`. Use
+    it for CPU-bound work. The callable, its arguments and its result
+    must be picklable, so the callable has to be defined at module
+    level. The worker processes are started when the first call is
+    submitted. Running calls can't be observed in another process, so
+    in :meth:`stats` they are counted as pending until they finish.
+
+    ============  ============
+    Argument      Description
+    ============  ============
+    max_workers   *Optional.* The number of processes. Defaults to the
+                  number of CPUs.
+    max_queue     *Optional.* The number of calls that may wait for a free
+                  process. Defaults to 1024. None means no limit.
+    ============  ============
+    """
+    def __init__(self, max_workers=None, max_queue=1024):
+        if max_workers is None:
+            max_workers = cpu_count()
+
+        _Executor.__init__(self, max_workers, max_queue)
+        self._pool = None
+
+    def _submit(self, function, args, kwargs, on_done, submitted):
+        # Pickle the call here, rather than in the pool's task thread, so
+        # that unpicklable calls fail immediately.
+        payload = pickle.dumps((function, args, kwargs), pickle.HIGHEST_PROTOCOL)
+
+        with self._lock:
+            if self._pool is None:
+                self._pool = multiprocessing.Pool(self.max_workers)
+
+        # The number of calls waiting in a multiprocessing.Pool can't be
+        # observed from outside, so the wait is measured by the worker.
+        def callback(output):
+            ok, value, started, run_time = pickle.loads(output)
+            self._started(submitted, started)
+            if ok:
+                self._finished(run_time, None, on_done, value)
+            else:
+                self._finished(run_time, value, on_done, None)
+
+        self._pool.apply_async(_call_in_process, (payload,), callback=callback)
+
+    def _shutdown_workers(self, wait):
+        if self._pool is None:
+            return
+
+        self._pool.close()
+        if wait:
+            self._pool.join()
+
+
+def _call_in_process(payload):
+    """
+    Run a pickled call in a worker process and return the pickled
+    outcome. Exceptions, including failures to pickle or unpickle the
+    result, are captured so that they can always be delivered to the
+    engine's process.
+    """
+    started = time.time()
+    try:
+        function, args, kwargs = pickle.loads(payload)
+        output = (True, function(*args, **kwargs))
+    except Exception as err:
+        output = (False, err)
+    run_time = time.time() - started
+
+    try:
+        pickled = pickle.dumps(output + (started, run_time),
+                               pickle.HIGHEST_PROTOCOL)
+        # Some objects, such as exceptions with a custom __init__, pickle
+        # but fail to unpickle. Check here, as a failure in the pool's
+        # result handler thread would stop all later results arriving.
+        pickle.loads(pickled)
+        return pickled
+    except Exception:
+        err = RemoteError("".join(traceback.format_exception(*sys.exc_info())))
+        return pickle.dumps((False, err, started, run_time),
+                            pickle.HIGHEST_PROTOCOL)
+
+
+def cpu_count():
+    """
+    Return the number of CPUs available, or 1 if it cannot be
+    determined.
+    """
+    try:
+        return multiprocessing.cpu_count()
+    except NotImplementedError:
+        return 1
@@ -0,0 +1,336 @@
+###############################################################################
+#
+# Copyright 2012 Pants Developers (see AUTHORS.txt)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+###############################################################################
+"""
+Simulated time and in-memory sockets for tests and benchmarks.
+
+A :class:`VirtualEngine` runs its timers against a :class:`VirtualClock`
+rather than the system clock, and polls in-memory
+:class:`VirtualSocket` pairs rather than real file descriptors. Instead
+of waiting for events, the engine's poller advances the clock straight
+to the next deadline, so hours of timer activity run in milliseconds
+and every run is repeatable::
+
+    engine = VirtualEngine()
+    engine.defer(3600, on_timeout)
+    engine.run(7200)  # Returns immediately, having run on_timeout.
+
+    client, server = engine.stream_pair(MyClient, MyServerConnection)
+    client.write("hello")
+    engine.run(1.0)
+"""
+
+###############################################################################
+# Imports
+###############################################################################
+
+import errno
+import itertools
+import socket
+
+from pants.engine import Engine
+from pants.stream import Stream
+
+
+###############################################################################
+# VirtualClock Class
+###############################################################################
+
+class VirtualClock(object):
+    """
+    A clock that only moves when it is told to. Instances are callable
+    and return the current virtual time, so they can be passed as the
+    ``clock`` argument of :class:`~pants.engine.Engine`.
+
+    =========  ============
+    Argument   Description
+    =========  ============
+    start      *Optional.* The initial time. Defaults to 0.
+    =========  ============
+    """
+    def __init__(self, start=0.0):
+        self.now = float(start)
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        """
+        Move the clock forward by *seconds*.
+        """
+        if seconds > 0:
+            self.now += seconds
+
+
+###############################################################################
+# VirtualSocket Class
+###############################################################################
+
+# Virtual file descriptors start well above any real ones, so that they
+# can share a poller with the engine's waker.
+_filenos = itertools.count(1 << 20)
+
+class VirtualSocket(object):
+    """
+    One end of an in-memory, connected stream socket. Create pairs with
+    :func:`socketpair`.
+
+    Only the parts of the socket interface used by Pants channels are
+    implemented. The socket is always non-blocking.
+    """
+    family = socket.AF_INET
+    type = socket.SOCK_STREAM
+
+    # The number of bytes a socket will buffer before send() raises
+    # EAGAIN.
+    buffer_size = 2 ** 18
+
+    def __init__(self):
+        self._fileno = next(_filenos)
+        self._peer = None
+        self._buffer = []
+        self._buffered = 0
+        self._closed = False
+        self._shutdown_write = False
+
+    def __repr__(self):
+        return "<VirtualSocket #%d>" % self._fileno
+
+    def fileno(self):
+        return self._fileno
+
+    def setblocking(self, flag):
+        pass
+
+    def getpeername(self):
+        return ("virtual", self._peer._fileno)
+
+    def getsockname(self):
+        return ("virtual", self._fileno)
+
+    def getsockopt(self, level, option, *args):
+        return 0
+
+    def setsockopt(self, level, option, value):
+        pass
+
+    def recv(self, bufsize):
+        if self._closed:
+            raise socket.error(errno.EBADF, "Bad file descriptor")
+
+        if not self._buffer:
+            if self._peer._closed or self._peer._shutdown_write:
+                return ""
+            raise socket.error(errno.EAGAIN, "Resource temporarily unavailable")
+
+        data = "".join(self._buffer)
+        chunk, rest = data[:bufsize], data[bufsize:]
+        self._buffer = [rest] if rest else []
+        self._buffered = len(rest)
+        return chunk
+
+    def recv_into(self, buf, nbytes=0):
+        data = self.recv(nbytes or len(buf))
+        buf[:len(data)] = data
+        return len(data)
+
+    def send(self, data):
+        if self._closed:
+            raise socket.error(errno.EBADF, "Bad file descriptor")
+
+        peer = self._peer
+        if peer._closed or self._shutdown_write:
+            raise socket.error(errno.EPIPE, "Broken pipe")
+
+        space = self.buffer_size - peer._buffered
+        if space <= 0:
+            raise socket.error(errno.EAGAIN, "Resource temporarily unavailable")
+
+        data = data[:space]
+        peer._buffer.append(data)
+        peer._buffered += len(data)
+        return len(data)
+
+    def sendall(self, data):
+        while data:
+            data = data[self.send(data):]
+
+    def shutdown(self, how):
+        if how in (socket.SHUT_WR, socket.SHUT_RDWR):
+            self._shutdown_write = True
+
+    def close(self):
+        self._closed = True
+        self._buffer = []
+        self._buffered = 0
+
+    ##### Polling #############################################################
+
+    def _poll(self):
+        """
+        Return the events currently raised on the socket.
+        """
+        if self._closed:
+            return 0
+
+        events = 0
+        peer = self._peer
+        if self._buffer or peer._closed or peer._shutdown_write:
+            events |= Engine.READ
+        if peer._closed:
+            events |= Engine.HANGUP
+        elif peer._buffered < self.buffer_size:
+            events |= Engine.WRITE
+        return events
+
+
+def socketpair():
+    """
+    Return a pair of connected :class:`VirtualSocket` instances.
+    """
+    a, b = VirtualSocket(), VirtualSocket()
+    a._peer, b._peer = b, a
+    return a, b
+
+
+###############################################################################
+# VirtualPoller Class
+###############################################################################
+
+class VirtualPoller(object):
+    """
+    A level-triggered poller for :class:`VirtualSocket` instances. When
+    no events are ready, :meth:`poll` advances the clock by the timeout
+    instead of waiting.
+
+    Real file descriptors, such as the engine's waker, may be
+    registered but are never reported as ready.
+
+    =========  ============
+    Argument   Description
+    =========  ============
+    clock      The :class:`VirtualClock` to advance.
+    =========  ============
+    """
+    def __init__(self, clock):
+        self.clock = clock
+        self._sockets = {}
+        self._events = {}
+        self.polls = 0
+
+    def register(self, sock):
+        """
+        Make a virtual socket known to the poller.
+        """
+        self._sockets[sock.fileno()] = sock
+
+    def add(self, fileno, events):
+        self._events[fileno] = events
+
+    def modify(self, fileno, events):
+        self._events[fileno] = events
+
+    def remove(self, fileno, events):
+        self._events.pop(fileno, None)
+        self._sockets.pop(fileno, None)
+
+    def poll(self, timeout):
+        self.polls += 1
+
+        ready = self._ready()
+        if not ready:
+            self.clock.advance(timeout)
+        return ready
+
+    def _ready(self):
+        ready = {}
+        for fileno, interest in self._events.iteritems():
+            sock = self._sockets.get(fileno)
+            if sock is None:
+                continue
+            events = sock._poll() & interest
+            if events:
+                ready[fileno] = events
+        return ready
+
+
+###############################################################################
+# VirtualEngine Class
+###############################################################################
+
+class VirtualEngine(Engine):
+    """
+    An engine that runs on a :class:`VirtualClock` with a
+    :class:`VirtualPoller`.
+
+    =========  ============
+    Argument   Description
+    =========  ============
+    start      *Optional.* The initial virtual time. Defaults to 0.
+    kwargs     Other keyword arguments are passed to
+               :class:`~pants.engine.Engine`.
+    =========  ============
+    """
+    def __init__(self, start=0.0, **kwargs):
+        self.clock = VirtualClock(start)
+        kwargs["clock"] = self.clock
+        kwargs["poller"] = VirtualPoller(self.clock)
+        Engine.__init__(self, **kwargs)
+
+    def run(self, duration):
+        """
+        Run the engine until *duration* seconds of virtual time have
+        passed. Each poll jumps the clock straight to the next timer,
+        so idle time costs nothing.
+        """
+        end = self.clock.now + duration
+        while self.clock.now < end and not self._shutdown:
+            self.poll(end - self.clock.now)
+
+        # Run anything due at exactly the end.
+        self.poll(0)
+
+    def socketpair(self):
+        """
+        Return a pair of connected :class:`VirtualSocket` instances
+        registered with the engine's poller.
+        """
+        a, b = socketpair()
+        self._poller.register(a)
+        self._poller.register(b)
+        return a, b
+
+    def stream_pair(self, a_class=Stream, b_class=Stream, **kwargs):
+        """
+        Return a pair of connected channels wrapping a virtual socket
+        pair. Both have had their ``on_connect`` called.
+
+        =========  ============
+        Argument   Description
+        =========  ============
+        a_class    *Optional.* The class of the first channel. Defaults
+                   to :class:`~pants.stream.Stream`.
+        b_class    *Optional.* The class of the second channel.
+        kwargs     Keyword arguments passed to both constructors.
+        =========  ============
+        """
+        a_sock, b_sock = self.socketpair()
+        a = a_class(engine=self, socket=a_sock, **kwargs)
+        b = b_class(engine=self, socket=b_sock, **kwargs)
+        a._handle_connect_event()
+        b._handle_connect_event()
+        return a, b
@@ -0,0 +1,160 @@
+###############################################################################
+#
+# Copyright 2012 Pants Developers (see AUTHORS.txt)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+###############################################################################
+"""
+Declarative socket options, applied to channel sockets from a dictionary
+such as ``{"nodelay": True, "sndbuf": 2 ** 18}``.
+
+==================  ===========================================================
+Option              Description
+==================  ===========================================================
+nodelay             Disable Nagle's algorithm (``TCP_NODELAY``), so that small
+                    writes are sent immediately.
+cork                Hold back partial segments until uncorked (``TCP_CORK`` on
+                    Linux, ``TCP_NOPUSH`` on BSD and OS X).
+keepalive           Enable TCP keepalive probes (``SO_KEEPALIVE``).
+keepalive_idle      Seconds of idleness before the first keepalive probe.
+keepalive_interval  Seconds between keepalive probes.
+keepalive_count     Unanswered probes before the connection is dropped.
+sndbuf              The size of the kernel's send buffer (``SO_SNDBUF``).
+rcvbuf              The size of the kernel's receive buffer (``SO_RCVBUF``).
+user_timeout        Milliseconds that sent data may remain unacknowledged
+                    before the connection is dropped (``TCP_USER_TIMEOUT``,
+                    Linux only).
+notsent_lowat       The most unsent data the kernel will buffer before the
+                    socket stops being writable (``TCP_NOTSENT_LOWAT``).
+==================  ===========================================================
+
+Options that the platform does not support are skipped, as are TCP
+options on sockets that aren't TCP sockets. ``TCP_QUICKACK`` is not
+offered, as Linux clears it again after the next delayed ACK, so setting
+it once when a socket is created has next to no effect.
+"""
+
+###############################################################################
+# Imports
+###############################################################################
+
+import socket
+import sys
+
+
+###############################################################################
+# Constants
+###############################################################################
+
+# Options missing from the socket module of older Python versions.
+if sys.platform.startswith("linux"):
+    _PLATFORM_OPTIONS = {
+        "TCP_USER_TIMEOUT": 18,
+        "TCP_NOTSENT_LOWAT": 25,
+        }
+elif sys.platform == "darwin":
+    _PLATFORM_OPTIONS = {
+        "TCP_NOPUSH": 4,
+        "TCP_KEEPALIVE": 0x10,
+        "TCP_KEEPINTVL": 0x101,
+        "TCP_KEEPCNT": 0x102,
+        "TCP_NOTSENT_LOWAT": 0x201,
+        }
+else:
+    _PLATFORM_OPTIONS = {}
+
+def _option(*names):
+    for name in names:
+        value = getattr(socket, name, _PLATFORM_OPTIONS.get(name))
+        if value is not None:
+            return value
+    return None
+
+_TCP = socket.IPPROTO_TCP
+
+# Option name -> (level, option). The option is None where the platform
+# doesn't support it.
+SOCKET_OPTIONS = {
+    "nodelay": (_TCP, _option("TCP_NODELAY")),
+    "cork": (_TCP, _option("TCP_CORK", "TCP_NOPUSH")),
+    "keepalive": (socket.SOL_SOCKET, _option("SO_KEEPALIVE")),
+    "keepalive_idle": (_TCP, _option("TCP_KEEPIDLE", "TCP_KEEPALIVE")),
+    "keepalive_interval": (_TCP, _option("TCP_KEEPINTVL")),
+    "keepalive_count": (_TCP, _option("TCP_KEEPCNT")),
+    "sndbuf": (socket.SOL_SOCKET, _option("SO_SNDBUF")),
+    "rcvbuf": (socket.SOL_SOCKET, _option("SO_RCVBUF")),
+    "user_timeout": (_TCP, _option("TCP_USER_TIMEOUT")),
+    "notsent_lowat": (_TCP, _option("TCP_NOTSENT_LOWAT")),
+    }
+
+_TCP_FAMILIES = (socket.AF_INET, getattr(socket, "AF_INET6", socket.AF_INET))
+
+
+###############################################################################
+# Functions
+###############################################################################
+
+def check_socket_options(options):
+    """
+    Check a dictionary of socket options without applying it. Raises
+    :exc:`ValueError` if an option's name isn't recognised, or if its
+    value isn't None and can't be converted to an integer.
+
+    =========  ============
+    Argument   Description
+    =========  ============
+    options    A dictionary mapping option names to values.
+    =========  ============
+    """
+    for name, value in options.iteritems():
+        if name not in SOCKET_OPTIONS:
+            raise ValueError("Unknown socket option %r." % name)
+
+        if value is None:
+            continue
+        try:
+            int(value)
+        except (TypeError, ValueError):
+            raise ValueError("Invalid value %r for socket option %r." %
+                             (value, name))
+
+def set_socket_options(sock, options):
+    """
+    Apply a dictionary of socket options to a socket. Raises
+    :exc:`ValueError` if an option's name isn't recognised, and
+    :exc:`socket.error` if the operating system rejects its value.
+
+    =========  ============
+    Argument   Description
+    =========  ============
+    sock       The socket to configure.
+    options    A dictionary mapping option names to values. True and
+               False are passed as 1 and 0.
+    =========  ============
+    """
+    is_tcp = (sock.type == socket.SOCK_STREAM and
+              sock.family in _TCP_FAMILIES)
+
+    for name, value in options.iteritems():
+        try:
+            level, option = SOCKET_OPTIONS[name]
+        except KeyError:
+            raise ValueError("Unknown socket option %r." % name)
+
+        if option is None or value is None:
+            continue
+        if level == _TCP and not is_tcp:
+            continue
+
+        sock.setsockopt(level, option, int(value))
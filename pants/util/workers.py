@@ -0,0 +1,284 @@
+###############################################################################
+#
+# Copyright 2012 Pants Developers (see AUTHORS.txt)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+###############################################################################
+"""
+Pre-forked worker processes.
+
+A single Pants process only ever uses one core. On platforms with
+``fork()`` and ``SO_REUSEPORT``, :func:`fork_workers` can be used to run
+several copies of the same application, each with its own engine and
+each binding its own listening socket to the same port. The kernel then
+balances incoming connections between the workers.
+
+The original process becomes a supervisor. It restarts workers that
+exit unexpectedly, and forwards ``SIGTERM`` and ``SIGINT`` to the
+workers before shutting itself down once every worker has exited.
+
+The supervisor ignores ``SIGHUP``, and doesn't forward it. The workers
+keep the ``SIGHUP`` handler that was in place before they were forked,
+so a worker that is killed by a ``SIGHUP`` sent to it directly, or to
+its process group, is restarted like any other worker that exits.
+"""
+
+###############################################################################
+# Imports
+###############################################################################
+
+import errno
+import os
+import signal
+import sys
+import time
+
+import ctypes
+import ctypes.util
+
+from pants.engine import Engine
+from pants.util.executor import cpu_count
+
+
+###############################################################################
+# Logging
+###############################################################################
+
+import logging
+log = logging.getLogger("pants")
+
+
+###############################################################################
+# Constants
+###############################################################################
+
+# Workers that exit sooner than this after being started are considered
+# to be failing on startup, and are restarted with a delay.
+RESTART_THRESHOLD = 1.0
+RESTART_DELAY = 1.0
+
+
+###############################################################################
+# Functions
+###############################################################################
+
+_worker_id = None
+
+def worker_id():
+    """
+    Return the ID of the current worker process, from ``0`` to one less
+    than the number of workers, or None if the current process is not a
+    worker.
+    """
+    return _worker_id
+
+def fork_workers(count=None, cpu_affinity=False, engine=None):
+    """
+    Fork a number of worker processes and supervise them.
+
+    This function returns only in the worker processes, where it returns
+    the ID of the worker. In the original process, it supervises the
+    workers until they have all been shut down and then exits.
+
+    Every worker has its own copy of the engine, with a new polling
+    object. Channels that were created before the fork are shared by all
+    of the workers, so :func:`fork_workers` should be called before any
+    sockets are opened. The easiest way to arrange this is to use the
+    ``workers`` argument of :meth:`pants.server.Server.listen`.
+
+    If this function is called from within a worker, it returns that
+    worker's ID immediately without forking.
+
+    =============  ====================================================
+    Argument       Description
+    =============  ====================================================
+    count          *Optional.* The number of workers to fork. Defaults
+                   to the number of CPUs.
+    cpu_affinity   *Optional.* If True, pin each worker to a single
+                   CPU. Only supported on Linux.
+    engine         *Optional.* The engine to prepare for use in the
+                   workers. Defaults to the global engine.
+    =============  ====================================================
+    """
+    global _worker_id
+
+    if _worker_id is not None:
+        return _worker_id
+
+    if not hasattr(os, "fork"):
+        raise RuntimeError("fork_workers() is not supported on this platform.")
+
+    if count is None:
+        count = cpu_count()
+
+    if count < 1:
+        raise ValueError("Must fork at least one worker.")
+
+    if engine is None:
+        engine = Engine.instance()
+
+    return _Supervisor(count, cpu_affinity, engine).run()
+
+
+###############################################################################
+# _Supervisor Class
+###############################################################################
+
+class _Supervisor(object):
+    """
+    Forks and looks after a fixed number of worker processes.
+
+    =============  ====================================================
+    Argument       Description
+    =============  ====================================================
+    count          The number of workers to fork.
+    cpu_affinity   If True, pin each worker to a single CPU.
+    engine         The engine to prepare for use in the workers.
+    =============  ====================================================
+    """
+    def __init__(self, count, cpu_affinity, engine):
+        self.count = count
+        self.cpu_affinity = cpu_affinity
+        self.engine = engine
+
+        self._children = {}  # pid -> (worker id, start time)
+        self._stopping = False
+
+    def run(self):
+        """
+        Start the workers. Returns the worker ID in each worker and
+        exits the process in the supervisor.
+        """
+        handlers = {}
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            handlers[signum] = signal.signal(signum, self._handle_signal)
+        handlers[signal.SIGHUP] = signal.signal(signal.SIGHUP, signal.SIG_IGN)
+
+        for id in xrange(self.count):
+            if self._spawn(id):
+                self._restore_signals(handlers)
+                return id
+
+        log.info("Supervising %d workers." % self.count)
+
+        while self._children:
+            try:
+                pid, status = os.wait()
+            except OSError as err:
+                if err.args[0] == errno.EINTR:
+                    continue
+                raise
+
+            if pid not in self._children:
+                continue
+
+            id, started = self._children.pop(pid)
+            if self._stopping:
+                continue
+
+            if os.WIFSIGNALED(status):
+                reason = "was killed by signal %d" % os.WTERMSIG(status)
+            else:
+                reason = "exited with code %d" % os.WEXITSTATUS(status)
+            log.warning("Worker %d (pid %d) %s. Restarting." %
+                        (id, pid, reason))
+
+            if time.time() - started < RESTART_THRESHOLD:
+                time.sleep(RESTART_DELAY)
+                if self._stopping:
+                    continue
+
+            if self._spawn(id):
+                self._restore_signals(handlers)
+                return id
+
+        log.info("All workers have exited.")
+        sys.exit(0)
+
+    def _spawn(self, id):
+        """
+        Fork a single worker. Returns True in the new worker.
+        """
+        global _worker_id
+
+        pid = os.fork()
+        if pid:
+            self._children[pid] = (id, time.time())
+            return False
+
+        _worker_id = id
+
+        # The new process shares the parent's epoll instance, waker and
+        # timer. Give the engine its own without unregistering anything
+        # from the shared poller.
+        self.engine._poller = None
+        self.engine._install_poller()
+        if self.engine._waker is not None:
+            self.engine._install_waker()
+        if self.engine._timer is not None:
+            self.engine._install_timer()
+
+        # Threads and pool processes are not inherited.
+        self.engine._thread_pool = None
+        self.engine._process_pool = None
+
+        if self.cpu_affinity:
+            _set_cpu_affinity(id % cpu_count())
+
+        return True
+
+    def _restore_signals(self, handlers):
+        """
+        Restore the signal handlers that were in place before the
+        supervisor installed its own.
+        """
+        for signum, handler in handlers.iteritems():
+            signal.signal(signum, handler)
+
+    def _handle_signal(self, signum, frame):
+        """
+        Forward SIGTERM or SIGINT to every worker, and stop restarting
+        workers.
+        """
+        self._stopping = True
+
+        for pid in self._children.keys():
+            try:
+                os.kill(pid, signum)
+            except OSError:
+                pass
+
+
+###############################################################################
+# CPU Affinity
+###############################################################################
+
+_sched_setaffinity = None
+if sys.platform.startswith("linux"):
+    _libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+    if hasattr(_libc, "sched_setaffinity"):
+        _sched_setaffinity = _libc.sched_setaffinity
+
+def _set_cpu_affinity(cpu):
+    """
+    Pin the current process to the given CPU.
+    """
+    if _sched_setaffinity is None:
+        log.warning("CPU affinity is not supported on this platform.")
+        return
+
+    mask = ctypes.c_ulong(1 << (cpu % (8 * ctypes.sizeof(ctypes.c_ulong))))
+    if _sched_setaffinity(0, ctypes.sizeof(mask), ctypes.byref(mask)) == -1:
+        e = ctypes.get_errno()
+        log.warning("Unable to pin worker to CPU %d: %s" % (cpu, os.strerror(e)))
@@ -0,0 +1,169 @@
+###############################################################################
+#
+# Copyright 2012 Pants Developers (see AUTHORS.txt)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+###############################################################################
+"""
+Implementations of the ``writev()`` system call, which sends data from
+several strings with a single system call and without joining them.
+"""
+
+###############################################################################
+# Imports
+###############################################################################
+
+import os
+import socket
+import sys
+
+import ctypes
+import ctypes.util
+
+
+###############################################################################
+# Constants
+###############################################################################
+
+# The most strings that will be passed to a single writev() call.
+IOV_MAX = 1024
+if hasattr(os, "sysconf"):
+    try:
+        IOV_MAX = min(IOV_MAX, os.sysconf("SC_IOV_MAX"))
+    except (ValueError, OSError):
+        pass
+
+# The most data that will be joined into a single string and sent with
+# send(). Below this, copying the data costs less than making a
+# writev() call through ctypes.
+WRITEV_FALLBACK_AMOUNT = 2 ** 16
+
+
+###############################################################################
+# Implementations
+###############################################################################
+
+def writev_fallback(channel, buffers, offset, fallback):
+    """
+    Fallback implementation of ``writev()``.
+
+    Joins strings from the start of *buffers*, up to
+    ``WRITEV_FALLBACK_AMOUNT`` bytes, and sends them with
+    :meth:`~pants._channel._Channel._socket_send`. A first string longer
+    than that is sent without being copied.
+
+    =========  ============
+    Argument   Description
+    =========  ============
+    channel    The channel to write to.
+    buffers    A list of strings to send.
+    offset     The number of bytes of the first string that have already
+               been sent.
+    fallback   Ignored.
+    =========  ============
+    """
+    first = buffers[0]
+    if len(buffers) == 1 or len(first) - offset >= WRITEV_FALLBACK_AMOUNT:
+        if offset:
+            first = buffer(first, offset)
+        return channel._socket_send(first)
+
+    chunks = [first[offset:]]
+    size = len(chunks[0])
+    for i in xrange(1, min(len(buffers), IOV_MAX)):
+        if size >= WRITEV_FALLBACK_AMOUNT:
+            break
+        data = buffers[i]
+        chunks.append(data)
+        size += len(data)
+
+    return channel._socket_send("".join(chunks))
+
+def writev_posix(channel, buffers, offset, fallback):
+    """
+    POSIX implementation of ``writev()``. Sends at most ``IOV_MAX``
+    strings. Less than ``WRITEV_FALLBACK_AMOUNT`` bytes are joined and
+    sent with :meth:`~pants._channel._Channel._socket_send` instead.
+
+    =========  ============
+    Argument   Description
+    =========  ============
+    channel    The channel to write to.
+    buffers    A list of strings to send.
+    offset     The number of bytes of the first string that have already
+               been sent.
+    fallback   If True, the pure-Python writev function will be used.
+    =========  ============
+    """
+    if fallback or len(buffers) == 1:
+        return writev_fallback(channel, buffers, offset, fallback)
+
+    buffers = buffers[:IOV_MAX]
+    first = buffers[0]
+
+    if sum(map(len, buffers)) - offset < WRITEV_FALLBACK_AMOUNT:
+        if offset:
+            buffers[0] = first[offset:]
+        return channel._socket_send("".join(buffers))
+
+    count = len(buffers)
+    iov = (_iovec * count)()
+
+    if offset:
+        address = ctypes.cast(ctypes.c_char_p(first), ctypes.c_void_p).value
+        iov[0].iov_base = ctypes.c_char_p(address + offset)
+        iov[0].iov_len = len(first) - offset
+    else:
+        iov[0].iov_base = first
+        iov[0].iov_len = len(first)
+
+    for i in xrange(1, count):
+        data = buffers[i]
+        entry = iov[i]
+        entry.iov_base = data
+        entry.iov_len = len(data)
+
+    result = _writev(channel.fileno, iov, count)
+
+    if result == -1:
+        e = ctypes.get_errno()
+        raise socket.error(e, os.strerror(e))
+
+    return result
+
+
+###############################################################################
+# Writev
+###############################################################################
+
+class _iovec(ctypes.Structure):
+    _fields_ = [("iov_base", ctypes.c_char_p), ("iov_len", ctypes.c_size_t)]
+
+_writev = None
+if sys.platform != "win32":
+    _libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+    if hasattr(_libc, "writev"):
+        _writev = _libc.writev
+        _writev.argtypes = (
+                ctypes.c_int,  # socket
+                ctypes.POINTER(_iovec),  # iov
+                ctypes.c_int  # iovcnt
+                )
+        _writev.restype = ctypes.c_ssize_t
+
+writev = None
+if _writev is None:
+    writev = writev_fallback
+else:
+    writev = writev_posix
@@ -619,7 +619,8 @@ class Application(Module):
         self.debug = debug
         self.fix_end_slash = False
 
-    def run(self, address=None, ssl_options=None, engine=None):
+    def run(self, address=None, ssl_options=None, engine=None, workers=None,
+            cpu_affinity=False):
         """
         This function exists for convenience, and when called creates a
         :class:`~pants.http.HTTPServer` instance with its request
@@ -633,13 +634,16 @@ class Application(Module):
         address       *Optional.* The address to listen on. If this isn't specified, it will default to ``(INADDR_ANY, 80)``.
         ssl_options   *Optional.* A dict of SSL options for the server. See :class:`pants.contrib.ssl.SSLServer` for more information.
         engine        *Optional.* The :class:`pants.engine.Engine` instance to use.
+        workers       *Optional.* The number of worker processes to fork. See :func:`pants.server.Server.listen` for more information.
+        cpu_affinity  *Optional.* If True, pin each worker process to a single CPU.
         ============  ============
         """
         if not engine:
             from pants.engine import Engine
             engine = Engine.instance()
 
-        HTTPServer(self, ssl_options=ssl_options).listen(address)
+        HTTPServer(self, ssl_options=ssl_options, engine=engine).listen(
+            address, workers=workers, cpu_affinity=cpu_affinity)
         engine.start()
 
     ##### Error Handlers ######################################################
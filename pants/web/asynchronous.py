@@ -621,6 +621,59 @@ class Callback(object):
 async.callback = Callback
 
 
+###############################################################################
+# Executor Calls
+###############################################################################
+
+class _ExecutorError(tuple):
+    def __repr__(self):
+        return "_ExecutorError(%r)" % self[0]
+
+
+def run_in_executor(executor, function, *args, **kwargs):
+    """
+    Run the blocking *function* with the provided *args* and *kwargs* on
+    *executor*, or on the engine's default thread pool if *executor* is
+    None. See :meth:`pants.engine.Engine.run_in_executor`.
+
+    Yielding the returned :class:`pants.web.Callback` waits until the call
+    has finished, without blocking the engine, and returns the value
+    returned by *function*. If *function* raises an exception, it is
+    raised into the request handler instead. The same is true when the
+    call is waited on along with other callbacks, by yielding a list of
+    them or :func:`wait`: the exception of the first failed call in the
+    list is raised, and the other results are discarded::
+
+        @app.route("/report")
+        @async
+        def report(request):
+            data = yield async.run_in_executor(None, build_report, "daily")
+            yield data
+
+    Use ``engine.process_pool`` for CPU-bound work. The function must then
+    be picklable.
+    """
+    cb = Callback()
+    request = cb.request
+
+    def done(result, error):
+        if error is not None:
+            result = _ExecutorError((error,))
+        cb(result)
+
+    try:
+        request.connection.engine.run_in_executor(executor, function, *args,
+                                                  callback=done, **kwargs)
+    except Exception:
+        request._unhandled.remove(cb)
+        del request._callbacks[cb]
+        raise
+
+    return cb
+
+async.run_in_executor = run_in_executor
+
+
 ###############################################################################
 # Waiting
 ###############################################################################
@@ -635,6 +688,11 @@ def wait(timeout=None):
     values. If a *timeout* is provide, wait up to that many seconds for the
     callbacks to return before raising a TimeoutError containing a list of
     the results that *did* complete.
+
+    If any of the callbacks is a :func:`run_in_executor` call that raised an
+    exception, the first such exception is raised instead of returning the
+    list. In the list carried by a TimeoutError, a failed call's exception
+    takes the place of its result.
     """
     request = Application.current_app.request
     top, request._unhandled = _WaitList(request._unhandled), []
@@ -662,6 +720,8 @@ def _wait_timeout(request):
     input = []
     for key in request._waiting.pop():
         value = request._callbacks.pop(key)
+        if isinstance(value, _ExecutorError):
+            value = value[0]
         input.append(value if value is not Waiting else None)
 
     # Now, pass it along to _do. Note the as_exception=True.
@@ -692,7 +752,11 @@ def _check_waiting(request, trigger=None):
     if top is trigger:
         # It is. We can pop off the top and send the input now.
         request._waiting.pop()
-        _do(request, request._callbacks.pop(trigger))
+        input = request._callbacks.pop(trigger)
+        if isinstance(input, _ExecutorError):
+            _do(request, input[0], as_exception=True)
+        else:
+            _do(request, input)
         return
 
     # If we're still here, then we've got a list of callbacks to wait on. If
@@ -706,6 +770,13 @@ def _check_waiting(request, trigger=None):
 
     # We're finished, so build the list and send it on to _do.
     input = [request._callbacks.pop(key) for key in request._waiting.pop()]
+
+    # Raise the first failed executor call, as with a single callback.
+    for value in input:
+        if isinstance(value, _ExecutorError):
+            _do(request, value[0], as_exception=True)
+            return
+
     _do(request, input)
 
 